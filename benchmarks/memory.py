@@ -0,0 +1,38 @@
+'''
+Measure the memory held per DiffItem and MappingDiffItem by a large diff.
+
+    python benchmarks/memory.py [number of items]
+'''
+import sys
+import tracemalloc
+from diffr import diff
+
+
+def measure(build, n):
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = build()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return (current - baseline) / float(n), (peak - baseline) / float(n)
+
+
+def main(n):
+    # sequences would spend all their time and memory on the lcs matrix, sets
+    # produce the same kind of DiffItems without it.
+    a = set(range(n))
+    b = set(range(1, n + 1))
+    print('set diff, {} items: {:.1f} bytes/item, peak {:.1f}'.format(
+        n, *measure(lambda: diff(a, b), n)))
+    a = dict((i, i) for i in range(n))
+    b = dict(a)
+    b[n // 2] = -1
+    print('mapping diff, {} items: {:.1f} bytes/item, peak {:.1f}'.format(
+        n, *measure(lambda: diff(a, b), n)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,70 @@
+'''
+Compare the size and speed of diffr.dumps/loads with pickle and with JSON
+written by hand.
+
+    python benchmarks/serialization.py [number of items]
+'''
+import json
+import pickle
+import sys
+import timeit
+from diffr import diff, dumps, loads, MappingDiffItem
+
+
+def to_json(diff_obj):
+    items = []
+    for diff_item in diff_obj:
+        if isinstance(diff_item, MappingDiffItem):
+            value = diff_item.value
+            entry = [
+                int(diff_item.key_state), diff_item.key, int(diff_item.state)]
+        else:
+            value = diff_item.item
+            entry = [int(diff_item.state), diff_item.context]
+        if hasattr(value, 'type'):
+            value = to_json(value)
+        entry.append(value)
+        items.append(entry)
+    return {'type': diff_obj.type.__name__, 'items': items}
+
+
+def measure(name, dump, load, diff_obj, repeat):
+    try:
+        data = dump(diff_obj)
+        load(data)
+    except Exception as e:
+        print('  {:<8} failed: {!r}'.format(name, e))
+        return
+    dump_time = min(timeit.repeat(lambda: dump(diff_obj), number=1,
+                                  repeat=repeat))
+    load_time = min(timeit.repeat(lambda: load(data), number=1,
+                                  repeat=repeat))
+    print('  {:<8} {:>10} bytes  dump {:7.1f} ms  load {:7.1f} ms'.format(
+        name, len(data), dump_time * 1000, load_time * 1000))
+
+
+def main(n, repeat=3):
+    a = dict(('key{}'.format(i), [i, i + 1, 'value']) for i in range(n))
+    b = dict(a)
+    for i in range(0, n, 10):
+        b['key{}'.format(i)] = [i, i + 2, 'value']
+    for i in range(0, n, 7):
+        b.pop('key{}'.format(i))
+    cases = [
+        ('nested mapping diff', diff(a, b)),
+        ('set diff', diff(set(range(n)), set(range(n // 2, n + n // 2)))),
+    ]
+    for name, diff_obj in cases:
+        print('{}, {} items:'.format(name, len(diff_obj)))
+        measure('diffr', dumps, loads, diff_obj, repeat)
+        measure(
+            'pickle',
+            lambda d: pickle.dumps(d, pickle.HIGHEST_PROTOCOL),
+            pickle.loads, diff_obj, repeat)
+        measure(
+            'json', lambda d: json.dumps(to_json(d)).encode('utf-8'),
+            json.loads, diff_obj, repeat)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -1,5 +1,14 @@
-from diffr.diff import diff
+from diffr.diff import diff, DiffCancelled
+from diffr.batch import diff_many
 from diffr.patch import patch
+from diffr.compose import compose
+from diffr.invert import invert
+from diffr.serialize import dumps, loads, dump, iter_load
+from diffr.archive import Archive
+from diffr.store import Store
+from diffr.json_files import diff_json_files, diff_jsonl_files
+from diffr.json_patch import to_json_patch, from_json_patch, apply_json_patch
+from diffr.cooperative import adiff
 from diffr.data_model import (
     insert, remove, changed, unchanged,
-    Diff, DiffItem, MappingDiffItem)
+    Diff, DiffView, DiffStats, DiffItem, MappingDiffItem, ArrayDiffItem)
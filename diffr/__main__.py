@@ -0,0 +1,203 @@
+'''
+Diff data files from the command line.
+
+    python -m diffr [options] FROM TO [FROM TO ...]
+
+Each FROM TO pair is two files or two directories. Directories are compared
+file by file, matching files by their paths relative to the directories.
+Files are read according to their extension:
+
+    .json             diffed straight from the file, see diff_json_files
+    .jsonl, .ndjson   diffed straight from the file, see diff_jsonl_files
+    .pickle, .pkl     unpickled and diffed
+    anything else     diffed as bytes
+
+The exit status is 0 if no pair differs, 1 if any pair differs and 2 if any
+pair can't be diffed.
+'''
+import argparse
+import mmap
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from diffr.diff import diff
+from diffr.json_files import diff_json_files, diff_jsonl_files
+from diffr.serialize import dumps
+
+SAME, DIFFERENT, ERROR = 0, 1, 2
+
+_TYPES = {
+    '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+    '.pickle': 'pickle', '.pkl': 'pickle'}
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as fp:
+        return pickle.load(fp)
+
+
+def _load_bytes(path):
+    with open(path, 'rb') as fp:
+        try:
+            return memoryview(
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+        except ValueError:
+            # empty files can't be mapped.
+            return memoryview(b'')
+
+
+_DIFFERS = {
+    'json': diff_json_files,
+    'jsonl': diff_jsonl_files,
+    'pickle': lambda a, b: diff(_load_pickle(a), _load_pickle(b)),
+    'bytes': lambda a, b: diff(_load_bytes(a), _load_bytes(b)),
+}
+
+
+def file_type(path):
+    '''
+    Return the type of the file at path, from its extension.
+    '''
+    return _TYPES.get(os.path.splitext(path)[1].lower(), 'bytes')
+
+
+def _render(diff_obj, path_a, path_b, options):
+    if options.format == 'diffr':
+        return dumps(diff_obj)
+    if options.brief:
+        return 'Files {} and {} differ\n'.format(path_a, path_b)
+    body = '\n'.join(diff_obj.iter_lines(
+        options.context, color=options.format == 'color'))
+    return '--- {}\n+++ {}\n{}\n'.format(path_a, path_b, body)
+
+
+def _diff_pair(task):
+    # run in the worker processes, so the output is rendered there too and
+    # only text goes back.
+    path_a, path_b, options = task
+    start = time.time()
+    try:
+        differ = _DIFFERS[options.type or file_type(path_a)]
+        diff_obj = differ(path_a, path_b)
+        status = DIFFERENT if diff_obj else SAME
+        output = _render(diff_obj, path_a, path_b, options) if status else ''
+    except Exception as e:
+        status = ERROR
+        output = 'diffr: {} {}: {}: {}\n'.format(
+            path_a, path_b, type(e).__name__, e)
+    return status, output, time.time() - start
+
+
+def _files(directory):
+    paths = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            paths.add(os.path.relpath(os.path.join(root, name), directory))
+    return paths
+
+
+def pairs(path_a, path_b):
+    '''
+    Yield the pairs of files to diff for two paths, and a message for each
+    file in only one of two directories.
+    '''
+    if os.path.isdir(path_a) and os.path.isdir(path_b):
+        files_a, files_b = _files(path_a), _files(path_b)
+        for name in sorted(files_a | files_b):
+            if name not in files_b:
+                yield 'Only in {}: {}\n'.format(path_a, name)
+            elif name not in files_a:
+                yield 'Only in {}: {}\n'.format(path_b, name)
+            else:
+                yield os.path.join(path_a, name), os.path.join(path_b, name)
+    else:
+        yield path_a, path_b
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='diffr', description='Diff data files and directories of them.')
+    parser.add_argument(
+        'paths', nargs='+', metavar='FROM TO',
+        help='pairs of files or directories to diff')
+    parser.add_argument(
+        '-t', '--type', choices=sorted(_DIFFERS),
+        help='read every file as this type rather than by its extension')
+    parser.add_argument(
+        '-f', '--format', choices=['color', 'plain', 'diffr'],
+        help="how to write diffs: in color, plain, or as diffr's binary "
+        'serialization, one record per differing pair. The default is color '
+        'on a terminal and plain otherwise.')
+    parser.add_argument(
+        '-C', '--context', type=int, metavar='N',
+        help='show N unchanged items around each change')
+    parser.add_argument(
+        '-q', '--brief', action='store_true',
+        help='only report which files differ')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help='diff N pairs at a time in worker processes, 0 for one worker '
+        'per CPU')
+    parser.add_argument(
+        '--timing', action='store_true',
+        help='report the time taken to diff each pair on stderr')
+    return parser
+
+
+def main(argv=None):
+    '''
+    Run the command line interface and return its exit status.
+    '''
+    parser = _parser()
+    options = parser.parse_args(argv)
+    if len(options.paths) % 2:
+        parser.error('paths must come in FROM TO pairs')
+    if options.format is None:
+        options.format = 'color' if sys.stdout.isatty() else 'plain'
+    if options.format == 'diffr':
+        stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        messages = sys.stderr
+    else:
+        stdout = messages = sys.stdout
+    status = SAME
+    entries = [
+        entry for path_a, path_b in zip(
+            options.paths[::2], options.paths[1::2])
+        for entry in pairs(path_a, path_b)]
+    tasks = [
+        entry + (options,) for entry in entries if isinstance(entry, tuple)]
+    pool = None
+    if options.jobs != 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(options.jobs or None)
+        results = pool.imap(_diff_pair, tasks)
+    else:
+        results = (_diff_pair(task) for task in tasks)
+    try:
+        # the results come back in order, between the messages about files
+        # in only one directory.
+        for entry in entries:
+            if not isinstance(entry, tuple):
+                messages.write(entry)
+                status = max(status, DIFFERENT)
+                continue
+            pair_status, output, seconds = next(results)
+            status = max(status, pair_status)
+            if pair_status == ERROR:
+                stdout.flush()
+                sys.stderr.write(output)
+            elif output:
+                stdout.write(output)
+            if options.timing:
+                sys.stderr.write('{} {}: {:.3f}s\n'.format(
+                    entry[0], entry[1], seconds))
+    finally:
+        if pool is not None:
+            pool.terminate()
+    stdout.flush()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
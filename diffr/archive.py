@@ -0,0 +1,191 @@
+'''
+An append-only archive of serialized Diffs with random access by number.
+
+An archive is two files: the data file, holding the records made by
+diffr.serialize one after the other exactly as dump writes them, and an
+index file next to it (the data file's path with '.idx' appended) holding
+the offset of every record as an 8 byte little endian integer. Both files
+are read through mmap, so reading a diff only touches the pages of its
+index entry and its record. The record is decoded where it is mapped and
+only the values of the Diff are built from it; a codec other than the
+default one is passed a copy of each encoded value.
+'''
+import mmap
+import os
+import struct
+from diffr.serialize import (
+    dumps, loads, MAGIC, _check_header, _read_varint, _varint)
+
+_OFFSET = struct.Struct('<Q')
+
+INDEX_SUFFIX = '.idx'
+
+
+def _scan(fp):
+    # the offsets of the records in a data file without an index.
+    offsets = []
+    fp.seek(0, os.SEEK_END)
+    size = fp.tell()
+    offset = 0
+    while offset < size:
+        fp.seek(offset)
+        header = bytearray(fp.read(len(MAGIC) + 1))
+        _check_header(bytes(header[:-1]), header[-1] if header else None)
+        length = _read_varint(fp)
+        offsets.append(offset)
+        offset = fp.tell() + length
+    if offset != size:
+        raise ValueError('Serialized diff is truncated')
+    return offsets
+
+
+def _record_end(view, start):
+    # the end of a record is read from its header rather than taken from the
+    # next offset, so bytes left by an interrupted append are never read.
+    length, pos = _varint(view, start + len(MAGIC) + 1)
+    return pos + length
+
+
+class _Mapping(object):
+    # a read only mapping of a file which grows as the file is appended to.
+    def __init__(self, fp):
+        self.fp = fp
+        self.map = None
+        self.view = None
+
+    def buffer(self, size):
+        if self.view is None or len(self.view) < size:
+            self.close()
+            self.map = mmap.mmap(
+                self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+        return self.view
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.map.close()
+            self.view = self.map = None
+
+
+class Archive(object):
+    '''
+    An append-only file of Diffs, e.g. the history of a document.
+
+        with Archive('history.diffr') as archive:
+            archive.append(diff(a, b))
+            first = archive[0]
+            for diff_obj in archive.iter_range(100, 200):
+                ...
+
+    :parameter path: path of the data file, created if it doesn't exist. If
+        it exists without an index the index is rebuilt by reading the
+        headers of its records.
+    :parameter mode: 'a' to read and append or 'r' to only read.
+    :parameter codec: Optional value codec, see diffr.serialize.ValueCodec.
+        Every diff in an archive must be written with the same codec.
+    :parameter types: Types the diffs may be of as well as the builtin ones,
+        see diffr.serialize.loads.
+    '''
+    def __init__(self, path, mode='a', codec=None, types=()):
+        if mode not in ('a', 'r'):
+            raise ValueError('Invalid archive mode {!r}'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.codec = codec
+        self.types = types
+        file_mode = 'a+b' if mode == 'a' else 'rb'
+        index_path = path + INDEX_SUFFIX
+        self._data = open(path, file_mode)
+        # a read only archive without an index keeps the offsets it reads in
+        # memory instead.
+        self._offsets = None
+        if os.path.exists(index_path):
+            self._index = open(index_path, file_mode)
+        else:
+            offsets = _scan(self._data)
+            if mode == 'a':
+                self._index = open(index_path, 'w+b')
+                self._index.write(
+                    b''.join(_OFFSET.pack(offset) for offset in offsets))
+                self._index.flush()
+            else:
+                self._index = None
+                self._offsets = offsets
+        self._data.seek(0, os.SEEK_END)
+        self._size = self._data.tell()
+        if self._offsets is None:
+            self._index.seek(0, os.SEEK_END)
+            self._length = self._index.tell() // _OFFSET.size
+        else:
+            self._length = len(self._offsets)
+        self._data_map = _Mapping(self._data)
+        self._index_map = _Mapping(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''
+        Close the archive's files.
+        '''
+        self._data_map.close()
+        self._index_map.close()
+        self._data.close()
+        if self._index is not None:
+            self._index.close()
+
+    def __len__(self):
+        return self._length
+
+    def append(self, diff):
+        '''
+        Write diff to the end of the archive and return its number.
+        '''
+        if self.mode != 'a':
+            raise IOError('Archive {} is read only'.format(self.path))
+        record = dumps(diff, self.codec)
+        # the record is written before its offset, so a failed append
+        # leaves at worst a record which isn't indexed.
+        self._data.write(record)
+        self._data.flush()
+        self._index.write(_OFFSET.pack(self._size))
+        self._index.flush()
+        self._size += len(record)
+        self._length += 1
+        return self._length - 1
+
+    def _offset(self, index):
+        if self._offsets is not None:
+            return self._offsets[index]
+        view = self._index_map.buffer(self._length * _OFFSET.size)
+        return _OFFSET.unpack_from(view, index * _OFFSET.size)[0]
+
+    def _load(self, index):
+        start = self._offset(index)
+        view = self._data_map.buffer(self._size)
+        return loads(
+            view[start:_record_end(view, start)], self.codec, self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.iter_range(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('Archive index out of range')
+        return self._load(index)
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def iter_range(self, start=0, stop=None, step=1):
+        '''
+        Yield the diffs numbered start up to stop, decoding each one only
+        when it is reached.
+        '''
+        for index in range(*slice(start, stop, step).indices(self._length)):
+            yield self._load(index)
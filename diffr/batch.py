@@ -0,0 +1,62 @@
+'''
+Diff many pairs of objects at once, in batches spread over worker processes.
+'''
+from itertools import islice
+from diffr.diff import diff
+
+
+def _batches(pairs, chunksize):
+    pairs = iter(pairs)
+    start = 0
+    while True:
+        batch = list(islice(pairs, chunksize))
+        if not batch:
+            return
+        yield start, batch
+        start += len(batch)
+
+
+def _diff_batch(batch):
+    # the pairs are sent to a worker, and their Diffs sent back, a batch at a
+    # time, so objects shared by the pairs of a batch are only pickled once.
+    start, pairs = batch
+    return start, [diff(from_, to) for from_, to in pairs]
+
+
+def diff_many(pairs, workers=None, chunksize=64, ordered=True):
+    '''
+    Yield the Diffs of an iterable of (from_, to) pairs. The pairs are diffed
+    in batches by a pool of worker processes, which is shut down when the
+    generator is finished or closed. An exception raised diffing a pair is
+    raised in place of the Diffs of its batch.
+
+    :parameter pairs: iterable of pairs of objects to diff, read ahead of the
+        Diffs being yielded.
+    :parameter workers: Number of worker processes, one per CPU by default.
+        With 1 the pairs are diffed in this process.
+    :parameter chunksize: Number of pairs in a batch. Bigger batches spread
+        the cost of sending work to the workers over more pairs.
+    :parameter ordered: Yield the Diffs in the order of the pairs. Otherwise
+        yield (index, Diff) tuples, a batch at a time as the batches finish.
+    '''
+    batches = _batches(pairs, chunksize)
+    pool = None
+    if workers == 1:
+        results = (_diff_batch(batch) for batch in batches)
+    else:
+        # imported here so that importing diffr doesn't pay for it.
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        imap = pool.imap if ordered else pool.imap_unordered
+        results = imap(_diff_batch, batches)
+    try:
+        for start, diffs in results:
+            if ordered:
+                for diff_obj in diffs:
+                    yield diff_obj
+            else:
+                for index_and_diff in enumerate(diffs, start):
+                    yield index_and_diff
+    finally:
+        if pool is not None:
+            pool.terminate()
@@ -0,0 +1,302 @@
+from collections import OrderedDict
+from collections.abc import Sequence, Mapping, Set
+from diffr.data_model import (
+    remove, insert, changed, unchanged, nested_diff, is_ndarray_type,
+    _BINARY_TYPES,
+    Diff, DiffItem, MappingDiffItem, ArrayDiffItem)
+from diffr.diff import values_are_equal, diff_bytes, _ndarray_mismatch
+from diffr.invert import invert
+from diffr.patch import patch
+
+
+def compose(first, second):
+    '''
+    Return a single Diff equivalent to applying the Diff first and then the
+    Diff second, i.e. if second is a diff of the object first leads to:
+        patch(obj, compose(first, second)) == patch(patch(obj, first), second)
+    The diffs are merged item by item, the object between them is never
+    built.
+
+    :parameter first: Diff from object a to object b
+    :parameter second: Diff from object b to object c
+    '''
+    if first.type != second.type:
+        raise TypeError(
+            'compose params are diffs of different types {} != {}'.format(
+                first.type, second.type))
+    obj_type = first.type
+    if is_ndarray_type(obj_type):
+        return compose_ndarray(first, second)
+    elif issubclass(obj_type, _BINARY_TYPES):
+        return compose_bytes(first, second)
+    elif issubclass(obj_type, Sequence):
+        return compose_sequence(first, second)
+    elif issubclass(obj_type, Set):
+        return compose_set(first, second)
+    elif issubclass(obj_type, OrderedDict):
+        return compose_ordered_mapping(first, second)
+    elif issubclass(obj_type, Mapping):
+        return compose_mapping(first, second)
+    else:
+        raise TypeError(
+            'No mechanism for composing diffs of type {}'.format(obj_type))
+
+
+def _value(diff_item):
+    if isinstance(diff_item, MappingDiffItem):
+        return diff_item.value
+    return diff_item.item
+
+
+def rebuild(diff, state):
+    '''
+    Rebuild the object a diff was made from (state=remove) or the object it
+    leads to (state=insert) from the items of the diff. ndarray diffs only
+    hold the elements that changed so they can't be rebuilt.
+    '''
+    obj_type = diff.type
+    if is_ndarray_type(obj_type):
+        raise ValueError('The objects of an ndarray diff cannot be rebuilt')
+    values = []
+    for diff_item in diff:
+        if diff_item.state == changed:
+            value = rebuild(nested_diff(diff_item), state)
+        elif diff_item.state in (unchanged, state):
+            value = _value(diff_item)
+        else:
+            continue
+        if isinstance(diff_item, MappingDiffItem):
+            value = (diff_item.key, value)
+        values.append(value)
+    if issubclass(obj_type, _BINARY_TYPES):
+        if obj_type is bytearray:
+            return bytearray().join(values)
+        joined = b''.join(values)
+        return joined if obj_type is bytes else obj_type(joined)
+    if issubclass(obj_type, str):
+        return ''.join(values)
+    if hasattr(obj_type, '_make'):
+        return obj_type._make(values)
+    return obj_type(values)
+
+
+def _compose_items(first_item, second_item):
+    '''
+    Return the (state, value) of the composed item for one element, given the
+    item of the first diff and the item of the second diff that refer to it.
+    first_item is None for elements inserted by the second diff and
+    second_item is None for elements removed by the first. Returns None if
+    the element is inserted by the first diff and removed by the second.
+    '''
+    if second_item is None:
+        return remove, _value(first_item)
+    if first_item is None:
+        return insert, _value(second_item)
+    state = first_item.state
+    value = _value(first_item)
+    if second_item.state == unchanged:
+        return state, value
+    elif second_item.state == remove:
+        if state == insert:
+            return None
+        elif state == changed:
+            if is_ndarray_type(value.type):
+                # the array removed is the one the first diff led to, so
+                # undoing the first diff on it gives the original array.
+                return remove, patch(_value(second_item), invert(value))
+            return remove, rebuild(value, remove)
+        return remove, value
+    nested = _value(second_item)
+    if state == unchanged:
+        return changed, nested
+    elif state == insert:
+        return insert, patch(value, nested)
+    composed = compose(value, nested)
+    if composed:
+        return changed, composed
+    if is_ndarray_type(value.type):
+        # neither diff holds the whole array, so the unchanged item keeps
+        # the value of the first item.
+        return unchanged, value
+    return unchanged, rebuild(value, remove)
+
+
+def _mismatched_diffs():
+    return ValueError(
+        'The second diff does not start from the object the first diff '
+        'leads to')
+
+
+def _pair_in_order(first, second):
+    '''
+    Pair up the items of two diffs over ordered types. The items of both
+    diffs that refer to the elements of the object between them come in the
+    same order, so the diffs are walked together.
+    '''
+    following = iter(second)
+    for first_item in first:
+        if first_item.state == remove:
+            yield first_item, None
+            continue
+        for second_item in following:
+            if second_item.state == insert:
+                yield None, second_item
+            else:
+                yield first_item, second_item
+                break
+        else:
+            raise _mismatched_diffs()
+    for second_item in following:
+        if second_item.state != insert:
+            raise _mismatched_diffs()
+        yield None, second_item
+
+
+def _pair_by_key(first, second, key):
+    '''
+    Pair up the items of two diffs over unordered types by key.
+    '''
+    following = {}
+    insertions = []
+    for second_item in second:
+        if second_item.state == insert:
+            insertions.append(second_item)
+        else:
+            following[key(second_item)] = second_item
+    for first_item in first:
+        if first_item.state == remove:
+            yield first_item, None
+            continue
+        try:
+            yield first_item, following.pop(key(first_item))
+        except KeyError:
+            raise _mismatched_diffs()
+    if following:
+        raise _mismatched_diffs()
+    for second_item in insertions:
+        yield None, second_item
+
+
+def compose_sequence(first, second):
+    diffs = []
+    f = t = 0
+    for items in _pair_in_order(first, second):
+        composed = _compose_items(*items)
+        if composed is None:
+            continue
+        state, value = composed
+        if (state == insert and diffs and diffs[-1].state == remove and
+                values_are_equal(diffs[-1].item, value)):
+            # removed by one diff and put straight back by the other.
+            diffs[-1] = DiffItem(unchanged, value, (f - 1, f, t, t + 1))
+            t += 1
+            continue
+        f_e = f if state == insert else f + 1
+        t_e = t if state == remove else t + 1
+        diffs.append(DiffItem(state, value, (f, f_e, t, t_e)))
+        f, t = f_e, t_e
+    return Diff(first.type, diffs, first.depth)
+
+
+def _key_states(first, second):
+    '''
+    Return a function giving the key state of a composed mapping item: keys
+    are only removed or inserted if they are missing from the last or first
+    object.
+    '''
+    first_keys = set(di.key for di in first if di.state != insert)
+    last_keys = set(di.key for di in second if di.state != remove)
+
+    def key_state(key, state):
+        if state == remove and key not in last_keys:
+            return remove
+        elif state == insert and key not in first_keys:
+            return insert
+        return unchanged
+    return key_state
+
+
+def compose_ordered_mapping(first, second):
+    key_state = _key_states(first, second)
+    diffs = []
+    for items in _pair_in_order(first, second):
+        composed = _compose_items(*items)
+        if composed is not None:
+            state, value = composed
+            key = (items[0] or items[1]).key
+            diffs.append(
+                MappingDiffItem(key_state(key, state), key, state, value))
+    return Diff(first.type, diffs, first.depth)
+
+
+def _compose_by_key(first, second, key, make_item):
+    removals, other, insertions = [], [], []
+    for items in _pair_by_key(first, second, key):
+        composed = _compose_items(*items)
+        if composed is not None:
+            state, value = composed
+            {remove: removals, insert: insertions}.get(state, other).append(
+                (key(items[0] or items[1]), state, value))
+    # an element removed by one diff and put back by the other is unchanged.
+    removed = dict((k, value) for k, _, value in removals)
+    restored = set(
+        k for k, _, value in insertions
+        if k in removed and values_are_equal(removed[k], value))
+    if restored:
+        removals = [i for i in removals if i[0] not in restored]
+        insertions = [i for i in insertions if i[0] not in restored]
+        other += [(k, unchanged, removed[k]) for k in restored]
+    diffs = [make_item(*i) for i in removals + other + insertions]
+    return Diff(first.type, diffs, first.depth)
+
+
+def compose_mapping(first, second):
+    key_state = _key_states(first, second)
+    return _compose_by_key(
+        first, second, lambda di: di.key,
+        lambda key, state, value: MappingDiffItem(
+            key_state(key, state), key, state, value))
+
+
+def compose_set(first, second):
+    return _compose_by_key(
+        first, second, lambda di: di.item,
+        lambda item, state, _: DiffItem(state, item))
+
+
+def compose_ndarray(first, second):
+    # the changed elements of both diffs are overlaid: the from values come
+    # from the first diff wherever it has them, the to values from the second.
+    # Likewise the from dtype is the first diff's and the to dtype the
+    # second's.
+    import numpy
+    items = list(first) + list(second)
+    if len(items) < 2:
+        return Diff(first.type, items, first.depth)
+    a, b = items
+    if a.shape != b.shape:
+        raise ValueError(
+            'Cannot compose ndarray diffs of different shapes {} != {}'.format(
+                a.shape, b.shape))
+    indices = numpy.union1d(a.indices, b.indices)
+    in_a = numpy.searchsorted(indices, a.indices)
+    in_b = numpy.searchsorted(indices, b.indices)
+    from_values = numpy.empty(len(indices), a.from_values.dtype)
+    from_values[in_b] = b.from_values
+    from_values[in_a] = a.from_values
+    to_values = numpy.empty(len(indices), b.to_values.dtype)
+    to_values[in_a] = a.to_values
+    to_values[in_b] = b.to_values
+    keep = _ndarray_mismatch(from_values, to_values)
+    diffs = []
+    if keep.any() or from_values.dtype != to_values.dtype:
+        diffs.append(ArrayDiffItem(
+            a.shape, indices[keep], from_values[keep], to_values[keep]))
+    return Diff(first.type, diffs, first.depth)
+
+
+def compose_bytes(first, second):
+    # binary diffs hold all the bytes of both objects they were made from, so
+    # the ends of the chain are rebuilt from them and diffed afresh.
+    return diff_bytes(
+        rebuild(first, remove), rebuild(second, insert), first.depth)
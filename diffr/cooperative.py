@@ -0,0 +1,55 @@
+'''
+Diffing which doesn't block an asyncio event loop.
+
+diff runs the steps of a diff, generators which yield whenever they can be
+paused: after each row of a largest common subsequence matrix, each chunk of
+a sequence, each key of a mapping, each block of a binary object and each
+block of elements of an ndarray. adiff runs the same steps for a slice of
+time, then gives the event loop a turn, so the diffs made are the same as
+diff makes.
+'''
+import time
+from diffr.diff import diff, _diff_steps
+
+
+def _size(obj):
+    try:
+        return len(obj)
+    except TypeError:
+        return 0
+
+
+async def adiff(from_, to, slice_ms=5, executor=None, offload_threshold=0):
+    '''
+    Return the same Diff as diff(from_, to), without holding up the event
+    loop for more than about slice_ms milliseconds at a time.
+
+    :parameter from_: first collection
+    :parameter to: second collection
+    :parameter slice_ms: Longest time to diff for between turns of the event
+        loop.
+    :parameter executor: Optional concurrent.futures executor. Pairs with at
+        least offload_threshold items between them are diffed by it rather
+        than on the event loop. With a process pool executor the objects and
+        the Diff are pickled to and from the worker.
+    :parameter offload_threshold: Number of top level items from which pairs
+        are diffed by the executor.
+    '''
+    # imported here as asyncio takes longer to import than the rest of
+    # diffr, and most programs that import diffr never call adiff.
+    import asyncio
+    if executor is not None and (
+            _size(from_) + _size(to) >= offload_threshold):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, diff, from_, to)
+    steps = _diff_steps(from_, to, 0)
+    slice_seconds = slice_ms / 1000.0
+    deadline = time.monotonic() + slice_seconds
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+        if time.monotonic() >= deadline:
+            await asyncio.sleep(0)
+            deadline = time.monotonic() + slice_seconds
@@ -1,17 +1,135 @@
-from blessings import Terminal
-from collections import Sequence, OrderedDict
-from numbers import Integral
-from contextlib import contextmanager
+import hashlib
+import sys
+from array import array
+from itertools import groupby, islice
+from collections import OrderedDict, namedtuple, defaultdict
+from collections.abc import Sequence, Mapping, Set
+from numbers import Integral, Number, Rational
+
+
+class _LazyTerminal(object):
+    '''
+    Stands in for a blessings Terminal. Creating a Terminal imports blessings
+    and probes the terminal, which is wasted effort for anyone who never
+    prints a diff, so it is put off until the first attribute is looked up.
+    '''
+    def __init__(self):
+        self._terminal = None
+
+    def __getattr__(self, name):
+        if self._terminal is None:
+            from blessings import Terminal
+            self._terminal = Terminal()
+        return getattr(self._terminal, name)
+
+
+term = _LazyTerminal()
+
+
+class _State(int):
+    '''
+    The state of a DiffItem. States are plain int constants so comparing,
+    storing and pickling them is cheap; colour is only applied when a diff is
+    rendered. For convenience calling a state with a string returns the string
+    in the state's colour.
+    '''
+    def __new__(cls, code, name, color):
+        state = int.__new__(cls, code)
+        state.name = name
+        state.color = color
+        return state
+
+    def __repr__(self):
+        return self.name
+
+    def __reduce__(self):
+        # there is exactly one of each state, so pickle them by name.
+        return self.name
+
+    def __call__(self, string):
+        return style(self, string)
 
 
-term = Terminal()
 # FIXME: - what if the users terminal has a white bg? It would be nice to work
-# out what color the users terminal is at import time and choose a sensible
+# out what color the users terminal is at render time and choose a sensible
 # color scheme.
-insert = term.green
-remove = term.red
-unchanged = lambda string: term.normal + string
-changed = term.yellow
+unchanged = _State(0, 'unchanged', 'normal')
+insert = _State(1, 'insert', 'green')
+remove = _State(2, 'remove', 'red')
+changed = _State(3, 'changed', 'yellow')
+_STATES = (unchanged, insert, remove, changed)
+
+
+def style(state, string, terminal=term):
+    '''
+    Return string formatted in the colour of state.
+    '''
+    if state is unchanged:
+        return terminal.normal + string
+    return getattr(terminal, state.color)(string)
+
+
+def _styled_lines(state, lines, terminal):
+    '''
+    Yield lines which join up to style(state, '\\n'.join(lines)), styling them
+    as they come.
+    '''
+    before, _, after = style(state, '\0', terminal).partition('\0')
+    lines = iter(lines)
+    line = before + next(lines)
+    for next_line in lines:
+        yield line
+        line = next_line
+    yield line + after
+
+
+_terminals = {}
+
+
+def _styled_terminal(color):
+    # Terminals which always (True) or never (False) style their output.
+    if color not in _terminals:
+        import curses
+        from blessings import Terminal
+        if color:
+            # color is wanted even if TERM doesn't describe a terminal.
+            try:
+                terminal = Terminal(force_styling=True)
+            except curses.error:
+                terminal = Terminal(kind='xterm', force_styling=True)
+        else:
+            terminal = Terminal(force_styling=None)
+        _terminals[color] = terminal
+    return _terminals[color]
+
+
+class RenderOptions(namedtuple(
+        'RenderOptions', ('context', 'color', 'width'))):
+    '''
+    How to render a Diff. The options are passed down through the rendering
+    of the diffs nested in it rather than set on them, so any number of
+    threads can render the same Diff in different ways at once.
+
+    :attribute context: Number of unchanged items to show either side of
+        each change, None to show every item.
+    :attribute color: True or False to always or never color the output,
+        None to color it if the terminal supports it.
+    :attribute width: Width of the rows of string diffs, None for the width
+        of the terminal.
+    '''
+    __slots__ = ()
+
+    def __new__(cls, context=None, color=None, width=None):
+        return super(RenderOptions, cls).__new__(cls, context, color, width)
+
+    @property
+    def terminal(self):
+        if self.color is None:
+            return term
+        return _styled_terminal(self.color)
+
+
+_DEFAULT_OPTIONS = RenderOptions()
 
 
 class _Window(object):
@@ -32,18 +150,279 @@ def state_to_prefix(state):
     return prefix
 
 
+def is_ndarray(obj):
+    # numpy is an optional dependency. If it has not been imported then obj
+    # can't be an ndarray, so there is no need to pay for importing it here.
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
+def is_numpy_scalar(obj):
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and isinstance(obj, numpy.generic)
+
+
+def is_ndarray_type(obj_type):
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and issubclass(obj_type, numpy.ndarray)
+
+
+def _ndarray_mismatch(from_, to, tolerance=None):
+    '''
+    Return a boolean mask of the elements that differ between two ndarrays of
+    the same shape, using a single vectorised comparison. NaNs in the same
+    position are not considered to differ. tolerance is an absolute
+    tolerance for numeric arrays, it is ignored for other arrays.
+    '''
+    if (tolerance is not None and from_.dtype.kind in 'iufc' and
+            to.dtype.kind in 'iufc'):
+        import numpy
+        return ~numpy.isclose(
+            from_, to, rtol=0, atol=tolerance, equal_nan=True)
+    mismatch = from_ != to
+    if from_.dtype.kind in 'fc':
+        mismatch &= ~((from_ != from_) & (to != to))
+    return mismatch
+
+
+def values_are_equal(a, b, tolerance=None):
+    '''
+    Equality test for values which may be numpy ndarrays, or collections of
+    them, where == is elementwise rather than a simple yes or no. ndarrays
+    are equal if they have the same shape and dtype and their elements are
+    equal, to within tolerance if it is given.
+    '''
+    if is_ndarray(a) or is_ndarray(b):
+        return (
+            type(a) == type(b) and
+            a.shape == b.shape and
+            a.dtype == b.dtype and
+            not _ndarray_mismatch(a, b, tolerance).any())
+    try:
+        return bool(a == b)
+    except ValueError:
+        # the truth of == is ambiguous for ndarrays inside collections, so
+        # their items are compared one by one instead.
+        if type(a) != type(b) or not isinstance(a, (Sequence, Mapping)):
+            raise
+    if len(a) != len(b):
+        return False
+    if isinstance(a, Sequence):
+        return all(
+            values_are_equal(x, y, tolerance) for x, y in zip(a, b))
+    if isinstance(a, OrderedDict) and list(a) != list(b):
+        return False
+    return all(
+        k in b and values_are_equal(v, b[k], tolerance)
+        for k, v in a.items())
+
+
+_BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+def is_binary(obj):
+    return isinstance(obj, _BINARY_TYPES)
+
+
 def is_ordered(collection):
     return any((issubclass(collection, c) for c in (Sequence, OrderedDict)))
 
 
+# types whose objects stand in for another value, e.g. the unparsed values of
+# diffr.json_files, mapped to a function returning that value. They are
+# fingerprinted and digested as the value they stand in for.
+_proxy_types = {}
+
+
+def fingerprint(value):
+    '''
+    Return a hashable stand-in for value. Values which compare equal always
+    have equal fingerprints, but values with equal fingerprints don't
+    necessarily compare equal. Hashable values are their own fingerprint.
+    '''
+    try:
+        hash(value)
+        return value
+    except (TypeError, ValueError):
+        # ValueError is raised for writable memoryviews
+        pass
+    # check for the builtin containers first, the abc checks are slow.
+    if isinstance(value, list):
+        return ('sequence', tuple(map(fingerprint, value)))
+    elif isinstance(value, (dict, Mapping)):
+        return (
+            'mapping',
+            frozenset((k, fingerprint(v)) for k, v in value.items()))
+    elif isinstance(value, (set, Set)):
+        return frozenset(value)
+    elif is_binary(value):
+        return bytes(value)
+    elif is_ndarray(value):
+        return ('ndarray', value.shape)
+    elif isinstance(value, Sequence):
+        return ('sequence', tuple(map(fingerprint, value)))
+    elif type(value) in _proxy_types:
+        return fingerprint(_proxy_types[type(value)](value))
+    # nothing is known about value, so it has to share a fingerprint with
+    # every other value like it.
+    return 'unhashable'
+
+
+def _ascii(value):
+    return str(value).encode('ascii')
+
+
+def _update_int(h, value):
+    # written out in full, so unlike their hashes no two ints are encoded
+    # alike. bools are written as 0 and 1.
+    h.update(b'n%d;' % value)
+
+
+def _update_float(h, value):
+    if value.is_integer():
+        # equal to an int, so encoded as one.
+        _update_int(h, value)
+    elif value != value:
+        h.update(b'nan;')
+    else:
+        h.update(b'n' + value.hex().encode('ascii') + b';')
+
+
+def _update_number(h, value):
+    # numbers that compare equal must be encoded alike whatever their type,
+    # so each is encoded as the int or float it equals, or else as an exact
+    # ratio of ints.
+    if isinstance(value, Integral):
+        _update_int(h, int(value))
+    elif isinstance(value, float):
+        _update_float(h, value)
+    elif value != value:
+        h.update(b'nan;')
+    elif getattr(value, 'imag', 0):
+        h.update(b'c')
+        _update_number(h, value.real)
+        _update_number(h, value.imag)
+    else:
+        value = getattr(value, 'real', value)
+        try:
+            as_float = float(value)
+        except (TypeError, ValueError, OverflowError):
+            as_float = None
+        if as_float == value:
+            _update_float(h, as_float)
+        elif isinstance(value, Rational):
+            h.update(b'n%d/%d;' % (value.numerator, value.denominator))
+        elif hasattr(value, 'as_integer_ratio'):
+            h.update(b'n%d/%d;' % value.as_integer_ratio())
+        else:
+            h.update(b'h' + _ascii(hash(value)) + b';')
+
+
+def _update_text(h, value):
+    data = value.encode('utf-8')
+    h.update(b's' + _ascii(len(data)) + b':')
+    h.update(data)
+
+
+def _update_sequence(h, value):
+    # tuples and namedtuples can be equal, lists and tuples can't.
+    tag = b'l' if isinstance(value, list) else b't'
+    h.update(tag + _ascii(len(value)) + b':')
+    for v in value:
+        _update(h, v)
+
+
+def _update_none(h, value):
+    h.update(b'N')
+
+
+_fast_updates = {
+    int: _update_int, float: _update_float, bool: _update_int,
+    str: _update_text, tuple: _update_sequence, list: _update_sequence,
+    type(None): _update_none}
+
+
+def _update(h, value):
+    '''
+    Feed an unambiguous encoding of value to the hash object h.
+    '''
+    fast_update = _fast_updates.get(type(value))
+    if fast_update:
+        fast_update(h, value)
+    elif isinstance(value, (Diff, DiffItem)):
+        h.update(value.digest())
+    elif isinstance(value, Number):
+        _update_number(h, value)
+    elif isinstance(value, str):
+        _update_text(h, value)
+    elif is_binary(value):
+        data = value if isinstance(value, memoryview) else memoryview(value)
+        h.update(b'b' + _ascii(data.nbytes) + b':')
+        h.update(data)
+    elif is_ndarray(value):
+        _update(h, value.tolist())
+    elif isinstance(value, (Mapping, Set)):
+        # unordered, so the digests of the entries are sorted
+        if isinstance(value, Mapping):
+            h.update(b'm')
+            entries = [value_digest((k, v)) for k, v in value.items()]
+        else:
+            h.update(b'S')
+            entries = [value_digest(v) for v in value]
+        entries.sort()
+        h.update(_ascii(len(entries)) + b':')
+        for entry in entries:
+            h.update(entry)
+    elif isinstance(value, Sequence):
+        _update_sequence(h, value)
+    elif type(value) in _proxy_types:
+        _update(h, _proxy_types[type(value)](value))
+    elif is_numpy_scalar(value):
+        # numpy scalars which aren't Numbers, e.g. numpy bools, compare
+        # equal to the python values they hold.
+        _update(h, value.item())
+    elif hasattr(type(value), '__index__'):
+        # ints in all but name.
+        _update_int(h, value.__index__())
+    else:
+        try:
+            h.update(b'h' + _ascii(hash(value)) + b';')
+        except TypeError:
+            h.update(b'?')
+
+
+def value_digest(value):
+    '''
+    Return a sha1 digest of value. Values which compare equal always get the
+    same digest. Digests of builtin types, and of Diffs made up of them, are
+    stable between processes and python versions; for other types the digest
+    falls back on hash().
+    '''
+    h = hashlib.sha1()
+    _update(h, value)
+    return h.digest()
+
+
 def sequences_contain_same_items(a, b):
+    '''
+    Return True if a and b contain the same items, ignoring order. Items are
+    bucketed by fingerprint first so that each item is only compared against
+    the handful of items it could be equal to.
+    '''
+    if len(a) != len(b):
+        return False
+    buckets = defaultdict(list)
+    for item in b:
+        buckets[fingerprint(item)].append(item)
     for item in a:
+        bucket = buckets.get(fingerprint(item))
+        if not bucket:
+            return False
         try:
-            i = b.index(item)
+            bucket.remove(item)
         except ValueError:
             return False
-        b = b[:i] + b[i+1:]
-    return not b
+    return True
 
 
 def diffs_are_equal(diff_a, diff_b):
@@ -95,22 +474,113 @@ def context_slice(diff_list, context_limit):
         _get_context_slice_indices(diff_list, context_limit)]
 
 
-def recursively_set_context_limit(diff, context_limit):
-    diff._context_limit = context_limit
-    for diff_item in diff:
-        if type(diff_item) == DiffItem:
-            item = diff_item.item
-        else:
-            item = diff_item.value
-        if isinstance(item, Diff):
-            recursively_set_context_limit(item, context_limit)
+def nested_diff(diff_item):
+    '''
+    Return the Diff held by a changed item, or None if it doesn't hold one.
+    '''
+    if isinstance(diff_item, MappingDiffItem):
+        item = diff_item.value
+    else:
+        item = diff_item.item
+    if isinstance(item, Diff):
+        return item
+    return None
+
+
+DiffColumns = namedtuple('DiffColumns', ('states', 'contexts', 'items'))
+_NO_CONTEXT = (-1, -1, -1, -1)
+
+
+def _build_columns(diffs):
+    contexts = array('q')
+    for diff_item in diffs:
+        contexts.extend(getattr(diff_item, 'context', None) or _NO_CONTEXT)
+    states = bytearray(diff_item.state for diff_item in diffs)
+    return DiffColumns(states, contexts, diffs)
 
 
-@contextmanager
-def adjusted_context_limit(diff, context_limit):
-    recursively_set_context_limit(diff, context_limit)
-    yield
-    recursively_set_context_limit(diff, None)
+class DiffStats(namedtuple(
+        'DiffStats', ('unchanged', 'inserted', 'removed', 'changed'))):
+    '''
+    Counts of the items of a Diff, including those of its nested Diffs.
+    unchanged, inserted and removed count leaf items (bytes for a binary
+    diff, elements for an ndarray), changed counts items with a nested diff.
+    The fields are in the same order as the state codes.
+    '''
+    __slots__ = ()
+
+    @property
+    def edit_distance(self):
+        return self.inserted + self.removed
+
+    @property
+    def similarity(self):
+        '''
+        2 * matches / total items in both objects, like difflib's ratio.
+        '''
+        total = 2 * self.unchanged + self.inserted + self.removed
+        if not total:
+            return 1.0
+        return 2.0 * self.unchanged / total
+
+
+_NO_STATS = DiffStats(0, 0, 0, 0)
+
+
+def sum_stats(stats):
+    return DiffStats(*map(sum, zip(_NO_STATS, *stats)))
+
+
+def _item_stats(diff_item, weigh):
+    if isinstance(diff_item, ArrayDiffItem):
+        size = 1
+        for dimension in diff_item.shape:
+            size *= dimension
+        count = len(diff_item.indices)
+        return DiffStats(size - count, count, count, 1)
+    state = diff_item.state
+    if state == changed:
+        item = nested_diff(diff_item)
+        if item is not None:
+            return sum_stats([item.stats, DiffStats(0, 0, 0, 1)])
+        return DiffStats(0, 0, 0, 1)
+    counts = [0, 0, 0, 0]
+    counts[state] = weigh(diff_item.item) if weigh else 1
+    return DiffStats(*counts)
+
+
+_SIDES = ('from', 'to')
+
+
+def _check_side(side):
+    if side not in _SIDES:
+        raise ValueError(
+            'side must be one of {}, not {!r}'.format(_SIDES, side))
+
+
+def _path_components(diff_item, side='to'):
+    '''
+    Return the path components that lead to a DiffItem from its Diff: the key
+    of a mapping item, the position of an item in a sequence, the positions
+    of the elements of an ndarray item and the element itself for a set.
+
+    Sequence positions are positions in the object on side, 'from' for the
+    first object diffed or 'to' for the second. Items which aren't in that
+    object, removals for 'to' and insertions for 'from', are at the position
+    they were removed from or inserted at.
+    '''
+    if isinstance(diff_item, MappingDiffItem):
+        return [diff_item.key]
+    if isinstance(diff_item, ArrayDiffItem):
+        return diff_item.positions()
+    if diff_item.context is not None:
+        f_s, _, t_s, _ = diff_item.context
+        return [t_s if side == 'to' else f_s]
+    try:
+        hash(diff_item.item)
+    except TypeError:
+        return []
+    return [diff_item.item]
 
 
 class Diff(object):
@@ -122,15 +592,18 @@ class Diff(object):
     :property type: The type of the objects being diffed
     :property depth: Indicates how deep this diff is in a nested diff.
     '''
-    def __init__(self, obj_type, diffs, depth=0):
+    def __init__(self, obj_type, diffs, depth=0, stats=None):
         self._type = obj_type
         self._diffs = tuple(diffs)
-        # flag used by __format__ and the DiffContext context manager
-        self._context_limit = None
+        # the diff functions count as they go, otherwise counted on demand
+        self._stats = stats
+        # built on demand by get() and iter_changes()
+        self._path_index = None
+        # built on demand by columns()
+        self._columns = None
+        self._digest = None
         self._depth = depth
         self._indent = '   ' * self._depth
-        self._start = unchanged('{}('.format(self._type.__name__))
-        self._end = unchanged(')')
 
     @property
     def type(self):
@@ -146,17 +619,144 @@ class Diff(object):
             _, from_end, _, to_end = context_block[-1].context
             return (from_start, from_end, to_start, to_end)
 
+    def columns(self):
+        '''
+        Return the Diff in columnar form: a bytearray of state codes, a flat
+        array('q') of contexts with four entries per item (-1 where an item
+        has no context) and the tuple of items, all in the same order. The
+        columns are built on first use and kept.
+        '''
+        if self._columns is None:
+            self._columns = _build_columns(self._diffs)
+        return self._columns
+
+    def indices(self, state):
+        '''
+        Return the indices of the items in the given state.
+        '''
+        states = self.columns().states
+        indices = []
+        i = states.find(state)
+        while i != -1:
+            indices.append(i)
+            i = states.find(state, i + 1)
+        return indices
+
+    def _items_in_state(self, state):
+        items = self._diffs
+        return [items[i] for i in self.indices(state)]
+
+    def inserts(self):
+        return self._items_in_state(insert)
+
+    def removals(self):
+        return self._items_in_state(remove)
+
+    def changed(self):
+        return self._items_in_state(changed)
+
+    def counts(self):
+        '''
+        Return a dict of the number of items in each state.
+        '''
+        states = self.columns().states
+        return dict((state, states.count(state)) for state in _STATES)
+
+    def _items_at(self, component, side):
+        if self._path_index is None:
+            self._path_index = {}
+        side_index = self._path_index.get(side)
+        if side_index is None:
+            index = defaultdict(list)
+            for diff_item in self:
+                for path_component in _path_components(diff_item, side):
+                    index[path_component].append(diff_item)
+            side_index = self._path_index[side] = dict(
+                (key, tuple(items)) for key, items in index.items())
+        return side_index.get(component, ())
+
+    def get(self, path, side='to'):
+        '''
+        Return a tuple of the items found by following path, a sequence of
+        mapping keys, sequence positions or set elements, through this diff
+        and the diffs nested in it.
+
+        Sequence positions are positions in the second object diffed, or in
+        the first if side is 'from'. Removals are found at the position they
+        were removed from, which is also the position of the next item, and
+        likewise insertions with side 'from', so there may be more than one
+        item. Each level keeps an index of its items for each side, built
+        the first time it is looked at.
+        '''
+        _check_side(side)
+        diffs = [self]
+        items = ()
+        for component in path:
+            items = tuple(
+                diff_item for d in diffs
+                for diff_item in d._items_at(component, side))
+            diffs = [d for d in map(nested_diff, items) if d is not None]
+        return items
+
+    def iter_changes(self, prefix=(), side='to'):
+        '''
+        Yield a (path, item) pair for every inserted, removed or changed leaf
+        item, in this diff or nested in it, whose path starts with prefix.
+        Unchanged items are skipped without being looked at. Paths and
+        prefix have sequence positions on side, see get.
+        '''
+        _check_side(side)
+        prefix = tuple(prefix)
+        if not prefix:
+            for change in self._iter_changes(prefix, side):
+                yield change
+            return
+        for diff_item in self.get(prefix, side):
+            nested = nested_diff(diff_item)
+            if nested is not None:
+                for change in nested._iter_changes(prefix, side):
+                    yield change
+            elif diff_item.state != unchanged:
+                yield prefix, diff_item
+
+    def _iter_changes(self, path, side):
+        items = self.columns().items
+        indices = sorted(
+            self.indices(insert) + self.indices(remove) +
+            self.indices(changed))
+        for i in indices:
+            diff_item = items[i]
+            nested = nested_diff(diff_item)
+            for component in _path_components(diff_item, side):
+                if nested is not None:
+                    for change in nested._iter_changes(
+                            path + (component,), side):
+                        yield change
+                else:
+                    yield path + (component,), diff_item
+
     def __len__(self):
         return len(self._diffs)
 
-    def __bool__(self):
-        if self._diffs:
-            return any(d.state != unchanged for d in self._diffs)
-        return False
+    @property
+    def stats(self):
+        '''
+        DiffStats of this diff and all the diffs nested in it.
+        '''
+        if self._stats is None:
+            binary = isinstance(self._type, type) and issubclass(
+                self._type, _BINARY_TYPES)
+            weigh = len if binary else None
+            self._stats = sum_stats(_item_stats(d, weigh) for d in self)
+        return self._stats
 
-    def __nonzero__(self):
-        # python 2.7
-        return self.__bool__()
+    @property
+    def similarity(self):
+        return self.stats.similarity
+
+    def __bool__(self):
+        stats = self.stats
+        return bool(stats.inserted or stats.removed or stats.changed)
 
     def __iter__(self):
         return iter(self._diffs)
@@ -164,85 +764,227 @@ class Diff(object):
     def __getitem__(self, index):
         cls = type(self)
         if isinstance(index, slice):
-            return cls(self._type, self._diffs[index], self._depth)
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return DiffView(self, start, max(start, stop))
+            return Diff(self._type, self._diffs[index], self._depth)
         elif isinstance(index, Integral):
             return self._diffs[index]
         else:
             msg = '{.__name__} indices must be integers'
             raise TypeError(msg.format(cls))
 
+    def digest(self):
+        '''
+        Return a sha1 digest of the type, states, contexts and items of the
+        Diff, including any nested Diffs. Diffs which compare equal have the
+        same digest. The digest is computed once and kept, so the digest of
+        a Diff containing nested Diffs reuses theirs.
+        '''
+        if self._digest is None:
+            h = hashlib.sha1(b'D')
+            _update_text(h, self._type.__name__)
+            if is_ordered(self._type):
+                for diff_item in self._diffs:
+                    diff_item._update_digest(h)
+            else:
+                for digest in sorted(di.digest() for di in self._diffs):
+                    h.update(digest)
+            self._digest = h.digest()
+        return self._digest
+
     def __eq__(self, other):
-        eq = (
-            self._type == other._type,
-            diffs_are_equal(self, other))
-        return all(eq)
+        if self._type != other._type:
+            return False
+        # comparing digests is much cheaper than comparing items, and once
+        # computed they are kept.
+        if self.digest() != other.digest():
+            return False
+        return diffs_are_equal(self, other)
 
     def __ne__(self, other):
         return not self == other
 
+    def __hash__(self):
+        return hash(self.digest())
+
+    def __reduce__(self):
+        # only the items are pickled, not the caches or rendered strings, and
+        # a view is pickled as a Diff of its own items.
+        return Diff, (self._type, self._diffs, self._depth, self._stats)
+
     def __format__(self, fmt_spec=''):
         if fmt_spec.endswith('c'):
             context_limit = int(fmt_spec[:-1])
-            with adjusted_context_limit(self, context_limit):
-                formatted_string = str(self)
-            return formatted_string
+            return '\n'.join(self._lines(RenderOptions(context_limit)))
         else:
             return str(self)
 
-    def _make_context_banner(self, context_block):
+    def _make_context_banner(self, context_block, terminal):
         context = self._extract_context(context_block)
         if context:
             f_s, f_e, t_s, t_e = map(str, context)
             return self._indent + '@@ {}{},{} {}{},{} @@'.format(
-                    remove('-'), remove(f_s), remove(f_e),
-                    insert('+'), insert(t_s), insert(t_e))
+                    style(remove, '-', terminal),
+                    style(remove, f_s, terminal),
+                    style(remove, f_e, terminal),
+                    style(insert, '+', terminal),
+                    style(insert, t_s, terminal),
+                    style(insert, t_e, terminal))
 
     def __str__(self):
-        if not self._diffs:
-            return self._start + self._end
+        return '\n'.join(self._lines(_DEFAULT_OPTIONS))
+
+    def iter_lines(self, context=None, color=None):
+        '''
+        Yield the lines of str(self) one at a time, without newlines. Nested
+        diffs are rendered as their lines are reached, so only a line of the
+        output is held at once.
+
+        :parameter context: Number of unchanged items to show either side of
+            each change, for this diff and the diffs nested in it. By default
+            every item is shown.
+        :parameter color: True or False to always or never color the output,
+            by default it is colored if the terminal supports it.
+        '''
+        return self._lines(RenderOptions(context, color))
 
-        output = [self._start]
-        if self._context_limit is not None:
-            items_to_display = context_slice(self._diffs, self._context_limit)
+    def _lines(self, options):
+        terminal = options.terminal
+        start = style(unchanged, '{}('.format(self._type.__name__), terminal)
+        end = style(unchanged, ')', terminal)
+        if not len(self):
+            yield start + end
+            return
+
+        yield start
+        if options.width is None:
+            # read once for the whole render. None when the output isn't a
+            # terminal.
+            options = options._replace(width=terminal.width or 80)
+        if options.context is not None:
+            items_to_display = context_slice(self, options.context)
         else:
-            items_to_display = [self._diffs]
+            items_to_display = [self]
 
         for context_block in items_to_display:
-            banner = self._make_context_banner(context_block)
+            banner = self._make_context_banner(context_block, terminal)
             if banner:
-                output.append(banner)
+                yield banner
             if self._type is str:
-                self._make_string_diff_output(output, context_block)
+                lines = self._string_diff_lines(context_block, options)
             else:
-                self._make_diff_output(output, context_block)
+                lines = self._diff_lines(context_block, options)
+            for line in lines:
+                yield line
+
+        yield self._indent + end
+
+    def write(self, stream, context=None, color=None):
+        '''
+        Write the diff to a text stream a line at a time, the same as
+        print(diff, file=stream) but without building the whole string.
 
-        output.append(self._indent + self._end)
-        return '\n'.join(output)
+        :parameter stream: file object open for writing text
+        :parameter context, color: see iter_lines
+        '''
+        for line in self.iter_lines(context, color):
+            stream.write(line)
+            stream.write('\n')
 
-    def _make_string_diff_output(self, output, context_block):
-        diff_output = []
+    def _string_diff_lines(self, context_block, options):
+        # each row of the diff is a line of prefixes above a line of
+        # characters. Characters in the same state are styled as one run.
+        terminal = options.terminal
+        width = options.width
         line_start = self._indent + ' '
-        states = items = line_start
-        for i, item in enumerate(context_block):
-            states += item.state(state_to_prefix(item.state))
-            items += str(item)
-            if (len(line_start) + i) % (term.width - 1):
-                line_in_progress = True
-            else:
-                diff_output.extend([states, items])
-                states = items = line_start
-                line_in_progress = False
-        if line_in_progress:
-            diff_output.extend([states, items])
-        output.extend(diff_output)
-        return output
-
-    def _make_diff_output(self, output, context_block):
+        items = iter(context_block)
+        row_length = (-len(line_start)) % (width - 1) + 1
+        while True:
+            row = list(islice(items, row_length))
+            if not row:
+                return
+            prefixes = [line_start]
+            characters = [line_start]
+            for state, run in groupby(row, lambda item: item.state):
+                run = ''.join(item.item for item in run)
+                prefix = state_to_prefix(state)
+                prefixes.append(style(state, prefix * len(run), terminal))
+                characters.append(style(state, run, terminal))
+            yield ''.join(prefixes)
+            yield ''.join(characters)
+            row_length = width - 1
+
+    def _diff_lines(self, context_block, options):
+        terminal = options.terminal
         for item in context_block:
-            prefix = state_to_prefix(item.state)
-            output.append(
-                self._indent + '{} {}'.format(item.state(prefix), item))
-        return output
+            head = self._indent + '{} '.format(
+                style(item.state, state_to_prefix(item.state), terminal))
+            nested = nested_diff(item) if item.state == changed else None
+            if nested is None:
+                yield head + item._styled(terminal)
+                continue
+            # the nested diff is rendered in place of str(item), which is
+            # styled as a whole.
+            if isinstance(item, MappingDiffItem):
+                head += style(
+                    item.key_state, '{!s}: '.format(item.key), terminal)
+            for line in _styled_lines(
+                    item.state, nested._lines(options), terminal):
+                yield head + line
+                head = ''
+
+
+class DiffView(Diff):
+    '''
+    A contiguous slice of a Diff. Rather than copying the items into a new
+    Diff it refers to the items of the Diff it was taken from, so taking a
+    view is cheap however big the Diff is. It behaves like any other Diff.
+    '''
+    def __init__(self, diff, start, stop):
+        if isinstance(diff, DiffView):
+            start += diff._offset
+            stop += diff._offset
+            diff = diff._parent
+        self._parent = diff
+        self._offset = start
+        self._length = stop - start
+        self._type = diff._type
+        self._columns = None
+        self._digest = None
+        self._stats = None
+        self._path_index = None
+        self._depth = diff._depth
+        self._indent = diff._indent
+
+    def _range(self):
+        return range(self._offset, self._offset + self._length)
+
+    @property
+    def _diffs(self):
+        # only used where a copy can't be avoided, e.g. comparisons.
+        return self._parent._diffs[self._offset:self._offset + self._length]
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        diffs = self._parent._diffs
+        return (diffs[i] for i in self._range())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = self._range()[index]
+            if indices.step == 1:
+                return DiffView(
+                    self._parent, indices.start,
+                    max(indices.start, indices.stop))
+            return Diff(self._type, self._diffs[index], self._depth)
+        elif isinstance(index, Integral):
+            return self._parent._diffs[self._range()[index]]
+        else:
+            msg = '{.__name__} indices must be integers'
+            raise TypeError(msg.format(type(self)))
 
 
 class DiffItem(object):
@@ -259,30 +1001,53 @@ class DiffItem(object):
         populate Diff.ContextBlock.context it is a more useful concept in the
         context of Diff.context_blocks than on a per DiffItem bases.
     '''
+    # diffs can contain millions of these, so don't give each one a __dict__
+    __slots__ = ('state', 'item', 'context')
+
     def __init__(self, state, item, context=None):
         self.state = state
         self.item = item
         self.context = context
 
     def __str__(self):
-        return self.state('{!s}'.format(self.item))
+        return self._styled(term)
+
+    def _styled(self, terminal):
+        return style(self.state, '{!s}'.format(self.item), terminal)
 
     def __eq__(self, other):
         return (
             self.state == other.state and
-            self.item == other.item and
+            values_are_equal(self.item, other.item) and
             self.context == other.context)
 
     def __ne__(self, other):
         return not self == other
 
+    def __hash__(self):
+        return hash((self.state, fingerprint(self.item), self.context))
+
+    def __reduce__(self):
+        return type(self), (self.state, self.item, self.context)
+
+    def digest(self):
+        '''
+        Return a sha1 digest of the states and contents of the DiffItem.
+        DiffItems which compare equal have the same digest.
+        '''
+        h = hashlib.sha1()
+        self._update_digest(h)
+        return h.digest()
+
+    def _update_digest(self, h):
+        h.update(b'I' + _ascii(self.state))
+        _update(h, self.item)
+        _update(h, self.context)
+
     def __format__(self, fmt_spec):
         if fmt_spec.endswith('c'):
             if self.state == changed:
-                context_limit = int(fmt_spec[:-1])
-                with adjusted_context_limit(self.item, context_limit):
-                    formatted_string = str(self)
-                return formatted_string
+                return style(self.state, format(self.item, fmt_spec))
             raise ValueError(
                 'format specifier \'c\' can be only used on Diff instances')
         else:
@@ -298,37 +1063,144 @@ class MappingDiffItem(DiffItem):
     :attribute key: The key from the original unwrapped item.
     :attribute state: Value state; choice of remove|insert|unchanged|changed.
     :attribute value: The value from the original unwrapped item.
+    :property item: (key, value)
     '''
+    __slots__ = ('key_state', 'key', 'value')
+
     def __init__(self, key_state, key, value_state, value):
         self.key_state = key_state
         self.key = key
         self.state = value_state
         self.value = value
-        self.item = (key, value)
 
-    def __str__(self):
+    @property
+    def item(self):
+        return (self.key, self.value)
+
+    def _styled(self, terminal, val_repr=None):
         key_repr = '{!s}: '.format(self.key)
-        val_repr = '{!s}'.format(self.value)
-        return self.key_state(key_repr) + self.state(val_repr)
+        if val_repr is None:
+            val_repr = '{!s}'.format(self.value)
+        return (
+            style(self.key_state, key_repr, terminal) +
+            style(self.state, val_repr, terminal))
 
     def __eq__(self, other):
         return (
             self.key_state == other.key_state and
             self.key == other.key and
             self.state == other.state and
-            self.value == other.value)
+            values_are_equal(self.value, other.value))
 
-    def __ne__(self, other):
-        return not self == other
+    def __hash__(self):
+        return hash(
+            (self.key_state, self.key, self.state, fingerprint(self.value)))
+
+    def __reduce__(self):
+        return type(self), (
+            self.key_state, self.key, self.state, self.value)
+
+    def _update_digest(self, h):
+        h.update(b'M' + _ascii(self.key_state))
+        _update(h, self.key)
+        h.update(_ascii(self.state))
+        _update(h, self.value)
 
     def __format__(self, fmt_spec):
         if fmt_spec.endswith('c'):
             if self.state == changed:
-                context_limit = int(fmt_spec[:-1])
-                with adjusted_context_limit(self.value, context_limit):
-                    formatted_string = str(self)
-                return formatted_string
+                return self._styled(term, format(self.value, fmt_spec))
             raise ValueError(
                 'format specifier \'c\' can only be used on Diff instances')
         else:
             return str(self)
+
+
+def _unravel(index, shape):
+    position = []
+    for dimension in reversed(shape):
+        index, i = divmod(index, dimension)
+        position.append(i)
+    return tuple(reversed(position))
+
+
+class ArrayDiffItem(DiffItem):
+    '''
+    A compact DiffItem for numpy ndarrays of the same shape. Rather than
+    wrapping every element of the arrays it holds the positions of the
+    elements that differ along with their values in both arrays. Arrays of
+    different dtypes always have an ArrayDiffItem, even if no element
+    differs.
+
+    :attribute state: Always changed.
+    :attribute shape: The shape of the arrays that were diffed.
+    :attribute indices: 1-d integer ndarray of the flat indices of the elements
+        that differ.
+    :attribute from_values: ndarray of the values at indices in the first
+        array, with its dtype.
+    :attribute to_values: ndarray of the values at indices in the second array,
+        with its dtype.
+    :property item: (indices, from_values, to_values)
+    '''
+    __slots__ = ('shape', 'indices', 'from_values', 'to_values')
+
+    def __init__(self, shape, indices, from_values, to_values):
+        self.state = changed
+        self.shape = shape
+        self.indices = indices
+        self.from_values = from_values
+        self.to_values = to_values
+        self.context = None
+
+    @property
+    def item(self):
+        return (self.indices, self.from_values, self.to_values)
+
+    def positions(self):
+        '''
+        The positions of the changed elements as indices into the original
+        arrays (tuples for arrays with more than one dimension).
+        '''
+        if len(self.shape) == 1:
+            return self.indices.tolist()
+        return [_unravel(i, self.shape) for i in self.indices.tolist()]
+
+    def _styled(self, terminal):
+        changes = [
+            '{!s}: {!s} -> {!s}'.format(*change) for change in zip(
+                self.positions(),
+                self.from_values.tolist(),
+                self.to_values.tolist())]
+        if self.from_values.dtype != self.to_values.dtype:
+            changes.insert(0, 'dtype: {} -> {}'.format(
+                self.from_values.dtype, self.to_values.dtype))
+        return style(self.state, ', '.join(changes), terminal)
+
+    def __eq__(self, other):
+        return (
+            type(self) == type(other) and
+            self.shape == other.shape and
+            self.from_values.dtype == other.from_values.dtype and
+            self.to_values.dtype == other.to_values.dtype and
+            self.indices.tolist() == other.indices.tolist() and
+            self.from_values.tolist() == other.from_values.tolist() and
+            self.to_values.tolist() == other.to_values.tolist())
+
+    def __hash__(self):
+        return hash((self.shape, tuple(self.indices.tolist())))
+
+    def __reduce__(self):
+        return type(self), (
+            self.shape, self.indices, self.from_values, self.to_values)
+
+    def _update_digest(self, h):
+        h.update(b'A')
+        _update(h, self.shape)
+        for values in self.item:
+            _update(h, values.tolist())
+
+    def __format__(self, fmt_spec):
+        if fmt_spec.endswith('c'):
+            raise ValueError(
+                'format specifier \'c\' can only be used on Diff instances')
+        return str(self)
@@ -1,7 +1,59 @@
-from collections import Sequence, Mapping, Set, deque, OrderedDict
+import hashlib
+import sys
+from functools import lru_cache
+from collections import deque, OrderedDict
+from collections.abc import Sequence, Mapping, Set
 from diffr.data_model import(
-    insert, remove, unchanged, changed,
-    Diff, DiffItem, MappingDiffItem)
+    insert, remove, unchanged, changed, is_ndarray, is_ndarray_type,
+    sum_stats, values_are_equal, _ndarray_mismatch, _BINARY_TYPES,
+    Diff, DiffItem, DiffStats, MappingDiffItem, ArrayDiffItem)
+
+
+class DiffCancelled(Exception):
+    '''
+    Raised by diff and patch when their cancel event is set.
+    '''
+
+
+def _check_in(progress, cancel, phase, done, total, depth):
+    # called between the steps of a diff or patch which was given a progress
+    # callback or a cancel event. Without them the steps don't call this, so
+    # the hooks cost nothing unless they're used.
+    if cancel is not None and cancel.is_set():
+        raise DiffCancelled('{} cancelled at depth {}'.format(phase, depth))
+    if progress is not None:
+        progress(phase, done, total, depth)
+
+
+def _run(steps, progress=None, cancel=None):
+    '''
+    Run the steps of a diff to the end and return the Diff. The steps are a
+    generator which yields (phase, done, total, depth) whenever it can be
+    paused, see diff for the phases, and returns the Diff.
+    '''
+    try:
+        if progress is None and cancel is None:
+            while True:
+                next(steps)
+        while True:
+            _check_in(progress, cancel, *next(steps))
+    except StopIteration as stop:
+        return stop.value
+
+
+class _Compared(object):
+    '''
+    Stands in for an item of a sequence in the largest common subsequence
+    matrix when the items can't be compared with ==, see values_are_equal.
+    '''
+    __slots__ = ('value', 'tolerance')
+
+    def __init__(self, value, tolerance):
+        self.value = value
+        self.tolerance = tolerance
+
+    def __eq__(self, other):
+        return values_are_equal(self.value, other.value, self.tolerance)
 
 
 class Chunk(list):
@@ -13,7 +65,7 @@ class Chunk(list):
         self.append(DiffItem(state, item, context))
 
 
-def _build_lcs_matrix(seq1, seq2):
+def _lcs_matrix_steps(seq1, seq2, depth=0):
     '''
     Given two sequences seq1 and seq2:
     Build a matrix of zero's len(seq1) + 1 x len(seq2) + 1 in size which
@@ -36,25 +88,36 @@ def _build_lcs_matrix(seq1, seq2):
 
     see https://en.wikipedia.org/wiki/Longest_common_subsequence_problem
     for further details and diagramatic explanations.
+
+    The matrix is built a row at a time, one row per item of seq2, and a
+    step is yielded after each row. Returns the matrix.
     '''
-    matrix = [[0 for i in range(len(seq1) + 1)] for i in range(len(seq2) + 1)]
-    for i, i_val in enumerate(seq1):
-        for j, j_val in enumerate(seq2):
-            # matrix indices run from 1 rather than zero to maintain a layer of
-            # zero's at the start
-            m_i = i + 1
-            m_j = j + 1
+    matrix = [[0] * (len(seq1) + 1)]
+    cells = len(seq1) * len(seq2)
+    for j_val in seq2:
+        # matrix indices run from 1 rather than zero to maintain a layer of
+        # zero's at the start
+        up_row = matrix[-1]
+        row = [0]
+        for m_i, i_val in enumerate(seq1, 1):
             if i_val == j_val:
-                diagonally_back = matrix[m_j - 1][m_i - 1]
-                val = diagonally_back + 1
+                row.append(up_row[m_i - 1] + 1)
             else:
-                up = matrix[m_j - 1][m_i]
-                left = matrix[m_j][m_i - 1]
-                val = max(up, left)
-            matrix[m_j][m_i] = val
+                row.append(max(up_row[m_i], row[m_i - 1]))
+        matrix.append(row)
+        yield 'lcs', (len(matrix) - 1) * len(seq1), cells, depth
     return matrix
 
 
+def _build_lcs_matrix(seq1, seq2, progress=None, cancel=None, depth=0):
+    '''
+    Return the largest common subsequence matrix of seq1 and seq2, see
+    _lcs_matrix_steps. progress and cancel are checked after each row, see
+    diff.
+    '''
+    return _run(_lcs_matrix_steps(seq1, seq2, depth), progress, cancel)
+
+
 # -----------------------------------------------------------------------------
 # When diffing sequences we want to base the diff on the largest common
 # subsequence (lcs). However, there is not always such a thing as 'the' lcs;
@@ -97,8 +160,18 @@ def _backtrack(matrix):
             yield (i, j)
 
 
-def find_largest_common_subsequence(seq1, seq2):
-    return reversed([i for i in _backtrack(_build_lcs_matrix(seq1, seq2))])
+def _lcs_steps(seq1, seq2, depth=0):
+    matrix = yield from _lcs_matrix_steps(seq1, seq2, depth)
+    lcs = [i for i in _backtrack(matrix)]
+    # backtracking is linear, so it's only reported once it's done.
+    steps = len(seq1) + len(seq2)
+    yield 'backtrack', steps, steps, depth
+    return reversed(lcs)
+
+
+def find_largest_common_subsequence(
+        seq1, seq2, progress=None, cancel=None, depth=0):
+    return _run(_lcs_steps(seq1, seq2, depth), progress, cancel)
 
 
 def diff_item_data_factory(from_, to, lcs):
@@ -161,40 +234,32 @@ def _nested_diff_input(chunk):
     return removal, insertion, unchanged_item
 
 
-def diff_sequence(from_, to, depth=0):
-    '''
-    Return a Diff object of two sequence types. If the sequences are the same
-    length a recursive call may be attempted to find diffs in nested
-    structures. If they are different lengths only a top-layer diff is
-    provided because it is not clear how to pair up the items between the
-    sequences for a deeper comparison.
-
-    :parameter from_: first sequence
-    :parameter to: second sequence
-    :private parameter _depth: Keeps track of level of nesting during
-        recursive calls, DO NOT USE.
-
-    A generator pipeline consisting of diff_item_data_factory followed by
-    chunker is used to provide chunks (small subsets of the diff) to work on.
-    nested diffing is only worth bothering with when a chunk contains a single
-    insert paired with a single remove (and optionally and unchaged item).
-    '''
-    chunks = chunker(
-        diff_item_data_factory(
-            deque(from_), deque(to),
-            find_largest_common_subsequence(from_, to)
-        )
-    )
+def _sequence_steps(from_, to, depth, tolerance=None):
+    try:
+        lcs = yield from _lcs_steps(from_, to, depth)
+    except ValueError:
+        # the items include ndarrays, or collections of them.
+        lcs = yield from _lcs_steps(
+            [_Compared(i, tolerance) for i in from_],
+            [_Compared(i, tolerance) for i in to], depth)
+    chunks = chunker(diff_item_data_factory(deque(from_), deque(to), lcs))
     nested_information_wanted = (
         len(from_) == len(to) and not isinstance(from_, str))
     diffs = []
+    counts = [0, 0, 0, 0]
+    nested_stats = []
+    total = len(from_) + len(to)
     for chunk in chunks:
+        if chunk:
+            f_s, _, t_s, _ = chunk[0].context
+            yield 'items', f_s + t_s, total, depth
         nesting = False
         if nested_information_wanted:
             removal, insertion, unchanged_item = _nested_diff_input(chunk)
             if removal and insertion:
                 try:
-                    item = diff(removal.item, insertion.item, depth + 1)
+                    item = yield from _diff_steps(
+                        removal.item, insertion.item, depth + 1, tolerance)
                 except TypeError:
                     nesting = False
                 else:
@@ -203,14 +268,45 @@ def diff_sequence(from_, to, depth=0):
             f_s, f_e, _, _ = removal.context
             _, _, t_s, t_e = insertion.context
             diffs += [DiffItem(changed, item, (f_s, f_e, t_s, t_e))]
+            counts[changed] += 1
+            nested_stats.append(item.stats)
             if unchanged_item:
                 diffs += [unchanged_item]
+                counts[unchanged] += 1
         else:
             diffs += chunk
-    seq_diff = Diff(type(from_), diffs, depth)
+            for diff_item in chunk:
+                counts[diff_item.state] += 1
+    yield 'items', total, total, depth
+    stats = sum_stats([DiffStats(*counts)] + nested_stats)
+    seq_diff = Diff(type(from_), diffs, depth, stats)
     return seq_diff
 
 
+def diff_sequence(
+        from_, to, depth=0, progress=None, cancel=None, tolerance=None):
+    '''
+    Return a Diff object of two sequence types. If the sequences are the same
+    length a recursive call may be attempted to find diffs in nested
+    structures. If they are different lengths only a top-layer diff is
+    provided because it is not clear how to pair up the items between the
+    sequences for a deeper comparison.
+
+    :parameter from_: first sequence
+    :parameter to: second sequence
+    :parameter progress, cancel, tolerance: see diff
+    :private parameter _depth: Keeps track of level of nesting during
+        recursive calls, DO NOT USE.
+
+    A generator pipeline consisting of diff_item_data_factory followed by
+    chunker is used to provide chunks (small subsets of the diff) to work on.
+    nested diffing is only worth bothering with when a chunk contains a single
+    insert paired with a single remove (and optionally and unchaged item).
+    '''
+    return _run(
+        _sequence_steps(from_, to, depth, tolerance), progress, cancel)
+
+
 def diff_set(from_, to, _depth=0):
     '''
     Return a Diff object of two sets.
@@ -224,21 +320,12 @@ def diff_set(from_, to, _depth=0):
     removals = [DiffItem(remove, i) for i in from_.difference(to)]
     unchanged_items = [DiffItem(unchanged, i) for i in from_.intersection(to)]
     diffs = removals + unchanged_items + insertions
-    set_diff = Diff(type(from_), diffs, _depth)
+    stats = DiffStats(len(unchanged_items), len(insertions), len(removals), 0)
+    set_diff = Diff(type(from_), diffs, _depth, stats)
     return set_diff
 
 
-def diff_mapping(from_, to, _depth=0):
-    '''
-    Return a Diff object of two mapping types. If the two mapping types
-    contain items that have the same key with differen't values a recursive
-    call will be attempted to find differences in the values (if they are
-    collections).
-
-    :parameter from_: first mapping type
-    :parameter to_: second mapping type
-    :private parameter _depth: Keeps track of level of nesting during
-    recursive calls, DO NOT USE.'''
+def _mapping_steps(from_, to, depth, tolerance=None):
     removals = [
         MappingDiffItem(remove, k, remove, val)
         for k, val in from_.items() if k not in to.keys()
@@ -249,42 +336,75 @@ def diff_mapping(from_, to, _depth=0):
     ]
     common_keys = [k for k in from_.keys() if k in to.keys()]
     other = []
-    for k in common_keys:
-        if from_[k] == to[k]:
+    counts = [0, len(insertions), len(removals), 0]
+    nested_stats = []
+    for done, k in enumerate(common_keys):
+        yield 'items', done, len(common_keys), depth
+        if values_are_equal(from_[k], to[k], tolerance):
             other.append(MappingDiffItem(unchanged, k, unchanged, from_[k]))
+            counts[unchanged] += 1
         else:
             try:
-                val = diff(from_[k], to[k], _depth + 1)
+                val = yield from _diff_steps(
+                    from_[k], to[k], depth + 1, tolerance)
             except TypeError:
                 other.append(MappingDiffItem(unchanged, k, remove, from_[k]))
                 other.append(MappingDiffItem(unchanged, k, insert, to[k]))
+                counts[remove] += 1
+                counts[insert] += 1
             else:
                 other.append(MappingDiffItem(unchanged, k, changed, val))
+                counts[changed] += 1
+                nested_stats.append(val.stats)
+    yield 'items', len(common_keys), len(common_keys), depth
     diffs = removals + other + insertions
-    dict_diff = Diff(type(from_), diffs, _depth)
+    stats = sum_stats([DiffStats(*counts)] + nested_stats)
+    dict_diff = Diff(type(from_), diffs, depth, stats)
     return dict_diff
 
 
-def diff_ordered_mapping(from_, to, _depth=0):
+def diff_mapping(
+        from_, to, _depth=0, progress=None, cancel=None, tolerance=None):
+    '''
+    Return a Diff object of two mapping types. If the two mapping types
+    contain items that have the same key with differen't values a recursive
+    call will be attempted to find differences in the values (if they are
+    collections).
+
+    :parameter from_: first mapping type
+    :parameter to_: second mapping type
+    :parameter progress, cancel, tolerance: see diff
+    :private parameter _depth: Keeps track of level of nesting during
+    recursive calls, DO NOT USE.'''
+    return _run(
+        _mapping_steps(from_, to, _depth, tolerance), progress, cancel)
+
+
+def _ordered_mapping_steps(from_, to, depth, tolerance=None):
+    lcs = yield from _lcs_steps(from_.keys(), to.keys(), depth)
     key_diff_pipeline = diff_item_data_factory(
-        deque(from_.keys()), deque(to.keys()),
-        find_largest_common_subsequence(from_.keys(), to.keys())
-    )
+        deque(from_.keys()), deque(to.keys()), lcs)
     diffs = []
-    for state, key, _ in key_diff_pipeline:
+    counts = [0, 0, 0, 0]
+    nested_stats = []
+    total = len(from_) + len(to)
+    for state, key, context in key_diff_pipeline:
+        f_s, _, t_s, _ = context
+        yield 'items', f_s + t_s, total, depth
         if state is remove:
             diffs += [MappingDiffItem(remove, key, remove, from_[key])]
         elif state is insert:
             diffs += [MappingDiffItem(insert, key, insert, to[key])]
         else:
             assert(state is unchanged)
-            if from_[key] == to[key]:
+            if values_are_equal(from_[key], to[key], tolerance):
                 diffs += [
                     MappingDiffItem(unchanged, key, unchanged, from_[key])
                 ]
             else:
                 try:
-                    val = diff(from_[key], to[key], _depth + 1)
+                    val = yield from _diff_steps(
+                        from_[key], to[key], depth + 1, tolerance)
                 except TypeError:
                     diffs += [
                         MappingDiffItem(unchanged, key, remove, from_[key])
@@ -292,15 +412,358 @@ def diff_ordered_mapping(from_, to, _depth=0):
                     diffs += [
                         MappingDiffItem(unchanged, key, insert, to[key])
                     ]
+                    counts[remove] += 1
+                    counts[insert] += 1
+                    continue
                 else:
                     diffs += [
                         MappingDiffItem(unchanged, key, changed, val)
                     ]
-    dict_diff = Diff(type(from_), diffs, _depth)
+                    nested_stats.append(val.stats)
+                    state = changed
+        counts[state] += 1
+    yield 'items', total, total, depth
+    stats = sum_stats([DiffStats(*counts)] + nested_stats)
+    dict_diff = Diff(type(from_), diffs, depth, stats)
     return dict_diff
 
 
-def diff(from_, to, _depth=0):
+def diff_ordered_mapping(
+        from_, to, _depth=0, progress=None, cancel=None, tolerance=None):
+    '''
+    Return a Diff object of two ordered mappings. The keys are diffed as
+    sequences, so moved keys are removed and inserted, and the values of the
+    keys in both are diffed as in diff_mapping.
+
+    :parameter from_: first ordered mapping
+    :parameter to_: second ordered mapping
+    :parameter progress, cancel, tolerance: see diff
+    :private parameter _depth: Keeps track of level of nesting during
+    recursive calls, DO NOT USE.'''
+    return _run(
+        _ordered_mapping_steps(from_, to, _depth, tolerance), progress,
+        cancel)
+
+
+# ndarrays are compared in blocks of this many elements, so that a diff of a
+# big array can be paused between blocks.
+_ARRAY_BLOCK = 1 << 20
+
+
+def _ndarray_steps(from_, to, depth, tolerance=None):
+    if from_.shape != to.shape:
+        raise TypeError(
+            'Cannot diff ndarrays of different shapes {} != {}'.format(
+                from_.shape, to.shape))
+    return _ndarray_block_steps(from_, to, depth, tolerance)
+
+
+def _ndarray_block_steps(from_, to, depth, tolerance):
+    import numpy
+    size = from_.size
+    blocks = []
+    for start in range(0, max(size, 1), _ARRAY_BLOCK):
+        stop = min(start + _ARRAY_BLOCK, size)
+        mismatch = _ndarray_mismatch(
+            from_.flat[start:stop], to.flat[start:stop], tolerance)
+        blocks.append(mismatch.nonzero()[0] + start)
+        yield 'elements', stop, size, depth
+    indices = numpy.concatenate(blocks)
+    diffs = []
+    # a change of dtype is recorded even if no element has changed, so that
+    # patch can make an array of the dtype diffed to.
+    if len(indices) or from_.dtype != to.dtype:
+        diffs.append(
+            ArrayDiffItem(
+                from_.shape, indices, from_.flat[indices], to.flat[indices]))
+    count = len(indices)
+    stats = DiffStats(size - count, count, count, len(diffs))
+    array_diff = Diff(type(from_), diffs, depth, stats)
+    return array_diff
+
+
+def diff_ndarray(
+        from_, to, _depth=0, progress=None, cancel=None, tolerance=None):
+    '''
+    Return a Diff object of two numpy ndarrays of the same shape. The elements
+    that differ are found with vectorised comparisons and recorded in one
+    ArrayDiffItem rather than a DiffItem per element, along with the dtypes
+    of both arrays.
+
+    :parameter from_: first ndarray
+    :parameter to: second ndarray
+    :parameter progress, cancel: see diff
+    :parameter tolerance: Optional absolute tolerance for numeric arrays;
+        elements which differ by no more than this are considered unchanged.
+    :private parameter _depth: Keeps track of level of nesting during
+    recursive calls, DO NOT USE.'''
+    return _run(
+        _ndarray_steps(from_, to, _depth, tolerance), progress, cancel)
+
+
+# -----------------------------------------------------------------------------
+# Binary data is far too big to diff byte by byte with an lcs matrix, so it is
+# diffed in blocks instead, much like rsync. Both objects are cut into blocks
+# wherever a rolling hash of the last few bytes hits a particular pattern. The
+# cut points depend only on the content nearby, so an insertion or removal
+# only disturbs the blocks around it and the rest of the blocks still line up.
+# Blocks of the second object which can be found in the first object become
+# copies, everything else becomes literal inserts and removals.
+
+
+def _gear(i):
+    return int(hashlib.md5(str(i).encode('ascii')).hexdigest()[:8], 16)
+
+
+_GEAR = [_gear(i) for i in range(256)]
+
+
+def _as_byte_buffer(obj):
+    return memoryview(obj).cast('B')
+
+
+def _gear_hits(data, start, stop, mask, numpy):
+    '''
+    Return the positions from start to stop at which the gear hash of data
+    has none of the bits of mask, as found by _content_defined_blocks.
+
+    The hash at a position is the sum of the gears of the 32 bytes up to it,
+    each shifted left by its distance back. Sums over the last 2n bytes are
+    made from sums over the last n, so 5 vectorised shifts and adds make the
+    hashes rather than a step per byte.
+    '''
+    lo = max(0, start - 31)
+    h = numpy.array(_GEAR, numpy.uint32)[
+        numpy.frombuffer(data[lo:stop], numpy.uint8)]
+    for n in (1, 2, 4, 8, 16):
+        h[n:] += h[:-n] << numpy.uint32(n)
+    return (numpy.flatnonzero(h[start - lo:] & mask == 0) + start).tolist()
+
+
+def _vectorised_blocks(data, min_size, max_size, mask, numpy, window):
+    length = len(data)
+    hits = deque()
+    scanned = 0
+    start = 0
+    while start < length:
+        end = min(start + max_size, length)
+        first = start + min_size - 1
+        cut = end
+        while True:
+            while hits and hits[0] < first:
+                hits.popleft()
+            if hits:
+                if hits[0] < end:
+                    cut = hits[0] + 1
+                break
+            if scanned >= end:
+                break
+            lo = max(scanned, first)
+            scanned = min(lo + window, length)
+            hits.extend(_gear_hits(data, lo, scanned, mask, numpy))
+        yield start, cut
+        start = cut
+
+
+def _content_defined_blocks(data, block_size, window=1 << 18):
+    '''
+    Yield (start, end) tuples which cut data into blocks of block_size bytes
+    on average. block_size must be a power of 2.
+
+    A block is cut after the first byte at least min_size bytes in at which
+    a gear hash of the last 32 bytes has none of the bits of mask. With numpy
+    the hashes are found a window of bytes at a time with vectorised
+    arithmetic. Without it, or for small objects if numpy hasn't already been
+    imported, they are found with a loop over the bytes, which manages only a
+    few MB per second. Both make the same cuts.
+    '''
+    min_size = max(1, block_size // 4)
+    max_size = block_size * 8
+    mask = (block_size - 1) << (32 - block_size.bit_length() + 1)
+    numpy = sys.modules.get('numpy')
+    if numpy is None and len(data) >= window:
+        try:
+            import numpy
+        except ImportError:
+            pass
+    if numpy is not None:
+        return _vectorised_blocks(
+            data, min_size, max_size, mask, numpy, window)
+    return _looped_blocks(data, min_size, max_size, mask)
+
+
+def _looped_blocks(data, min_size, max_size, mask):
+    # the gear hash only depends on the last 32 bytes so the first few bytes
+    # of a block, which are too early for a cut point anyway, are skipped.
+    gear = _GEAR
+    start = 0
+    length = len(data)
+    while start < length:
+        end = min(start + max_size, length)
+        cut = end
+        h = 0
+        for i in range(max(0, start + min_size - 32), end):
+            h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+            if not h & mask and i + 1 - start >= min_size:
+                cut = i + 1
+                break
+        yield start, cut
+        start = cut
+
+
+def _block_digest(block):
+    return hashlib.sha1(block).digest()
+
+
+def _bytes_steps(from_, to, depth, tolerance=None, block_size=4096):
+    # tolerance is only for ndarrays, it's taken for the same signature as
+    # the other steps.
+    source = _as_byte_buffer(from_)
+    target = _as_byte_buffer(to)
+    total = len(source) + len(target)
+    index = {}
+    for start, end in _content_defined_blocks(source, block_size):
+        index.setdefault(_block_digest(source[start:end]), (start, end))
+        yield 'blocks', end, total, depth
+
+    diffs = []
+    # bytes in each state
+    counts = [0, 0, 0, 0]
+    copy = None
+    f = literal = 0
+
+    def flush_removal(f_end, t):
+        if f < f_end:
+            counts[remove] += f_end - f
+            diffs.append(
+                DiffItem(remove, bytes(source[f:f_end]), (f, f_end, t, t)))
+
+    def flush_insertion(f, t_end):
+        if literal < t_end:
+            counts[insert] += t_end - literal
+            diffs.append(
+                DiffItem(
+                    insert, bytes(target[literal:t_end]),
+                    (f, f, literal, t_end)))
+
+    def flush_copy():
+        if copy:
+            f_s, f_e, t_s, t_e = copy
+            counts[unchanged] += f_e - f_s
+            # a copy rather than a view, so the diff doesn't hold on to the
+            # first object or change with it.
+            diffs.append(
+                DiffItem(unchanged, bytes(source[f_s:f_e]), tuple(copy)))
+
+    for t_s, t_e in _content_defined_blocks(target, block_size):
+        yield 'blocks', len(source) + t_e, total, depth
+        block = target[t_s:t_e]
+        match = index.get(_block_digest(block))
+        if not match or match[0] < f or source[match[0]:match[1]] != block:
+            # blocks can only be copied in order, anything else is literal.
+            continue
+        f_s, f_e = match
+        if copy and copy[1] == f_s and copy[3] == t_s and literal == t_s:
+            copy[1], copy[3] = f_e, t_e
+        else:
+            flush_copy()
+            flush_removal(f_s, literal)
+            flush_insertion(f_s, t_s)
+            copy = [f_s, f_e, t_s, t_e]
+        f = f_e
+        literal = t_e
+    flush_copy()
+    flush_removal(len(source), literal)
+    flush_insertion(len(source), len(target))
+    bytes_diff = Diff(type(from_), diffs, depth, DiffStats(*counts))
+    return bytes_diff
+
+
+def diff_bytes(
+        from_, to, _depth=0, block_size=4096, progress=None, cancel=None):
+    '''
+    Return a Diff object of two binary objects (bytes, bytearray or
+    memoryview). The DiffItems describe blocks rather than single bytes:
+    every item holds the bytes of its block, unchanged items the bytes
+    copied from the first object and insert and remove items the literal
+    bytes. The
+    context of every item gives the slices of both objects it covers.
+
+    :parameter from_: first binary object
+    :parameter to: second binary object
+    :parameter block_size: average size in bytes of the blocks the objects
+        are cut into, must be a power of 2.
+    :parameter progress, cancel: see diff
+    :private parameter _depth: Keeps track of level of nesting during
+    recursive calls, DO NOT USE.'''
+    return _run(
+        _bytes_steps(from_, to, _depth, block_size=block_size), progress,
+        cancel)
+
+
+# the diff function for the types diffed most recently. Working it out takes
+# a handful of abc checks, which cost more than diffing small objects. The
+# cache is bounded so that programs making types on the fly, e.g. namedtuple
+# classes, don't keep all of them alive.
+@lru_cache(maxsize=256)
+def _differ_for(obj_type):
+    if is_ndarray_type(obj_type):
+        return diff_ndarray
+    elif issubclass(obj_type, _BINARY_TYPES):
+        return diff_bytes
+    elif issubclass(obj_type, Sequence):
+        return diff_sequence
+    elif issubclass(obj_type, Set):
+        return diff_set
+    elif issubclass(obj_type, OrderedDict):
+        return diff_ordered_mapping
+    elif issubclass(obj_type, Mapping):
+        return diff_mapping
+    raise TypeError(
+        'No mechanism for diffing objects of type {}'.format(obj_type))
+
+
+def get_differ(from_, to):
+    '''
+    Return the function which diffs from_ and to, e.g. diff_sequence.
+    '''
+    obj_type = type(from_)
+    if obj_type != type(to):
+        raise TypeError(
+            'diff params are different types {} != {}'.format(
+                obj_type, type(to)))
+    return _differ_for(obj_type)
+
+
+# the steps of each differ which diffs in steps, see _run. diff_set is quick
+# enough to not need them.
+_STEPS = {
+    diff_sequence: _sequence_steps,
+    diff_mapping: _mapping_steps,
+    diff_ordered_mapping: _ordered_mapping_steps,
+    diff_ndarray: _ndarray_steps,
+    diff_bytes: _bytes_steps,
+}
+
+
+def _no_steps(value):
+    return value
+    yield
+
+
+def _diff_steps(from_, to, depth, tolerance=None):
+    '''
+    Return the steps of diff(from_, to), see _run. Objects which can't be
+    diffed raise TypeError here rather than from the steps.
+    '''
+    differ = get_differ(from_, to)
+    steps = _STEPS.get(differ)
+    if steps is None:
+        return _no_steps(differ(from_, to, depth))
+    return steps(from_, to, depth, tolerance)
+
+
+def diff(from_, to, _depth=0, progress=None, cancel=None, tolerance=None):
     '''
     Return a Diff object of two collections. Recursive calls may be
     attempted if it is sensible to do so to provide more detailed diffs of
@@ -308,21 +771,26 @@ def diff(from_, to, _depth=0):
 
     :parameter from_: first collection
     :parameter to: second collection
+    :parameter progress: Optional callable, called as
+        progress(phase, done, total, depth) between the steps of the diff
+        and of every diff nested in it. phase is 'lcs' while the largest
+        common subsequence matrix of a sequence is built, done and total
+        counting its cells, then 'backtrack' when a subsequence has been
+        read from it, then 'items' while the items of a sequence or the
+        keys of a mapping are diffed, counting items. Binary objects are
+        diffed in phase 'blocks', counting bytes, and ndarrays in phase
+        'elements', counting elements.
+    :parameter cancel: Optional threading.Event. Once it is set the diff
+        raises DiffCancelled at its next step.
+    :parameter tolerance: Optional absolute tolerance for the elements of
+        numeric ndarrays, at any depth. Elements which differ by no more than
+        this are considered unchanged.
     :private parameter _depth: Keeps track of level of nesting during
     recursive calls, DO NOT USE.'''
-    if type(from_) != type(to):
-        raise TypeError(
-            'diff params are different types {} != {}'.format(
-                type(from_), type(to)))
-    elif isinstance(from_, Sequence):
-        return diff_sequence(from_, to, _depth)
-    elif isinstance(from_, Set):
-        return diff_set(from_, to, _depth)
-    elif isinstance(from_, OrderedDict):
-        return diff_ordered_mapping(from_, to, _depth)
-    elif isinstance(from_, Mapping):
-        return diff_mapping(from_, to, _depth)
-    else:
-        raise TypeError(
-            'No mechanism for diffing objects of type {}'.format(
-                type(from_)))
+    differ = get_differ(from_, to)
+    if cancel is not None:
+        _check_in(None, cancel, 'diff', 0, 0, _depth)
+    steps = _STEPS.get(differ)
+    if steps is None:
+        return differ(from_, to, _depth)
+    return _run(steps(from_, to, _depth, tolerance), progress, cancel)
@@ -0,0 +1,82 @@
+from collections.abc import Sequence
+from diffr.data_model import (
+    remove, insert, changed, unchanged, _BINARY_TYPES,
+    Diff, DiffItem, DiffStats, MappingDiffItem, ArrayDiffItem)
+
+_INVERTED_STATES = {
+    unchanged: unchanged, insert: remove, remove: insert, changed: changed}
+
+
+def invert(diff):
+    '''
+    Return the Diff that undoes diff, i.e. if diff is a diff of a to b then
+    the result is a diff of b to a:
+        patch(patch(a, diff), invert(diff)) == a
+    Inserts and removes are swapped and nested diffs are inverted, in a
+    single pass over the items.
+
+    :parameter diff: Diff to invert
+    '''
+    diff_items = _removals_first(_invert_item(di) for di in diff)
+    if issubclass(diff.type, _BINARY_TYPES):
+        diff_items = _with_contexts(diff_items, len)
+    elif issubclass(diff.type, Sequence):
+        diff_items = _with_contexts(diff_items, lambda _: 1)
+    unchanged_count, inserted, removed, changed_count = diff.stats
+    return Diff(
+        diff.type, diff_items, diff.depth,
+        DiffStats(unchanged_count, removed, inserted, changed_count))
+
+
+def _invert_item(diff_item):
+    if isinstance(diff_item, ArrayDiffItem):
+        return ArrayDiffItem(
+            diff_item.shape, diff_item.indices,
+            diff_item.to_values, diff_item.from_values)
+    state = _INVERTED_STATES[diff_item.state]
+    if isinstance(diff_item, MappingDiffItem):
+        value = diff_item.value
+        if state == changed:
+            value = invert(value)
+        return MappingDiffItem(
+            _INVERTED_STATES[diff_item.key_state], diff_item.key, state, value)
+    item = diff_item.item
+    if state == changed:
+        item = invert(item)
+    return DiffItem(state, item, diff_item.context)
+
+
+def _removals_first(diff_items):
+    # swapping states leaves inserts in front of the removes they were
+    # paired with, diffs and patch expect the removes to come first. A
+    # mapping value which is replaced is a remove and insert of the same key,
+    # that pair is swapped back on its own.
+    ordered = []
+    run = []
+    for diff_item in diff_items:
+        replaced = getattr(diff_item, 'key_state', None) == unchanged
+        if diff_item.state in (insert, remove) and not replaced:
+            run.append(diff_item)
+            continue
+        ordered += sorted(run, key=lambda di: di.state != remove)
+        run = []
+        if replaced and diff_item.state == remove and ordered and (
+                ordered[-1].state == insert and
+                ordered[-1].key == diff_item.key):
+            ordered.insert(-1, diff_item)
+        else:
+            ordered.append(diff_item)
+    return ordered + sorted(run, key=lambda di: di.state != remove)
+
+
+def _with_contexts(diff_items, weigh):
+    # the contexts of the inverted items are the original contexts with the
+    # from and to slices swapped, recounted to follow the new order.
+    f = t = 0
+    for diff_item in diff_items:
+        size = 1 if diff_item.state == changed else weigh(diff_item.item)
+        f_e = f if diff_item.state == insert else f + size
+        t_e = t if diff_item.state == remove else t + size
+        diff_item.context = (f, f_e, t, t_e)
+        f, t = f_e, t_e
+    return diff_items
@@ -0,0 +1,395 @@
+'''
+Diff JSON documents straight from their files.
+
+The files are mapped with mmap and scanned one level at a time: the items of
+an object or array are found by skipping over their bytes, without building
+them. Items whose bytes are the same in both files are unchanged and are
+never parsed, only the items which differ are parsed and diffed, so memory
+use depends on the size of the differences rather than of the documents.
+'''
+import json
+import mmap
+import re
+import zlib
+from collections import deque
+from diffr.data_model import (
+    insert, remove, unchanged, changed, sum_stats,
+    Diff, DiffItem, DiffStats, MappingDiffItem, _proxy_types)
+from diffr.diff import (
+    diff, values_are_equal, find_largest_common_subsequence,
+    diff_item_data_factory, chunker, _nested_diff_input)
+
+_WS = br'[ \t\n\r]*'
+_STRING_PATTERN = br'"[^"\\]*(?:\\.[^"\\]*)*"'
+_TEXT = br'[^"\[\]{}]*'
+# a container without containers in it.
+_FLAT = (
+    br'[\[{]' + _TEXT + br'(?:' + _STRING_PATTERN + _TEXT + br')*[\]}]')
+
+_WHITESPACE = re.compile(_WS)
+_STRING = re.compile(_STRING_PATTERN, re.S)
+_SCALAR = re.compile(br'[^,:\]}\s]+')
+_KEY = re.compile(b'(' + _STRING_PATTERN + b')' + _WS + b':' + _WS, re.S)
+_LINE = re.compile(br'[^\n]+')
+_SEPARATOR = re.compile(_WS + br'([,\]}])' + _WS)
+# everything up to the next bracket which isn't in a string or a flat
+# container, so that most containers are skipped by a single match.
+_TO_BRACKET = re.compile(
+    _TEXT + br'(?:(?:' + _STRING_PATTERN + b'|' + _FLAT + b')' + _TEXT +
+    br')*([\[\]{}])', re.S)
+
+# spans are hashed and compared in blocks, so comparing a huge subtree never
+# copies more than a block of it.
+_BLOCK_SIZE = 1 << 20
+
+
+def _error(pos, expected):
+    return ValueError('Expected {} at byte {} of the JSON document'.format(
+        expected, pos))
+
+
+class _Span(object):
+    # the bytes of a JSON value in a mapped file.
+    __slots__ = ('data', 'start', 'end', '_hash')
+
+    def __init__(self, data, start, end):
+        self.data = data
+        self.start = start
+        self.end = end
+        self._hash = None
+
+    @property
+    def kind(self):
+        return self.data[self.start:self.start + 1]
+
+    def blocks(self):
+        view = memoryview(self.data)
+        for start in range(self.start, self.end, _BLOCK_SIZE):
+            yield view[start:min(start + _BLOCK_SIZE, self.end)]
+
+    def __hash__(self):
+        if self._hash is None:
+            crc = 0
+            for block in self.blocks():
+                crc = zlib.crc32(block, crc)
+            self._hash = hash((self.end - self.start, crc))
+        return self._hash
+
+    def __eq__(self, other):
+        length = self.end - self.start
+        if length != other.end - other.start:
+            return False
+        if length <= _BLOCK_SIZE:
+            return (self.data[self.start:self.end] ==
+                    other.data[other.start:other.end])
+        if hash(self) != hash(other):
+            return False
+        return all(
+            a == b for a, b in zip(self.blocks(), other.blocks()))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def load(self):
+        return json.loads(self.data[self.start:self.end].decode('utf-8'))
+
+
+class JsonValue(object):
+    '''
+    A value in a JSON file which hasn't been parsed. It is parsed every time
+    load() is called and compares equal to the value it holds. It is pickled
+    and digested as that value.
+    '''
+    __slots__ = ('_span',)
+
+    def __init__(self, span):
+        self._span = span
+
+    def load(self):
+        '''
+        Return the value, parsed from the file.
+        '''
+        return self._span.load()
+
+    def __eq__(self, other):
+        if isinstance(other, JsonValue):
+            if self._span == other._span:
+                return True
+            other = other.load()
+        return values_are_equal(self.load(), other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.load())
+
+    def __str__(self):
+        return str(self.load())
+
+    def __reduce__(self):
+        return _loaded, (self.load(),)
+
+
+def _loaded(value):
+    return value
+
+
+# so that Diffs holding JsonValues have the digests of, and compare equal
+# to, Diffs of the loaded documents.
+_proxy_types[JsonValue] = JsonValue.load
+
+
+def _skip_whitespace(data, pos):
+    return _WHITESPACE.match(data, pos).end()
+
+
+def _skip_value(data, pos):
+    # return the end of the value starting at pos.
+    kind = data[pos:pos + 1]
+    if kind == b'"':
+        match = _STRING.match(data, pos)
+        if match is None:
+            raise _error(pos, 'a string')
+        return match.end()
+    if kind in (b'{', b'['):
+        depth = 1
+        pos += 1
+        while True:
+            match = _TO_BRACKET.match(data, pos)
+            if match is None:
+                raise _error(len(data), 'the end of a container')
+            pos = match.end()
+            depth += 1 if match.group(1) in (b'{', b'[') else -1
+            if not depth:
+                return pos
+    match = _SCALAR.match(data, pos)
+    if match is None:
+        raise _error(pos, 'a value')
+    return match.end()
+
+
+def _key(data, match):
+    key = data[match.start(1) + 1:match.end(1) - 1]
+    if b'\\' in key:
+        return json.loads(match.group(1).decode('utf-8'))
+    return key.decode('utf-8')
+
+
+def _items(span, close):
+    # yield the spans of the items of the object or array span, for objects
+    # the key and the value.
+    data = span.data
+    pos = _skip_whitespace(data, span.start + 1)
+    if data[pos:pos + 1] == close:
+        return
+    while True:
+        if close == b'}':
+            match = _KEY.match(data, pos)
+            if match is None:
+                raise _error(pos, 'a key')
+            key = _key(data, match)
+            pos = match.end()
+        end = _skip_value(data, pos)
+        value = _Span(data, pos, end)
+        yield (key, value) if close == b'}' else value
+        match = _SEPARATOR.match(data, end)
+        if match is None or match.group(1) not in (b',', close):
+            raise _error(end, "',' or {!r}".format(close.decode()))
+        if match.group(1) == close:
+            return
+        pos = match.end()
+
+
+def _members(span):
+    # later duplicate keys replace earlier ones, as they do in json.load.
+    return dict(_items(span, b'}'))
+
+
+class _Differ(object):
+    def __init__(self, lazy):
+        self.lazy = lazy
+
+    def unchanged_value(self, span):
+        return JsonValue(span) if self.lazy else span.load()
+
+    def diff(self, from_, to, depth):
+        # TypeError is raised, as it is by diff, when values can't be diffed.
+        kind = from_.kind
+        if kind == b'{' and to.kind == b'{':
+            return self.diff_object(from_, to, depth)
+        elif kind == b'[' and to.kind == b'[':
+            return self.diff_array(from_, to, depth)
+        return diff(from_.load(), to.load(), depth)
+
+    def equal_or_diff(self, from_, to, depth):
+        # return None for values which are equal but written differently.
+        if from_.kind in (b'{', b'['):
+            nested = self.diff(from_, to, depth)
+            return nested if nested else None
+        from_value, to_value = from_.load(), to.load()
+        if values_are_equal(from_value, to_value):
+            return None
+        return diff(from_value, to_value, depth)
+
+    def diff_object(self, from_, to, depth):
+        # the same items in the same order as diff_mapping.
+        from_members = _members(from_)
+        to_members = _members(to)
+        removals = [
+            MappingDiffItem(remove, k, remove, v.load())
+            for k, v in from_members.items() if k not in to_members]
+        insertions = [
+            MappingDiffItem(insert, k, insert, v.load())
+            for k, v in to_members.items() if k not in from_members]
+        other = []
+        counts = [0, len(insertions), len(removals), 0]
+        nested_stats = []
+        for k, from_value in from_members.items():
+            if k not in to_members:
+                continue
+            to_value = to_members[k]
+            nested = None
+            if from_value != to_value:
+                try:
+                    nested = self.equal_or_diff(
+                        from_value, to_value, depth + 1)
+                except TypeError:
+                    other.append(MappingDiffItem(
+                        unchanged, k, remove, from_value.load()))
+                    other.append(MappingDiffItem(
+                        unchanged, k, insert, to_value.load()))
+                    counts[remove] += 1
+                    counts[insert] += 1
+                    continue
+            if nested is None:
+                other.append(MappingDiffItem(
+                    unchanged, k, unchanged, self.unchanged_value(from_value)))
+                counts[unchanged] += 1
+            else:
+                other.append(MappingDiffItem(unchanged, k, changed, nested))
+                counts[changed] += 1
+                nested_stats.append(nested.stats)
+        stats = sum_stats([DiffStats(*counts)] + nested_stats)
+        return Diff(dict, removals + other + insertions, depth, stats)
+
+    def diff_array(self, from_, to, depth):
+        return self.diff_items(
+            list(_items(from_, b']')), list(_items(to, b']')), depth)
+
+    def diff_items(self, from_items, to_items, depth):
+        # the same items in the same order as diff_sequence, with the items
+        # matched by their bytes.
+        chunks = chunker(diff_item_data_factory(
+            deque(from_items), deque(to_items),
+            find_largest_common_subsequence(from_items, to_items)))
+        nested_information_wanted = len(from_items) == len(to_items)
+        diffs = []
+        counts = [0, 0, 0, 0]
+        nested_stats = []
+        for chunk in chunks:
+            if nested_information_wanted:
+                removal, insertion, unchanged_item = _nested_diff_input(chunk)
+            else:
+                removal = insertion = unchanged_item = None
+            nested = False
+            if removal and insertion:
+                try:
+                    nested = self.equal_or_diff(
+                        removal.item, insertion.item, depth + 1)
+                except TypeError:
+                    nested = False
+            if nested is False:
+                for diff_item in chunk:
+                    if diff_item.state == unchanged:
+                        value = self.unchanged_value(diff_item.item)
+                    else:
+                        value = diff_item.item.load()
+                    diffs.append(
+                        DiffItem(diff_item.state, value, diff_item.context))
+                    counts[diff_item.state] += 1
+                continue
+            context = removal.context[:2] + insertion.context[2:]
+            if nested is None:
+                diffs.append(DiffItem(
+                    unchanged, self.unchanged_value(removal.item), context))
+                counts[unchanged] += 1
+            else:
+                diffs.append(DiffItem(changed, nested, context))
+                counts[changed] += 1
+                nested_stats.append(nested.stats)
+            if unchanged_item:
+                diffs.append(DiffItem(
+                    unchanged, self.unchanged_value(unchanged_item.item),
+                    unchanged_item.context))
+                counts[unchanged] += 1
+        stats = sum_stats([DiffStats(*counts)] + nested_stats)
+        return Diff(list, diffs, depth, stats)
+
+
+def _map(path):
+    with open(path, 'rb') as fp:
+        try:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped.
+            return b''
+
+
+def _document(path):
+    data = _map(path)
+    if not data:
+        raise ValueError('{} is empty, not a JSON document'.format(path))
+    start = _skip_whitespace(data, 0)
+    end = _skip_value(data, start)
+    if _skip_whitespace(data, end) != len(data):
+        raise _error(end, 'the end of the document')
+    return _Span(data, start, end)
+
+
+def diff_json_files(path_a, path_b, lazy=True):
+    '''
+    Return the Diff of the JSON documents in two files, the same as
+    diff(json.load(a), json.load(b)) but without loading either document.
+    Arrays are matched up item by item by the bytes of their items, so equal
+    values are only recognised wherever they are written the same way in
+    both files. Documents should be UTF-8.
+
+    :parameter path_a: path of the first document
+    :parameter path_b: path of the second document
+    :parameter lazy: Leave unchanged values in the files, as JsonValues,
+        rather than loading them into the Diff. The files stay mapped for as
+        long as the Diff refers to them.
+    '''
+    return _Differ(lazy).diff(_document(path_a), _document(path_b), 0)
+
+
+def _lines(path):
+    # the spans of the values on the non-blank lines of a JSON Lines file.
+    data = _map(path)
+    spans = []
+    for line in _LINE.finditer(data):
+        start = _skip_whitespace(data, line.start())
+        if start >= line.end():
+            continue
+        end = _skip_value(data, start)
+        if end > line.end() or _skip_whitespace(data, end) < line.end():
+            raise _error(end, 'the end of the line')
+        spans.append(_Span(data, start, end))
+    return spans
+
+
+def diff_jsonl_files(path_a, path_b, lazy=True):
+    '''
+    Return the Diff of two JSON Lines files, the same as the diff of the
+    lists of the values on their non-blank lines, reading the files like
+    diff_json_files does.
+
+    :parameter path_a: path of the first file
+    :parameter path_b: path of the second file
+    :parameter lazy: Leave unchanged values in the files, as JsonValues,
+        rather than loading them into the Diff.
+    '''
+    return _Differ(lazy).diff_items(_lines(path_a), _lines(path_b), 0)
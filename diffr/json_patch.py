@@ -0,0 +1,355 @@
+'''
+Conversion between Diffs and JSON Patch (RFC 6902) documents, and a JSON
+Patch applier for structures of dicts and lists.
+
+JSON has no sets or binary data so diffs of those can't be converted. JSON
+objects are unordered so ordered mappings are treated like any mapping, and
+strings are atomic so a changed string is replaced as a whole.
+'''
+import itertools
+from collections import OrderedDict
+from collections.abc import Sequence, Mapping, Set
+from copy import deepcopy
+from diffr.data_model import (
+    remove, insert, changed, unchanged, is_ndarray_type, _BINARY_TYPES,
+    Diff, DiffItem, MappingDiffItem)
+from diffr.diff import values_are_equal
+from diffr.compose import rebuild
+from diffr.patch import (
+    try_get_values, validate_insertion, validate_index)
+
+
+def _escape(component):
+    return '{}'.format(component).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(component):
+    return component.replace('~1', '/').replace('~0', '~')
+
+
+def parse_pointer(pointer):
+    '''
+    Return the list of components of a JSON Pointer (RFC 6901).
+    '''
+    if not pointer:
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError('Invalid JSON Pointer {!r}'.format(pointer))
+    return [_unescape(component) for component in pointer.split('/')[1:]]
+
+
+def to_json_patch(diff, path='', tests=True):
+    '''
+    Yield the operations of a JSON Patch equivalent to diff, one at a time,
+    so a huge diff never needs the whole list of operations built.
+
+    :parameter diff: Diff to convert
+    :parameter path: JSON Pointer of the diffed object in the document.
+    :parameter tests: Yield a test operation before every remove or replace,
+        checking the old value just like patch does.
+    '''
+    obj_type = diff.type
+    if issubclass(obj_type, _BINARY_TYPES) or issubclass(obj_type, Set):
+        raise TypeError(
+            'No JSON Patch representation of diffs of type {}'.format(
+                obj_type))
+    elif issubclass(obj_type, str):
+        if diff:
+            if tests:
+                yield {'op': 'test', 'path': path,
+                       'value': rebuild(diff, remove)}
+            yield {'op': 'replace', 'path': path,
+                   'value': rebuild(diff, insert)}
+    elif issubclass(obj_type, Mapping):
+        for op in _mapping_ops(diff, path, tests):
+            yield op
+    elif issubclass(obj_type, Sequence):
+        for op in _sequence_ops(diff, path, tests):
+            yield op
+    elif is_ndarray_type(obj_type):
+        for op in _ndarray_ops(diff, path, tests):
+            yield op
+    else:
+        raise TypeError(
+            'No JSON Patch representation of diffs of type {}'.format(
+                obj_type))
+
+
+def _mapping_ops(diff, path, tests):
+    # an ordered mapping diff can insert a key before removing it from its
+    # old position, JSON objects are unordered so removals go first.
+    removals = (di for di in diff if di.state == remove)
+    others = (di for di in diff if di.state != remove)
+    for diff_item in itertools.chain(removals, others):
+        item_path = '{}/{}'.format(path, _escape(diff_item.key))
+        if diff_item.state == changed:
+            for op in to_json_patch(diff_item.value, item_path, tests):
+                yield op
+        elif diff_item.state == remove:
+            if tests:
+                yield {'op': 'test', 'path': item_path,
+                       'value': diff_item.value}
+            # a value replaced under the same key is removed and inserted,
+            # the insert becomes the replace operation.
+            if diff_item.key_state == remove:
+                yield {'op': 'remove', 'path': item_path}
+        elif diff_item.state == insert:
+            op = 'add' if diff_item.key_state == insert else 'replace'
+            yield {'op': op, 'path': item_path, 'value': diff_item.value}
+
+
+def _sequence_ops(diff, path, tests):
+    # operations are applied one after the other, so the index of every item
+    # is its position in the second sequence.
+    for diff_item in diff:
+        if diff_item.state == unchanged:
+            continue
+        item_path = '{}/{}'.format(path, diff_item.context[2])
+        if diff_item.state == changed:
+            for op in to_json_patch(diff_item.item, item_path, tests):
+                yield op
+        elif diff_item.state == remove:
+            if tests:
+                yield {'op': 'test', 'path': item_path,
+                       'value': diff_item.item}
+            yield {'op': 'remove', 'path': item_path}
+        else:
+            yield {'op': 'add', 'path': item_path, 'value': diff_item.item}
+
+
+def _ndarray_ops(diff, path, tests):
+    for diff_item in diff:
+        for position, from_value, to_value in zip(
+                diff_item.positions(), diff_item.from_values.tolist(),
+                diff_item.to_values.tolist()):
+            if not isinstance(position, tuple):
+                position = (position,)
+            item_path = path + ''.join('/{}'.format(i) for i in position)
+            if tests:
+                yield {'op': 'test', 'path': item_path, 'value': from_value}
+            yield {'op': 'replace', 'path': item_path, 'value': to_value}
+
+
+def _is_index(component):
+    return component == '-' or component.isdigit()
+
+
+def from_json_patch(ops, obj_type):
+    '''
+    Return a Diff of an object of obj_type (an unordered mapping or a list or
+    tuple) equivalent to a JSON Patch. Only add, remove, replace and test
+    operations can be converted. A remove or replace needs a test of the
+    old value before it, as made by to_json_patch, since a Diff records the
+    value it removes. Operations on sequences must come in index order.
+    The types of nested objects are guessed: lists if they are addressed by
+    index, dicts otherwise.
+
+    :parameter ops: iterable of JSON Patch operations
+    :parameter obj_type: type of the object the patch applies to
+    '''
+    entries = [(parse_pointer(op['path']), op) for op in ops]
+    return _diff_from_entries(entries, obj_type, 0)
+
+
+def _diff_from_entries(entries, obj_type, depth):
+    if any(not components for components, _ in entries):
+        raise ValueError(
+            'Operations on a whole object cannot be converted to a Diff')
+    # patching an OrderedDict needs a diff of all its items, which a JSON
+    # Patch doesn't have.
+    if issubclass(obj_type, Mapping) and not issubclass(obj_type, OrderedDict):
+        diff_items = _mapping_items(entries, depth)
+    elif issubclass(obj_type, (list, tuple)):
+        diff_items = _sequence_items(entries, depth)
+    else:
+        raise TypeError(
+            'Cannot convert a JSON Patch to a Diff of type {}'.format(
+                obj_type))
+    return Diff(obj_type, diff_items, depth)
+
+
+def _nested_diff(entries, depth):
+    nested_type = list if all(
+        _is_index(components[0]) for components, _ in entries) else dict
+    return _diff_from_entries(entries, nested_type, depth + 1)
+
+
+def _old_value(tests, key, op):
+    try:
+        return tests.pop(key)
+    except KeyError:
+        raise ValueError(
+            'A {} operation needs a test of the old value at {} before '
+            'it'.format(op['op'], op['path']))
+
+
+def _mapping_items(entries, depth):
+    diff_items = []
+    nested = {}
+    tests = {}
+    for components, op in entries:
+        key = components[0]
+        if len(components) > 1:
+            if key not in nested:
+                nested[key] = []
+                diff_items.append(key)
+            nested[key].append((components[1:], op))
+        elif op['op'] == 'test':
+            tests[key] = op['value']
+        elif op['op'] == 'remove':
+            diff_items.append(MappingDiffItem(
+                remove, key, remove, _old_value(tests, key, op)))
+        elif op['op'] == 'add' and key not in tests:
+            diff_items.append(
+                MappingDiffItem(insert, key, insert, op['value']))
+        elif op['op'] in ('add', 'replace'):
+            diff_items += [
+                MappingDiffItem(
+                    unchanged, key, remove, _old_value(tests, key, op)),
+                MappingDiffItem(unchanged, key, insert, op['value'])]
+        else:
+            raise ValueError(
+                'Cannot convert a {} operation to a Diff'.format(op['op']))
+    # nested diffs are built once all their operations have been seen, the
+    # key holds their place until then.
+    return [
+        diff_item if isinstance(diff_item, MappingDiffItem) else
+        MappingDiffItem(
+            unchanged, diff_item, changed,
+            _nested_diff(nested[diff_item], depth))
+        for diff_item in diff_items]
+
+
+def _sequence_items(entries, depth):
+    diff_items = []
+    tests = {}
+    inserted = removed = 0
+    for components, op in entries:
+        if not components[0].isdigit():
+            raise ValueError(
+                'Cannot convert the operation on {} to a Diff'.format(
+                    op['path']))
+        t = int(components[0])
+        # the position in the first sequence, operations are in index order.
+        f = t - inserted + removed
+        if len(components) > 1:
+            last = diff_items[-1] if diff_items else None
+            if last and last.state == changed and last.context[2] == t:
+                last.item.append((components[1:], op))
+            else:
+                diff_items.append(DiffItem(
+                    changed, [(components[1:], op)], (f, f + 1, t, t + 1)))
+        elif op['op'] == 'test':
+            tests[t] = op['value']
+        elif op['op'] == 'remove':
+            diff_items.append(DiffItem(
+                remove, _old_value(tests, t, op), (f, f + 1, t, t)))
+            removed += 1
+        elif op['op'] == 'add':
+            diff_items.append(DiffItem(insert, op['value'], (f, f, t, t + 1)))
+            inserted += 1
+        elif op['op'] == 'replace':
+            diff_items += [
+                DiffItem(remove, _old_value(tests, t, op), (f, f + 1, t, t)),
+                DiffItem(insert, op['value'], (f + 1, f + 1, t, t + 1))]
+            removed += 1
+            inserted += 1
+        else:
+            raise ValueError(
+                'Cannot convert a {} operation to a Diff'.format(op['op']))
+    for diff_item in diff_items:
+        if diff_item.state == changed:
+            diff_item.item = _nested_diff(diff_item.item, depth)
+    return diff_items
+
+
+def apply_json_patch(obj, ops, in_place=False):
+    '''
+    Apply the operations of a JSON Patch to a structure of dicts and lists
+    and return the result. The operations are applied directly, one at a
+    time, so ops can be a stream. Removals and insertions are validated in
+    the same way as patch validates a Diff.
+
+    :parameter obj: structure to patch
+    :parameter ops: iterable of JSON Patch operations
+    :parameter in_place: Modify obj rather than a copy of it.
+    '''
+    document = obj if in_place else deepcopy(obj)
+    for op in ops:
+        document = _apply(document, op)
+    return document
+
+
+def _child(container, component):
+    if isinstance(container, Mapping):
+        return try_get_values(lambda: container[component])
+    elif isinstance(container, list):
+        index = _list_index(container, component)
+        validate_index(index, container)
+        return container[index]
+    raise TypeError(
+        'JSON Patch cannot be applied to {}'.format(type(container)))
+
+
+def _list_index(container, component, end=False):
+    if component == '-' and end:
+        return len(container)
+    if not component.isdigit():
+        raise IndexError('Invalid array index {!r}'.format(component))
+    return int(component)
+
+
+def _resolve(document, components):
+    for component in components:
+        document = _child(document, component)
+    return document
+
+
+def _add(document, components, value):
+    if not components:
+        return value
+    container = _resolve(document, components[:-1])
+    if isinstance(container, list):
+        index = _list_index(container, components[-1], end=True)
+        validate_insertion(index, index, container)
+        container.insert(index, value)
+    else:
+        container[components[-1]] = value
+    return document
+
+
+def _remove(document, components):
+    container = _resolve(document, components[:-1])
+    value = _child(container, components[-1])
+    if isinstance(container, list):
+        del container[int(components[-1])]
+    else:
+        del container[components[-1]]
+    return value
+
+
+def _apply(document, op):
+    name = op['op']
+    components = parse_pointer(op['path'])
+    if name == 'test':
+        if not values_are_equal(_resolve(document, components), op['value']):
+            raise ValueError('Test of {} failed'.format(op['path']))
+    elif name == 'add':
+        document = _add(document, components, op['value'])
+    elif name == 'remove':
+        _remove(document, components)
+    elif name == 'replace':
+        if not components:
+            return op['value']
+        _remove(document, components)
+        document = _add(document, components, op['value'])
+    elif name in ('move', 'copy'):
+        source = parse_pointer(op['from'])
+        if name == 'move':
+            value = _remove(document, source)
+        else:
+            value = deepcopy(_resolve(document, source))
+        document = _add(document, components, value)
+    else:
+        raise ValueError('Unknown JSON Patch operation {!r}'.format(name))
+    return document
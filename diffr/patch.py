@@ -1,25 +1,45 @@
-from collections import Sequence, Mapping, Set, OrderedDict
+from collections import OrderedDict
+from collections.abc import Sequence, Mapping, Set
 from copy import deepcopy
 from diffr.data_model import (
-    remove, insert, changed, unchanged,
+    remove, insert, changed, unchanged, is_ndarray, is_binary,
     Diff)
+from diffr.diff import (
+    values_are_equal, _ndarray_mismatch, _as_byte_buffer, _check_in)
 
 
-def patch(obj, diff):
+def patch(obj, diff, progress=None, cancel=None):
+    '''
+    Return a patched copy of obj, which diff was made from.
+
+    :parameter obj: object to patch
+    :parameter diff: Diff of obj
+    :parameter progress: Optional callable, called as
+        progress('patch', done, total, depth) between the items of the diff
+        and of every diff nested in it, counting items.
+    :parameter cancel: Optional threading.Event. Once it is set the patch
+        raises DiffCancelled at its next item.
+    '''
+    if cancel is not None:
+        _check_in(None, cancel, 'patch', 0, len(diff), diff.depth)
     if type(obj) != diff.type:
         raise TypeError(
             'Patch target type ({}) does not match diff type ({})'.format(
                 type(obj), diff.type))
+    elif is_ndarray(obj):
+        return patch_ndarray(obj, diff)
+    elif is_binary(obj):
+        return patch_bytes(obj, diff)
     elif isinstance(obj, Sequence) and hasattr(obj, '_make'):  # FIXME: ugh :(
-        return patch_named_tuple(obj, diff)
+        return patch_named_tuple(obj, diff, progress, cancel)
     elif isinstance(obj, Sequence):
-        return patch_sequence(obj, diff)
+        return patch_sequence(obj, diff, progress, cancel)
     elif isinstance(obj, Set):
         return patch_set(obj, diff)
     elif isinstance(obj, OrderedDict):
-        return patch_ordered_mapping(obj, diff)
+        return patch_ordered_mapping(obj, diff, progress, cancel)
     elif isinstance(obj, Mapping):
-        return patch_mapping(obj, diff)
+        return patch_mapping(obj, diff, progress, cancel)
     else:
         raise TypeError(
             'No mechanism for patching objects of type ({})'.format(type(obj)))
@@ -35,7 +55,7 @@ def validate_removal(items):
     except IndexError:
         raise IndexError(
             'Item subject to removal does not exist in patch target')
-    if item != diff_item.item:
+    if not values_are_equal(item, diff_item.item):
         raise ValueError(
             'Expected item for removal {} does not match item in patch target '
             '{}'.format(item, diff_item.item))
@@ -52,6 +72,14 @@ def validate_insertion(start, end, patched_obj):
         raise IndexError('Item out of range in patch target')
 
 
+def validate_index(index, patched_obj):
+    '''
+    Items can only be removed or replaced at an index which is in bounds.
+    '''
+    if not (0 <= index < len(patched_obj)):
+        raise IndexError('Item out of range in patch target')
+
+
 def validate_change(items):
     '''
     Items subject to change must exist in the target object and must be of the
@@ -74,10 +102,16 @@ def object_constructor(obj):
         return lambda x: type(obj)((x,))
 
 
-def patch_sequence(obj, diff):
+def _check_in_items(progress, cancel, done, diff):
+    if progress is not None or cancel is not None:
+        _check_in(progress, cancel, 'patch', done, len(diff), diff.depth)
+
+
+def patch_sequence(obj, diff, progress=None, cancel=None):
     patched = deepcopy(obj)
     offset = 0
-    for diff_item in diff:
+    for done, diff_item in enumerate(diff):
+        _check_in_items(progress, cancel, done, diff)
         start, end, _, _ = diff_item.context
         if diff_item.state is remove:
             validate_removal(lambda: (obj[start], diff_item))
@@ -95,8 +129,10 @@ def patch_sequence(obj, diff):
             validate_change(lambda: (obj[start], diff_item))
             patched = (
                 patched[:start + offset] +
-                object_constructor(obj)(patch(obj[start], diff_item.item)) +
+                object_constructor(obj)(patch(
+                    obj[start], diff_item.item, progress, cancel)) +
                 patched[end + offset:])
+    _check_in_items(progress, cancel, len(diff), diff)
     return patched
 
 
@@ -113,8 +149,9 @@ def patch_sequence(obj, diff):
 #        diff(a,b) = -1, 2, +3
 #    Treating as a Sequence gives you a minimal edit and in my opinion is the
 #    correct way to go considering that Point is a subclass of Sequence.
-def patch_named_tuple(obj, diff):
-    return type(obj)._make(patch_sequence(tuple(obj), diff))
+def patch_named_tuple(obj, diff, progress=None, cancel=None):
+    return type(obj)._make(
+        patch_sequence(tuple(obj), diff, progress, cancel))
 
 
 def try_get_values(values):
@@ -127,7 +164,7 @@ def try_get_values(values):
 
 def validate_mapping_removal(values):
     removal_val, original_val = try_get_values(values)
-    if removal_val != original_val:
+    if not values_are_equal(removal_val, original_val):
         raise ValueError(
             'Value subject to removal does not match the value in patch target')
 
@@ -141,13 +178,14 @@ def validate_mapping_change(values):
         )
 
 
-def patch_mapping(obj, diff):
+def patch_mapping(obj, diff, progress=None, cancel=None):
     # ordered mapping needs a separate function. you can end up moving a
     # key value pair to a different position which may give you an insert
     # followed by a remove, as it stands this would cause patch to actually
     # remove it completely!
     patched = deepcopy(obj)
-    for map_item in diff:
+    for done, map_item in enumerate(diff):
+        _check_in_items(progress, cancel, done, diff)
         if map_item.state is remove:
             validate_mapping_removal(
                 lambda: (map_item.value, patched[map_item.key]))
@@ -158,7 +196,9 @@ def patch_mapping(obj, diff):
             assert(type(map_item.value) == Diff)
             validate_mapping_change(
                 lambda: (map_item.value, patched[map_item.key]))
-            patched[map_item.key] = patch(obj[map_item.key], map_item.value)
+            patched[map_item.key] = patch(
+                obj[map_item.key], map_item.value, progress, cancel)
+    _check_in_items(progress, cancel, len(diff), diff)
     return patched
 
 
@@ -180,11 +220,12 @@ def validate_ordered_mapping_change(items):
             'in patch target'.format(diff_item.value.type, type(value)))
 
 
-def patch_ordered_mapping(obj, diff):
+def patch_ordered_mapping(obj, diff, progress=None, cancel=None):
     # treated pretty much in the same way as a sequence.
     patched_items = list(obj.items())
     offset = 0
     for i, diff_item in enumerate(diff):
+        _check_in_items(progress, cancel, i, diff)
         if diff_item.state is remove:
             validate_removal(lambda: (patched_items[i + offset], diff_item))
             patched_items = (
@@ -206,10 +247,13 @@ def patch_ordered_mapping(obj, diff):
                 patched_items[:i + offset] +
                 [(
                     diff_item.key,
-                    patch(patched_items[i + offset][1], diff_item.value)
+                    patch(
+                        patched_items[i + offset][1], diff_item.value,
+                        progress, cancel)
                 )] +
                 patched_items[i + 1 + offset:]
             )
+    _check_in_items(progress, cancel, len(diff), diff)
     return type(obj)(patched_items)
 
 
@@ -220,3 +264,55 @@ def patch_set(obj, diff):
             'Some items subject to removal do not exist in patch target')
     inserts = set([di.item for di in diff if di.state is insert])
     return type(obj)(obj.difference(removals).union(inserts))
+
+
+def patch_ndarray(obj, diff):
+    # the changed values are written into a copy of the target in one go with
+    # fancy indexing rather than element by element. The copy has the dtype
+    # of the array diffed to.
+    patched = obj.copy()
+    for diff_item in diff:
+        if diff_item.shape != obj.shape:
+            raise ValueError(
+                'Patch target shape {} does not match diff shape {}'.format(
+                    obj.shape, diff_item.shape))
+        if _ndarray_mismatch(
+                obj.flat[diff_item.indices], diff_item.from_values).any():
+            raise ValueError(
+                'Values subject to change do not match the values in patch '
+                'target')
+        if patched.dtype != diff_item.to_values.dtype:
+            patched = patched.astype(diff_item.to_values.dtype)
+        patched.flat[diff_item.indices] = diff_item.to_values
+    return patched
+
+
+def validate_block(start, end, source):
+    if not (0 <= start <= end <= len(source)):
+        raise IndexError('Block {}:{} out of range in patch target'.format(
+            start, end))
+
+
+def patch_bytes(obj, diff):
+    # the patched object is assembled from memoryview slices of the target
+    # for copied blocks and the literal bytes held by the diff for inserted
+    # blocks, so nothing is copied until the final join.
+    source = _as_byte_buffer(obj)
+    blocks = []
+    for diff_item in diff:
+        start, end, _, _ = diff_item.context
+        if diff_item.state is remove:
+            validate_block(start, end, source)
+            if source[start:end] != diff_item.item:
+                raise ValueError(
+                    'Block subject to removal does not match the block in '
+                    'patch target')
+        elif diff_item.state is insert:
+            blocks.append(diff_item.item)
+        else:
+            validate_block(start, end, source)
+            blocks.append(source[start:end])
+    if type(obj) is bytearray:
+        return bytearray().join(blocks)
+    patched = b''.join(blocks)
+    return patched if type(obj) is bytes else type(obj)(patched)
@@ -0,0 +1,593 @@
+'''
+A compact, versioned binary format for Diffs.
+
+A record is the magic bytes, a version byte, the length of the body as a
+varint and the body. A stream is any number of records one after the other.
+The body is a Diff:
+
+    type, depth, number of items, stats (4 varints), items
+
+Types are written in full the first time they appear in a record and by
+number after that. Every item starts with a byte packing its state, key
+state, kind and flags, followed by its context as zigzag varint deltas from
+the previous item and then its values. Nested Diffs are written in place,
+other values are written by a value codec: in place by the default codec,
+prefixed with their length by any other.
+
+Loading a record never runs code named by it unless asked to. Diffs may only
+be of builtin, collections and numpy ndarray types, or of the types passed
+to loads, and the default codec refuses pickled values. Unpickling data runs
+any code the data names, so a codec which unpickles values, like
+ValueCodec(allow_pickle=True) or the pickle module, must only be used for
+records from a trusted source.
+'''
+import pickle
+import struct
+from functools import partial
+from collections import (
+    OrderedDict, defaultdict, Counter, deque, UserDict, UserList, UserString)
+from diffr.data_model import (
+    _STATES, is_ndarray, Diff, DiffItem, DiffStats, MappingDiffItem,
+    ArrayDiffItem)
+from diffr.json_files import JsonValue
+
+MAGIC = b'DIFR'
+VERSION = 1
+
+_DIFF_ITEM, _MAPPING_DIFF_ITEM, _ARRAY_DIFF_ITEM = 0, 1, 2
+_HAS_CONTEXT = 0x40
+_NESTED = 0x80
+
+
+def _write_varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+
+# Records are read in place from the bytes, bytearray or memoryview holding
+# them, by functions which take a position and return what they read along
+# with the position after it. Most varints are a single byte, so callers
+# read that byte themselves and only call _varint for longer ones.
+def _varint(data, pos):
+    # the varint at pos and the position after it.
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _as_bytes(data):
+    if isinstance(data, memoryview):
+        return data.cast('B') if data.format != 'B' else data
+    return data
+
+
+class ValueCodec(object):
+    '''
+    The default value codec. Common builtin values (None, bools, ints,
+    floats, text, binary data, lists, tuples, dicts, sets and frozensets) are
+    written in a compact tagged form, numpy ndarrays as their raw data and
+    unparsed JSON values as the values they hold. Anything else can only be
+    written if allow_pickle is set, and is pickled.
+
+    Any object with dumps(value) -> bytes and loads(bytes) -> value methods
+    can be used as a value codec instead, e.g. the pickle module.
+
+    :parameter allow_pickle: Pickle values of other types, and unpickle the
+        pickled values of records. Unpickling runs any code the record
+        names, so only load records from a trusted source with it set.
+    '''
+    def __init__(self, allow_pickle=False):
+        self.allow_pickle = allow_pickle
+
+    def dumps(self, value):
+        out = bytearray()
+        self._write(out, value)
+        return bytes(out)
+
+    def loads(self, data):
+        return _read_value(self, _as_bytes(data), 0)[0]
+
+    def _write(self, out, value):
+        writer = _writers.get(type(value))
+        if writer is not None:
+            writer(self, out, value)
+        elif is_ndarray(value) and not value.dtype.hasobject:
+            _write_ndarray(out, value)
+        elif self.allow_pickle:
+            _write_binary(
+                out, b'p', pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        else:
+            raise TypeError(
+                'Cannot write a value of type {} without pickling it, see '
+                'ValueCodec'.format(type(value).__name__))
+
+
+def _write_binary(out, tag, data):
+    out += tag
+    _write_varint(out, len(data))
+    out += data
+
+
+def _write_int(codec, out, value):
+    out += b'i'
+    _write_varint(out, _zigzag(value))
+
+
+def _write_float(codec, out, value):
+    out += b'f'
+    out += struct.pack('<d', value)
+
+
+def _write_collection(tag):
+    def write(codec, out, value):
+        out += tag
+        _write_varint(out, len(value))
+        for item in value:
+            codec._write(out, item)
+    return write
+
+
+def _write_dict(codec, out, value):
+    out += b'd'
+    _write_varint(out, len(value))
+    for key, item in value.items():
+        codec._write(out, key)
+        codec._write(out, item)
+
+
+def _write_ndarray(out, value):
+    dtype = value.dtype.str.encode('ascii')
+    _write_binary(out, b'a', dtype)
+    _write_varint(out, len(value.shape))
+    for dimension in value.shape:
+        _write_varint(out, dimension)
+    data = value.tobytes()
+    _write_varint(out, len(data))
+    out += data
+
+
+def _read_raw(data, pos):
+    # a varint length and that many bytes, as a slice of data.
+    length = data[pos]
+    pos += 1
+    if length > 0x7f:
+        length, pos = _varint(data, pos - 1)
+    end = pos + length
+    return data[pos:end], end
+
+
+def _read_ndarray(codec, data, pos):
+    import numpy
+    dtype, pos = _read_raw(data, pos)
+    ndim, pos = _varint(data, pos)
+    shape = []
+    for _ in range(ndim):
+        dimension, pos = _varint(data, pos)
+        shape.append(dimension)
+    values, pos = _read_raw(data, pos)
+    array = numpy.frombuffer(values, str(dtype, 'ascii'))
+    return array.reshape(shape).copy(), pos
+
+
+def _read_pickle(codec, data, pos):
+    pickled, pos = _read_raw(data, pos)
+    if not codec.allow_pickle:
+        raise ValueError(
+            'The serialized diff holds a pickled value, which is only loaded '
+            'by ValueCodec(allow_pickle=True)')
+    return pickle.loads(pickled), pos
+
+
+def _read_dict(codec, data, pos):
+    length, pos = _varint(data, pos)
+    value = {}
+    for _ in range(length):
+        key, pos = _read_value(codec, data, pos)
+        value[key], pos = _read_value(codec, data, pos)
+    return value, pos
+
+
+def _read_bytes(obj_type):
+    def read(codec, data, pos):
+        value, pos = _read_raw(data, pos)
+        return obj_type(value), pos
+    return read
+
+
+_DOUBLE = struct.Struct('<d')
+
+
+def _read_float(codec, data, pos):
+    return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+
+
+def _constant(value):
+    return lambda codec, data, pos: (value, pos)
+
+
+_writers = {
+    type(None): lambda codec, out, value: out.extend(b'N'),
+    bool: lambda codec, out, value: out.extend(b'T' if value else b'F'),
+    int: _write_int,
+    float: _write_float,
+    str: lambda codec, out, value: _write_binary(
+        out, b's', value.encode('utf-8')),
+    bytes: lambda codec, out, value: _write_binary(out, b'b', value),
+    bytearray: lambda codec, out, value: _write_binary(out, b'B', value),
+    memoryview: lambda codec, out, value: _write_binary(
+        out, b'b', value.tobytes()),
+    list: _write_collection(b'l'),
+    tuple: _write_collection(b't'),
+    set: _write_collection(b'S'),
+    frozenset: _write_collection(b'z'),
+    dict: _write_dict,
+    JsonValue: lambda codec, out, value: codec._write(out, value.load()),
+}
+
+_readers = dict((ord(tag), read) for tag, read in [
+    (b'N', _constant(None)),
+    (b'T', _constant(True)),
+    (b'F', _constant(False)),
+    (b'f', _read_float),
+    (b'b', _read_bytes(bytes)),
+    (b'B', _read_bytes(bytearray)),
+    (b'd', _read_dict),
+    (b'a', _read_ndarray),
+    (b'p', _read_pickle),
+])
+
+_TEXT_TAG, _INT_TAG = ord(b's'), ord(b'i')
+_COLLECTION_TAGS = {ord(b'l'): list, ord(b't'): tuple, ord(b'S'): set,
+                    ord(b'z'): frozenset}
+
+
+def _read_value(codec, data, pos):
+    # the value written by ValueCodec._write at pos. Text, ints and the
+    # collections of them which make up most values are read here, anything
+    # else through _readers.
+    tag = data[pos]
+    if tag == _TEXT_TAG:
+        length = data[pos + 1]
+        pos += 2
+        if length > 0x7f:
+            length, pos = _varint(data, pos - 1)
+        end = pos + length
+        return str(data[pos:end], 'utf-8'), end
+    if tag == _INT_TAG:
+        n = data[pos + 1]
+        pos += 2
+        if n > 0x7f:
+            n, pos = _varint(data, pos - 1)
+        return (n >> 1 if not n & 1 else -((n + 1) >> 1)), pos
+    obj_type = _COLLECTION_TAGS.get(tag)
+    if obj_type is not None:
+        length = data[pos + 1]
+        pos += 2
+        if length > 0x7f:
+            length, pos = _varint(data, pos - 1)
+        items = []
+        append = items.append
+        for _ in range(length):
+            # ints and text items are read in the loop, saving a call each.
+            tag = data[pos]
+            if tag == _INT_TAG:
+                n = data[pos + 1]
+                pos += 2
+                if n > 0x7f:
+                    if data[pos] < 0x80:
+                        n = n & 0x7f | data[pos] << 7
+                        pos += 1
+                    else:
+                        n, pos = _varint(data, pos - 1)
+                append(n >> 1 if not n & 1 else -((n + 1) >> 1))
+            elif tag == _TEXT_TAG:
+                length = data[pos + 1]
+                pos += 2
+                if length > 0x7f:
+                    length, pos = _varint(data, pos - 1)
+                append(str(data[pos:pos + length], 'utf-8'))
+                pos += length
+            else:
+                item, pos = _read_value(codec, data, pos)
+                append(item)
+        return (items if obj_type is list else obj_type(items)), pos
+    read = _readers.get(tag)
+    if read is None:
+        raise ValueError('Unknown value tag {!r}'.format(chr(tag)))
+    return read(codec, data, pos + 1)
+
+
+_default_codec = ValueCodec()
+
+_NDARRAY = 'numpy:ndarray'
+
+
+def _type_name(obj_type):
+    name = getattr(obj_type, '__qualname__', obj_type.__name__)
+    return '{}:{}'.format(obj_type.__module__, name)
+
+
+_SAFE_TYPES = dict((_type_name(obj_type), obj_type) for obj_type in (
+    list, tuple, dict, set, frozenset, str, bytes, bytearray, OrderedDict,
+    defaultdict, Counter, deque, UserDict, UserList, UserString))
+
+
+def _known_types(types):
+    if not types:
+        return _SAFE_TYPES
+    known = dict(_SAFE_TYPES)
+    known.update((_type_name(obj_type), obj_type) for obj_type in types)
+    return known
+
+
+def _resolve_type(name, known):
+    # types are looked up by name rather than imported, so a record can't
+    # make loads import a module or call anything but a known type.
+    if name in known:
+        return known[name]
+    if name == _NDARRAY:
+        try:
+            import numpy
+        except ImportError:
+            pass
+        else:
+            return numpy.ndarray
+    raise ValueError(
+        'The diffed type {} is not a known type, pass it to loads in '
+        'types'.format(name))
+
+
+class _Encoder(object):
+    def __init__(self, codec):
+        self.codec = codec or _default_codec
+        self.types = {}
+        self.out = bytearray()
+
+    def value(self, value):
+        if self.codec is _default_codec:
+            self.codec._write(self.out, value)
+            return
+        data = self.codec.dumps(value)
+        _write_varint(self.out, len(data))
+        self.out += data
+
+    def type(self, obj_type):
+        out = self.out
+        if obj_type in self.types:
+            _write_varint(out, self.types[obj_type] + 1)
+        else:
+            self.types[obj_type] = len(self.types)
+            name = _type_name(obj_type).encode('utf-8')
+            out.append(0)
+            _write_varint(out, len(name))
+            out += name
+
+    def diff(self, diff):
+        out = self.out
+        self.type(diff.type)
+        _write_varint(out, diff.depth)
+        _write_varint(out, len(diff))
+        for count in diff.stats:
+            _write_varint(out, count)
+        f = t = 0
+        for diff_item in diff:
+            if isinstance(diff_item, ArrayDiffItem):
+                out.append(diff_item.state | _ARRAY_DIFF_ITEM << 4)
+                self.value(diff_item.shape)
+                self.value(diff_item.indices)
+                self.value(diff_item.from_values)
+                self.value(diff_item.to_values)
+                continue
+            if isinstance(diff_item, MappingDiffItem):
+                payload = diff_item.value
+                flags = (
+                    diff_item.state | diff_item.key_state << 2 |
+                    _MAPPING_DIFF_ITEM << 4)
+                context = None
+            else:
+                payload = diff_item.item
+                flags = diff_item.state | _DIFF_ITEM << 4
+                context = diff_item.context
+                if context is not None:
+                    flags |= _HAS_CONTEXT
+            nested = isinstance(payload, Diff)
+            if nested:
+                flags |= _NESTED
+            out.append(flags)
+            if context is not None:
+                f_s, f_e, t_s, t_e = context
+                _write_varint(out, _zigzag(f_s - f))
+                _write_varint(out, _zigzag(f_e - f_s))
+                _write_varint(out, _zigzag(t_s - t))
+                _write_varint(out, _zigzag(t_e - t_s))
+                f, t = f_e, t_e
+            if flags & _MAPPING_DIFF_ITEM << 4:
+                self.value(diff_item.key)
+            if nested:
+                self.diff(payload)
+            else:
+                self.value(payload)
+
+
+class _Decoder(object):
+    def __init__(self, data, codec, types=()):
+        self.data = data
+        self.codec = codec or _default_codec
+        self.known = _known_types(types)
+        self.types = []
+        if self.codec is _default_codec:
+            self.value = partial(_read_value, self.codec, data)
+
+    def value(self, pos):
+        encoded, pos = _read_raw(self.data, pos)
+        return self.codec.loads(bytes(encoded)), pos
+
+    def type(self, pos):
+        index, pos = _varint(self.data, pos)
+        if index:
+            return self.types[index - 1], pos
+        name, pos = _read_raw(self.data, pos)
+        obj_type = _resolve_type(str(name, 'utf-8'), self.known)
+        self.types.append(obj_type)
+        return obj_type, pos
+
+    def diff(self, pos):
+        # the Diff at pos and the position after it. This is the inner loop
+        # of loads, so the data and methods it uses are kept in locals.
+        data = self.data
+        value = self.value
+        obj_type, pos = self.type(pos)
+        counts = []
+        for _ in range(6):
+            n = data[pos]
+            pos += 1
+            if n > 0x7f:
+                n, pos = _varint(data, pos - 1)
+            counts.append(n)
+        depth, length = counts[:2]
+        stats = DiffStats(*counts[2:])
+        diffs = []
+        append = diffs.append
+        f = t = 0
+        for _ in range(length):
+            flags = data[pos]
+            pos += 1
+            state = _STATES[flags & 3]
+            kind = flags >> 4 & 3
+            if kind == _ARRAY_DIFF_ITEM:
+                shape, pos = value(pos)
+                indices, pos = value(pos)
+                from_values, pos = value(pos)
+                to_values, pos = value(pos)
+                append(ArrayDiffItem(shape, indices, from_values, to_values))
+                continue
+            context = None
+            if flags & _HAS_CONTEXT:
+                deltas = []
+                for _ in range(4):
+                    n = data[pos]
+                    pos += 1
+                    if n > 0x7f:
+                        n, pos = _varint(data, pos - 1)
+                    deltas.append(n >> 1 if not n & 1 else -((n + 1) >> 1))
+                f_s = f + deltas[0]
+                f_e = f_s + deltas[1]
+                t_s = t + deltas[2]
+                t_e = t_s + deltas[3]
+                context = (f_s, f_e, t_s, t_e)
+                f, t = f_e, t_e
+            if kind == _MAPPING_DIFF_ITEM:
+                key, pos = value(pos)
+            if flags & _NESTED:
+                payload, pos = self.diff(pos)
+            else:
+                payload, pos = value(pos)
+            if kind == _MAPPING_DIFF_ITEM:
+                append(MappingDiffItem(
+                    _STATES[flags >> 2 & 3], key, state, payload))
+            else:
+                append(DiffItem(state, payload, context))
+        return Diff(obj_type, diffs, depth, stats), pos
+
+    def record(self, pos=0):
+        # the Diff in the body of a record starting at pos.
+        try:
+            return self.diff(pos)[0]
+        except IndexError:
+            raise ValueError('Serialized diff is truncated')
+
+
+def dumps(diff, codec=None):
+    '''
+    Return the diff encoded as a bytes record.
+
+    :parameter diff: Diff to encode
+    :parameter codec: Optional value codec, see ValueCodec.
+    '''
+    encoder = _Encoder(codec)
+    encoder.diff(diff)
+    header = bytearray(MAGIC)
+    header.append(VERSION)
+    _write_varint(header, len(encoder.out))
+    return bytes(header + encoder.out)
+
+
+def _check_header(magic, version):
+    if magic != MAGIC:
+        raise ValueError('Not a serialized diff')
+    if version != VERSION:
+        raise ValueError(
+            'Unsupported diff serialization version {}'.format(version))
+
+
+def loads(data, codec=None, types=()):
+    '''
+    Return the Diff encoded in a bytes record made by dumps.
+
+    :parameter data: bytes record
+    :parameter codec: The value codec the record was made with.
+    :parameter types: Types other than the builtin, collections and numpy
+        ndarray types that the diff and its nested diffs may be of, e.g.
+        namedtuple classes. Other types named by the record aren't imported.
+    '''
+    data = _as_bytes(data)
+    header = len(MAGIC)
+    _check_header(
+        bytes(data[:header]), data[header] if len(data) > header else None)
+    try:
+        length, pos = _varint(data, header + 1)
+    except IndexError:
+        raise ValueError('Serialized diff is truncated')
+    if len(data) - pos != length:
+        raise ValueError('Serialized diff is the wrong length')
+    return _Decoder(data, codec, types).record(pos)
+
+
+def dump(diff, fp, codec=None):
+    '''
+    Write the diff to the binary file object fp as a record. Any number of
+    diffs can be written one after another and read back with iter_load.
+    '''
+    fp.write(dumps(diff, codec))
+
+
+def _read_varint(fp):
+    shift = result = 0
+    while True:
+        byte = fp.read(1)
+        if not byte:
+            raise ValueError('Serialized diff is truncated')
+        byte = ord(byte)
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result
+        shift += 7
+
+
+def iter_load(fp, codec=None, types=()):
+    '''
+    Yield the Diffs written to the binary file object fp by dump, one record
+    at a time. codec and types are as for loads.
+    '''
+    while True:
+        magic = fp.read(len(MAGIC))
+        if not magic:
+            return
+        version = fp.read(1)
+        _check_header(magic, ord(version) if version else None)
+        length = _read_varint(fp)
+        body = fp.read(length)
+        if len(body) != length:
+            raise ValueError('Serialized diff is truncated')
+        yield _Decoder(body, codec, types).record()
@@ -0,0 +1,118 @@
+'''
+A versioned object store. Every version of an object is kept as its diff
+from the version before, with a full snapshot of the object every so many
+versions, so any version can be rebuilt from the nearest snapshot by a short
+chain of patches rather than by patching every version since the first.
+'''
+from bisect import bisect_left
+from collections import OrderedDict
+from copy import deepcopy
+from diffr.diff import diff
+from diffr.patch import patch
+from diffr.invert import invert
+
+
+class Store(object):
+    '''
+    The versions of an object, numbered from 0 in the order they are
+    committed.
+
+        store = Store(snapshot_interval=50)
+        store.commit(config)
+        ...
+        old_config = store[12]
+
+    A version is rebuilt from whichever of the snapshots either side of it,
+    the latest version and the recently rebuilt versions is the fewest
+    patches away. Versions after it are undone with the inverted diffs.
+    The objects returned are shared with the store, they mustn't be
+    modified.
+
+    :parameter snapshot_interval: Number of versions between snapshots. A
+        smaller interval rebuilds versions faster at the cost of storing
+        more full copies of the object. Can be changed at any time.
+    :parameter cache_size: Number of rebuilt versions to keep.
+    '''
+    def __init__(self, snapshot_interval=32, cache_size=16):
+        if snapshot_interval < 1:
+            raise ValueError('The snapshot interval must be at least 1')
+        self.snapshot_interval = snapshot_interval
+        self.cache_size = cache_size
+        self._diffs = []
+        self._snapshot_versions = []
+        self._snapshots = {}
+        self._head = None
+        self._since_snapshot = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._diffs)
+
+    def commit(self, obj):
+        '''
+        Add a copy of obj as the next version and return its number.
+        '''
+        version = len(self._diffs)
+        obj = deepcopy(obj)
+        if version:
+            self._diffs.append(diff(self._head, obj))
+            self._since_snapshot += 1
+        else:
+            self._diffs.append(None)
+        if not version or self._since_snapshot >= self.snapshot_interval:
+            self._snapshot_versions.append(version)
+            self._snapshots[version] = obj
+            self._since_snapshot = 0
+        self._head = obj
+        return version
+
+    def get_diff(self, version):
+        '''
+        Return the Diff from the version before to version.
+        '''
+        version = self._version(version)
+        if not version:
+            raise ValueError('Version 0 has no diff')
+        return self._diffs[version]
+
+    def _version(self, version):
+        if version < 0:
+            version += len(self._diffs)
+        if not 0 <= version < len(self._diffs):
+            raise IndexError('Store has no version {}'.format(version))
+        return version
+
+    def _nearest(self, version):
+        # the materialized version fewest patches away, preferring an older
+        # one since patching forwards doesn't need the diffs inverted.
+        i = bisect_left(self._snapshot_versions, version)
+        candidates = [len(self._diffs) - 1] + list(self._cache)
+        candidates += self._snapshot_versions[max(i - 1, 0):i + 1]
+        start = min(
+            candidates, key=lambda v: (abs(v - version), v > version))
+        if start == len(self._diffs) - 1:
+            return start, self._head
+        if start in self._snapshots:
+            return start, self._snapshots[start]
+        return start, self._cache[start]
+
+    def __getitem__(self, version):
+        version = self._version(version)
+        if version in self._cache:
+            obj = self._cache.pop(version)
+            self._cache[version] = obj
+            return obj
+        start, obj = self._nearest(version)
+        if start == version:
+            return obj
+        if start < version:
+            for diff_obj in self._diffs[start + 1:version + 1]:
+                obj = patch(obj, diff_obj)
+        else:
+            for diff_obj in reversed(self._diffs[version + 1:start + 1]):
+                obj = patch(obj, invert(diff_obj))
+        if self.cache_size > 0:
+            self._cache[version] = obj
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return obj
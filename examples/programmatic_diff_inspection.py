@@ -49,6 +49,12 @@ b = 'b' * 5 + 'a' * 5
 print(''.join([str(i) for i in diff(a, b) if i.state == insert]))
 print('filter on removals')
 print(''.join([str(i) for i in diff(a, b) if i.state == remove]))
+print('the same filters without looping over the diff yourself')
+d = diff(a, b)
+print(''.join([str(i) for i in d.inserts()]))
+print(''.join([str(i) for i in d.removals()]))
+print('indices of the removals: {}'.format(d.indices(remove)))
+print('number of items in each state: {}'.format(d.counts()))
 print('---------------------------------------------------------')
 print('Diff evaluates false if it\'s empty or if there are no changes')
 empty_diff = diff([], [])
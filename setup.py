@@ -12,14 +12,16 @@ setup(
     license='MIT',
     packages=find_packages(
         exclude=['examples', 'test', 'contrib']),
+    python_requires='>=3.7',
     install_requires=['blessings'],
+    entry_points={'console_scripts': ['diffr = diffr.__main__:main']},
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Software Development :: Libraries :: Python Modules',
         'Topic :: Software Development :: Testing'
     ])
@@ -0,0 +1,96 @@
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from diffr import diff, dump, Archive
+from diffr.archive import INDEX_SUFFIX
+
+
+class ArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.diffr')
+        self.diffs = [
+            diff('abc', 'abd'), diff({1: [1, 2]}, {1: [1, 3], 2: 'x'}),
+            diff([1], []), diff({1, 2}, {2, 3})]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, diffs, **kwargs):
+        with Archive(self.path, **kwargs) as archive:
+            return [archive.append(d) for d in diffs]
+
+    def test_append_and_get(self):
+        self.assertEqual(self.write(self.diffs), [0, 1, 2, 3])
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(len(archive), 4)
+            self.assertEqual(archive[1], self.diffs[1])
+            self.assertEqual(archive[-1], self.diffs[-1])
+            self.assertEqual(archive[0].stats, self.diffs[0].stats)
+            self.assertRaises(IndexError, lambda: archive[4])
+            self.assertRaises(IndexError, lambda: archive[-5])
+
+    def test_read_while_appending(self):
+        with Archive(self.path) as archive:
+            for i, d in enumerate(self.diffs):
+                archive.append(d)
+                self.assertEqual(archive[i], d)
+                self.assertEqual(archive[0], self.diffs[0])
+
+    def test_reopen_and_append(self):
+        self.write(self.diffs[:2])
+        self.write(self.diffs[2:])
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(list(archive), self.diffs)
+
+    def test_ranges(self):
+        self.write(self.diffs)
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(list(archive.iter_range(1, 3)), self.diffs[1:3])
+            self.assertEqual(list(archive.iter_range(2)), self.diffs[2:])
+            self.assertEqual(archive[::2], self.diffs[::2])
+            self.assertEqual(archive[-2:], self.diffs[-2:])
+
+    def test_empty_archive(self):
+        self.write([])
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(len(archive), 0)
+            self.assertEqual(list(archive), [])
+
+    def test_read_only(self):
+        self.write(self.diffs[:1])
+        with Archive(self.path, 'r') as archive:
+            self.assertRaises(IOError, archive.append, self.diffs[1])
+        self.assertRaises(ValueError, Archive, self.path, 'w')
+
+    def test_index_is_rebuilt(self):
+        with io.open(self.path, 'wb') as fp:
+            for d in self.diffs:
+                dump(d, fp)
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(archive[2], self.diffs[2])
+        self.assertFalse(os.path.exists(self.path + INDEX_SUFFIX))
+        self.write(self.diffs[:1])
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(list(archive), self.diffs + self.diffs[:1])
+
+    def test_interrupted_append(self):
+        self.write(self.diffs)
+        with io.open(self.path, 'ab') as fp:
+            dump(self.diffs[0], fp)
+        with Archive(self.path, 'r') as archive:
+            self.assertEqual(list(archive), self.diffs)
+
+    def test_truncated_data_without_index(self):
+        with io.open(self.path, 'wb') as fp:
+            dump(self.diffs[0], fp)
+            fp.write(b'DIFR\x01\x05ab')
+        self.assertRaises(ValueError, Archive, self.path, 'r')
+
+    def test_codec(self):
+        self.write(self.diffs, codec=pickle)
+        with Archive(self.path, 'r', codec=pickle) as archive:
+            self.assertEqual(list(archive), self.diffs)
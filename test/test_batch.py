@@ -0,0 +1,57 @@
+import subprocess
+import sys
+import unittest
+from collections import OrderedDict
+from diffr import diff, diff_many
+
+
+def make_pairs(count):
+    return [
+        ({'id': i, 'tags': ['a', 'b'], 'n': OrderedDict([('x', i)])},
+         {'id': i, 'tags': ['a', str(i)], 'n': OrderedDict([('x', i % 3)])})
+        for i in range(count)]
+
+
+class DiffManyTests(unittest.TestCase):
+    def setUp(self):
+        self.pairs = make_pairs(25)
+        self.expected = [diff(a, b) for a, b in self.pairs]
+
+    def test_in_process(self):
+        self.assertEqual(
+            list(diff_many(self.pairs, workers=1, chunksize=4)),
+            self.expected)
+
+    def test_worker_pool(self):
+        diffs = list(diff_many(iter(self.pairs), workers=2, chunksize=3))
+        self.assertEqual(diffs, self.expected)
+        self.assertEqual(
+            [d.stats for d in diffs], [d.stats for d in self.expected])
+
+    def test_unordered(self):
+        results = list(diff_many(
+            self.pairs, workers=2, chunksize=4, ordered=False))
+        self.assertEqual(
+            sorted(i for i, _ in results), list(range(len(self.pairs))))
+        for i, diff_obj in results:
+            self.assertEqual(diff_obj, self.expected[i])
+
+    def test_empty(self):
+        self.assertEqual(list(diff_many([], workers=2)), [])
+
+    def test_errors_are_raised(self):
+        pairs = [([1], [2]), ([1], {1: 2})]
+        for workers in (1, 2):
+            diffs = diff_many(pairs, workers=workers, chunksize=1)
+            self.assertEqual(next(diffs), diff([1], [2]))
+            self.assertRaises(TypeError, next, diffs)
+
+    def test_close_early(self):
+        diffs = diff_many(self.pairs, workers=2, chunksize=2)
+        self.assertEqual(next(diffs), self.expected[0])
+        diffs.close()
+
+    def test_importing_diffr_does_not_import_multiprocessing(self):
+        script = 'import sys, diffr; print("multiprocessing" in sys.modules)'
+        output = subprocess.check_output([sys.executable, '-c', script])
+        self.assertEqual(output.strip(), b'False')
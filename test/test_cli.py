@@ -0,0 +1,119 @@
+import io
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from diffr import diff, iter_load
+from diffr.__main__ import main, file_type, SAME, DIFFERENT, ERROR
+
+
+class MainTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        sys.stderr = io.StringIO()
+
+    def tearDown(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        return path
+
+    def write_json(self, name, value):
+        return self.write(name, json.dumps(value).encode('utf-8'))
+
+    def output(self):
+        sys.stdout.flush()
+        return sys.stdout.buffer.getvalue()
+
+    def test_file_types(self):
+        self.assertEqual(file_type('a/b.JSON'), 'json')
+        self.assertEqual(file_type('b.ndjson'), 'jsonl')
+        self.assertEqual(file_type('b.pkl'), 'pickle')
+        self.assertEqual(file_type('b.txt'), 'bytes')
+
+    def test_same_files(self):
+        a = self.write_json('a.json', {'a': [1, 2]})
+        b = self.write_json('b.json', {'a': [1, 2]})
+        self.assertEqual(main([a, b]), SAME)
+        self.assertEqual(self.output(), b'')
+
+    def test_different_files(self):
+        a = self.write_json('a.json', {'a': [1, 2]})
+        b = self.write_json('b.json', {'a': [1, 3]})
+        self.assertEqual(main(['-f', 'plain', a, b]), DIFFERENT)
+        output = self.output().decode('utf-8')
+        self.assertTrue(output.startswith('--- {}\n+++ {}\n'.format(a, b)))
+        self.assertIn('- 2', output)
+        self.assertIn('+ 3', output)
+        self.assertNotIn('\x1b', output)
+
+    def test_color_and_context(self):
+        a = self.write_json('a.json', list(range(10)))
+        b = self.write_json('b.json', list(range(9)) + [10])
+        self.assertEqual(main(['-f', 'color', '-C', '1', a, b]), DIFFERENT)
+        output = self.output().decode('utf-8')
+        self.assertIn('\x1b', output)
+        self.assertNotIn('  5', output)
+
+    def test_serialized_output(self):
+        a = self.write('a.pkl', pickle.dumps({'a': {1, 2}}))
+        b = self.write('b.pkl', pickle.dumps({'a': {1, 3}}))
+        c = self.write('c.txt', b'abc')
+        self.assertEqual(main(['-f', 'diffr', a, b, c, c, b, a]), DIFFERENT)
+        self.assertEqual(
+            list(iter_load(io.BytesIO(self.output()))),
+            [diff({'a': {1, 2}}, {'a': {1, 3}}),
+             diff({'a': {1, 3}}, {'a': {1, 2}})])
+
+    def test_directories(self):
+        self.write_json('a/same.json', [1])
+        self.write_json('b/same.json', [1])
+        self.write_json('a/sub/x.jsonl', [1])
+        self.write_json('b/sub/x.jsonl', [2])
+        self.write('a/only.txt', b'x')
+        status = main([
+            '-q', '--timing', os.path.join(self.directory, 'a'),
+            os.path.join(self.directory, 'b')])
+        self.assertEqual(status, DIFFERENT)
+        self.assertEqual(self.output().decode('utf-8').splitlines(), [
+            'Only in {}: only.txt'.format(os.path.join(self.directory, 'a')),
+            'Files {} and {} differ'.format(
+                os.path.join(self.directory, 'a', 'sub', 'x.jsonl'),
+                os.path.join(self.directory, 'b', 'sub', 'x.jsonl'))])
+        self.assertEqual(len(sys.stderr.getvalue().splitlines()), 2)
+
+    def test_errors(self):
+        a = self.write('a.json', b'{')
+        b = self.write_json('b.json', {})
+        c = self.write_json('c.json', [1])
+        d = self.write_json('d.json', [2])
+        self.assertEqual(main([a, b, c, d]), ERROR)
+        self.assertIn(a, sys.stderr.getvalue())
+        self.assertIn(b'+++ ' + d.encode('utf-8'), self.output())
+
+    def test_forced_type(self):
+        a = self.write('a.txt', b'[1]')
+        b = self.write('b.txt', b'[2]')
+        self.assertEqual(main(['-q', '-t', 'json', a, b]), DIFFERENT)
+
+    def test_worker_pool(self):
+        paths = []
+        for i in range(4):
+            paths += [self.write_json('a{}.json'.format(i), [i]),
+                      self.write_json('b{}.json'.format(i), [i % 2])]
+        self.assertEqual(main(['-q', '-j', '2'] + paths), DIFFERENT)
+        self.assertEqual(len(self.output().splitlines()), 2)
+
+    def test_unpaired_paths(self):
+        self.assertRaises(SystemExit, main, ['a'])
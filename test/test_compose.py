@@ -0,0 +1,156 @@
+import random
+import unittest
+from collections import namedtuple, OrderedDict
+from diffr import diff, patch, compose
+from diffr.compose import rebuild
+from diffr.data_model import (
+    insert, remove, changed, unchanged, Diff, DiffItem, MappingDiffItem)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ComposeTests(unittest.TestCase):
+    def assertComposes(self, a, b, c):
+        composed = compose(diff(a, b), diff(b, c))
+        self.assertEqual(patch(a, composed), c)
+        return composed
+
+    def test_sequence(self):
+        self.assertComposes('abcdef', 'axcdyf', 'xcdyfz')
+        self.assertComposes([1, [1, 2], 3], [1, [1, 3], 3], [1, [4, 3], 3])
+        self.assertComposes((1, 2, 3), (4, 2, 3), (1, 2, 3, 4))
+
+    def test_sequence_contexts(self):
+        composed = compose(diff('abc', 'xbc'), diff('xbc', 'xbcd'))
+        self.assertEqual(composed, Diff(str, [
+            DiffItem(remove, 'a', (0, 1, 0, 0)),
+            DiffItem(insert, 'x', (1, 1, 0, 1)),
+            DiffItem(unchanged, 'b', (1, 2, 1, 2)),
+            DiffItem(unchanged, 'c', (2, 3, 2, 3)),
+            DiffItem(insert, 'd', (3, 3, 3, 4))]))
+
+    def test_insertion_removed_again_disappears(self):
+        composed = compose(diff('ab', 'axb'), diff('axb', 'ab'))
+        self.assertFalse(composed)
+        self.assertEqual(len(composed), 2)
+
+    def test_nested_changes_are_composed(self):
+        composed = self.assertComposes(
+            [0, [1, 2, 3]], [0, [1, 5, 3]], [0, [1, 5, 6]])
+        nested = composed[1].item
+        self.assertIs(composed[1].state, changed)
+        self.assertEqual(patch([1, 2, 3], nested), [1, 5, 6])
+
+    def test_nested_changes_that_cancel_out(self):
+        composed = self.assertComposes(
+            [0, [1, 2]], [0, [1, 3]], [0, [1, 2]])
+        self.assertEqual(
+            composed[1], DiffItem(unchanged, [1, 2], (1, 2, 1, 2)))
+
+    def test_changed_item_removed(self):
+        self.assertComposes([[1, 2], 0], [[1, 3], 0], [0])
+
+    def test_inserted_item_changed(self):
+        self.assertComposes(
+            {'a': 1}, {'a': 1, 'b': [1, 2]}, {'a': 1, 'b': [1, 3]})
+
+    def test_named_tuple(self):
+        Point = namedtuple('Point', ('x', 'y'))
+        self.assertComposes(Point(1, 2), Point(1, 3), Point(2, 3))
+
+    def test_mapping(self):
+        composed = self.assertComposes(
+            {'a': 1, 'b': {'x': 1}, 'c': 3},
+            {'a': 2, 'b': {'x': 2}, 'd': 4},
+            {'a': 3, 'b': {'x': 3}, 'd': 4, 'e': 5})
+        self.assertEqual(composed.get(['c']), (
+            MappingDiffItem(remove, 'c', remove, 3),))
+        self.assertEqual(composed.get(['e']), (
+            MappingDiffItem(insert, 'e', insert, 5),))
+
+    def test_mapping_value_restored(self):
+        composed = self.assertComposes({'a': 1}, {'a': 2}, {'a': 1})
+        self.assertEqual(
+            list(composed), [MappingDiffItem(unchanged, 'a', unchanged, 1)])
+
+    def test_ordered_mapping(self):
+        a = OrderedDict([('a', 1), ('b', [1, 2]), ('c', 3)])
+        b = OrderedDict([('b', [1, 3]), ('c', 3), ('a', 1)])
+        c = OrderedDict([('b', [4, 3]), ('a', 2), ('d', 1)])
+        self.assertComposes(a, b, c)
+
+    def test_set(self):
+        composed = self.assertComposes({1, 2, 3}, {2, 3, 4}, {1, 3, 5})
+        self.assertEqual(
+            sorted((di.state, di.item) for di in composed),
+            [(unchanged, 1), (unchanged, 3),
+             (insert, 5), (remove, 2)])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_ndarray(self):
+        a = numpy.zeros((3, 3))
+        b = a.copy()
+        b[0, 0], b[1, 1] = 1, 2
+        c = b.copy()
+        c[0, 0], c[2, 2] = 0, 5
+        composed = compose(diff(a, b), diff(b, c))
+        self.assertEqual(composed[0].positions(), [(1, 1), (2, 2)])
+        self.assertTrue((patch(a, composed) == c).all())
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_nested_ndarray_change_reverted(self):
+        a = {'x': numpy.arange(3)}
+        b = {'x': numpy.array([0, 5, 2])}
+        composed = compose(diff(a, b), diff(b, a))
+        self.assertFalse(composed)
+        self.assertEqual([di.state for di in composed], [unchanged])
+        self.assertTrue((patch(a, composed)['x'] == a['x']).all())
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_nested_ndarray_change_then_removal(self):
+        a = {'x': numpy.arange(3)}
+        b = {'x': numpy.array([0, 5, 2])}
+        composed = compose(diff(a, b), diff(b, {}))
+        self.assertEqual(composed[0].state, remove)
+        self.assertTrue((composed[0].value == a['x']).all())
+        self.assertEqual(patch(a, composed), {})
+
+    def test_bytes(self):
+        rng = random.Random(0)
+        a = bytes(bytearray(rng.randrange(256) for _ in range(20000)))
+        b = a[:100] + b'inserted' + a[100:]
+        c = b[:-300]
+        self.assertComposes(a, b, c)
+        self.assertComposes(bytearray(a), bytearray(b), bytearray(c))
+
+    def test_long_chain(self):
+        versions = [[i, i + 1, [i]] for i in range(20)]
+        composed = diff(versions[0], versions[1])
+        for before, after in zip(versions[1:], versions[2:]):
+            composed = compose(composed, diff(before, after))
+        self.assertEqual(patch(versions[0], composed), versions[-1])
+
+    def test_different_types(self):
+        self.assertRaises(TypeError, compose, diff('a', 'b'), diff([1], [2]))
+
+    def test_diffs_that_do_not_meet(self):
+        self.assertRaises(
+            ValueError, compose, diff('abc', 'ab'), diff('abc', 'ab'))
+        self.assertRaises(
+            ValueError, compose, diff({'a': 1}, {'b': 1}), diff({'a': 1}, {}))
+
+
+class RebuildTests(unittest.TestCase):
+    def test_rebuild_both_objects(self):
+        a = {'a': [1, 2, (3, 4)], 'b': 'xyz', 'c': {1, 2}}
+        b = {'a': [1, 2, (3, 5)], 'b': 'xz', 'd': {1}}
+        d = diff(a, b)
+        self.assertEqual(rebuild(d, remove), a)
+        self.assertEqual(rebuild(d, insert), b)
+
+    def test_rebuild_bytes(self):
+        d = diff(bytearray(b'abc'), bytearray(b'abd'))
+        self.assertEqual(rebuild(d, remove), bytearray(b'abc'))
+        self.assertEqual(rebuild(d, insert), bytearray(b'abd'))
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import subprocess
+import sys
+import unittest
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from diffr import diff, adiff
+
+
+class AdiffTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_adiff(self, a, b, **kwargs):
+        return self.loop.run_until_complete(adiff(a, b, **kwargs))
+
+    def assert_same_as_diff(self, a, b, **kwargs):
+        expected = diff(a, b)
+        d = self.run_adiff(a, b, **kwargs)
+        self.assertEqual(d, expected)
+        self.assertEqual(d.stats, expected.stats)
+        self.assertEqual(d.depth, expected.depth)
+
+    def test_sequences(self):
+        self.assert_same_as_diff([1, 2, 3, 4], [1, 3, 4, 5])
+        self.assert_same_as_diff('abcd', 'abxd')
+        self.assert_same_as_diff((), (1,))
+        self.assert_same_as_diff([], [])
+
+    def test_nested_sequences(self):
+        self.assert_same_as_diff(
+            [[1, 2], 'ab', {'a': [1]}, 0],
+            [[1, 3], 'ac', {'a': [2]}, 0])
+
+    def test_mappings(self):
+        self.assert_same_as_diff(
+            {'a': 1, 'b': [1, 2], 'c': {'x': 1}, 'd': 'abc', 'e': 1},
+            {'a': 1, 'b': [1, 3], 'c': {'x': 2}, 'd': 1, 'f': 2})
+
+    def test_ordered_mappings(self):
+        self.assert_same_as_diff(
+            OrderedDict([('a', 1), ('b', [1, 2]), ('c', 3), ('d', 'x')]),
+            OrderedDict([('b', [1, 3]), ('a', 1), ('e', 3), ('d', 1)]))
+
+    def test_other_types(self):
+        self.assert_same_as_diff({1, 2}, {2, 3})
+        self.assert_same_as_diff(b'abc' * 100, b'abd' * 100)
+        self.assert_same_as_diff([{1, 2}, b'ab'], [{1}, b'ac'])
+
+    def test_different_types(self):
+        with self.assertRaises(TypeError):
+            self.run_adiff([1], (1,))
+        with self.assertRaises(TypeError):
+            self.run_adiff(1, 2)
+
+    def test_yields_to_the_event_loop(self):
+        turns = []
+
+        def tick():
+            turns.append(None)
+            self.loop.call_soon(tick)
+
+        self.loop.call_soon(tick)
+        a = list(range(400))
+        b = [i for i in a if i % 7] + [-1] * 50
+        d = self.run_adiff(a, b, slice_ms=1)
+        self.assertEqual(d, diff(a, b))
+        self.assertGreater(len(turns), 1)
+
+    def test_yields_while_diffing_bytes(self):
+        turns = []
+
+        def tick():
+            turns.append(None)
+            self.loop.call_soon(tick)
+
+        self.loop.call_soon(tick)
+        a = b''.join(
+            hashlib.sha256(str(i).encode()).digest() for i in range(4096))
+        b = a[:1000] + b'xyz' + a[2000:]
+        d = self.run_adiff(a, b, slice_ms=1)
+        self.assertEqual(d, diff(a, b))
+        self.assertGreater(len(turns), 1)
+
+    def test_offload(self):
+        a = [{'a': i} for i in range(50)]
+        b = [{'a': i % 10} for i in range(50)]
+        with ThreadPoolExecutor(1) as executor:
+            self.assert_same_as_diff(a, b, executor=executor)
+            self.assert_same_as_diff(
+                [1], [2], executor=executor, offload_threshold=10)
+
+    def test_importing_diffr_does_not_import_asyncio(self):
+        script = 'import sys, diffr; print("asyncio" in sys.modules)'
+        output = subprocess.check_output([sys.executable, '-c', script])
+        self.assertEqual(output.strip(), b'False')
@@ -1,15 +1,43 @@
+import os
+import pickle
+import subprocess
 import sys
+import threading
 import unittest
 from collections import OrderedDict
+from decimal import Decimal
+from fractions import Fraction
+from io import StringIO
 from diffr.data_model import (
     term,
+    fingerprint,
+    value_digest,
     sequences_contain_same_items,
-    recursively_set_context_limit,
-    adjusted_context_limit,
     context_slice,
     diffs_are_equal,
-    Diff, DiffItem, MappingDiffItem)
+    style,
+    RenderOptions,
+    Diff, DiffView, DiffStats, DiffItem, MappingDiffItem)
 from diffr.diff import insert, remove, unchanged, changed, diff
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class StateTests(unittest.TestCase):
+    def test_states_are_distinct_ints(self):
+        states = (unchanged, insert, remove, changed)
+        self.assertTrue(all(isinstance(state, int) for state in states))
+        self.assertEqual(len(set(states)), 4)
+
+    def test_states_pickle_to_the_same_object(self):
+        for state in (unchanged, insert, remove, changed):
+            self.assertIs(pickle.loads(pickle.dumps(state)), state)
+
+    def test_calling_a_state_styles_a_string(self):
+        self.assertEqual(insert('a'), term.green('a'))
+        self.assertEqual(unchanged('a'), term.normal + 'a')
 
 
 class SequencesContainSameItemsTests(unittest.TestCase):
@@ -34,6 +62,32 @@ class SequencesContainSameItemsTests(unittest.TestCase):
         self.assertFalse(sequences_contain_same_items(a, b))
 
 
+    def test_unhashable_items_with_equal_fingerprints(self):
+        a = [[1], (1,), [1.0], {'a': [1]}]
+        b = [{'a': [1]}, [1.0], (1,), [1]]
+        self.assertTrue(sequences_contain_same_items(a, b))
+        self.assertFalse(sequences_contain_same_items(a, b[:-1] + [(1.0,)]))
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_hashable_values_are_their_own_fingerprint(self):
+        for value in (1, 'a', (1, 2), frozenset([1])):
+            self.assertIs(fingerprint(value), value)
+
+    def test_equal_values_have_equal_fingerprints(self):
+        pairs = [
+            ([1, {'a': [2]}], [1, {'a': [2]}]),
+            ({1, 2}, frozenset([1, 2])),
+            ({'a': 1, 'b': 2}, OrderedDict([('b', 2), ('a', 1)])),
+            (bytearray(b'ab'), b'ab'),
+        ]
+        for a, b in pairs:
+            self.assertEqual(fingerprint(a), fingerprint(b))
+
+    def test_fingerprint_is_hashable(self):
+        hash(fingerprint([{1: [set([2])]}, bytearray(b'a'), object()]))
+
+
 class DiffsAreEqualTests(unittest.TestCase):
     def test_sequence_diffs_are_equal(self):
         diff_a = diff([1, 2, 3], [2, 3, 4])
@@ -112,6 +166,173 @@ class DiffTests(unittest.TestCase):
         self.assertEqual(tuple(diff_items), d._diffs)
 
 
+class DiffViewTests(unittest.TestCase):
+    def setUp(self):
+        self.diff_obj = diff('abcdefgh', 'abxdeyfh')
+
+    def test_slice_is_a_view(self):
+        view = self.diff_obj[2:6]
+        self.assertIsInstance(view, DiffView)
+        self.assertIs(view._parent, self.diff_obj)
+        self.assertIs(view[0], self.diff_obj[2])
+        self.assertIs(view[-1], self.diff_obj[5])
+        self.assertRaises(IndexError, lambda: view[4])
+
+    def test_view_behaves_like_a_diff(self):
+        view = self.diff_obj[2:6]
+        copy = Diff(str, self.diff_obj._diffs[2:6])
+        self.assertEqual(len(view), len(copy))
+        self.assertEqual(list(view), list(copy))
+        self.assertIs(next(iter(view)), copy[0])
+        self.assertEqual(bool(view), bool(copy))
+        self.assertEqual(str(view), str(copy))
+        self.assertEqual(view, copy)
+        self.assertEqual(view.type, str)
+        self.assertFalse(self.diff_obj[:2])
+
+    def test_view_of_a_view(self):
+        view = self.diff_obj[1:7][1:3]
+        self.assertIs(view._parent, self.diff_obj)
+        self.assertEqual(list(view), list(self.diff_obj._diffs[2:4]))
+        self.assertEqual(len(self.diff_obj[5:2]), 0)
+
+    def test_stepped_slice_is_copied(self):
+        stepped = self.diff_obj[::2]
+        self.assertNotIsInstance(stepped, DiffView)
+        self.assertEqual(list(stepped), list(self.diff_obj._diffs[::2]))
+
+    def test_context_slices_are_views(self):
+        blocks = context_slice(self.diff_obj, 0)
+        self.assertTrue(all(isinstance(b, DiffView) for b in blocks))
+
+
+class DiffColumnsTests(unittest.TestCase):
+    def setUp(self):
+        self.diff_obj = diff('abcdef', 'abxdeyf')
+
+    def test_columns(self):
+        states, contexts, items = self.diff_obj.columns()
+        self.assertEqual(list(states), [di.state for di in self.diff_obj])
+        self.assertEqual(
+            list(contexts),
+            [i for di in self.diff_obj for i in di.context])
+        self.assertIs(items, self.diff_obj._diffs)
+
+    def test_items_without_context(self):
+        d = diff({1: 'a'}, {2: 'a'})
+        self.assertEqual(list(d.columns().contexts), [-1] * 8)
+
+    def test_indices(self):
+        self.assertEqual(self.diff_obj.indices(remove), [2])
+        self.assertEqual(self.diff_obj.indices(insert), [3, 6])
+        self.assertEqual(self.diff_obj.indices(changed), [])
+
+    def test_filters(self):
+        self.assertEqual(
+            self.diff_obj.inserts(),
+            [DiffItem(insert, 'x', (3, 3, 2, 3)),
+             DiffItem(insert, 'y', (5, 5, 5, 6))])
+        self.assertEqual(
+            self.diff_obj.removals(), [DiffItem(remove, 'c', (2, 3, 2, 2))])
+        d = diff([0, 'ab'], [0, 'ac'])
+        self.assertEqual(d.changed(), [d[1]])
+
+    def test_counts(self):
+        self.assertEqual(
+            self.diff_obj.counts(),
+            {unchanged: 5, insert: 2, remove: 1, changed: 0})
+        self.assertEqual(
+            Diff(list, []).counts(),
+            {unchanged: 0, insert: 0, remove: 0, changed: 0})
+
+
+class DiffStatsTests(unittest.TestCase):
+    def test_stats_are_aggregated_through_nested_diffs(self):
+        d = diff({'a': [0, [1, 2, 3], 4]}, {'a': [0, [1, 5, 3], 4]})
+        self.assertEqual(d.stats, DiffStats(
+            unchanged=4, inserted=1, removed=1, changed=2))
+        self.assertEqual(d.stats.edit_distance, 2)
+
+    def test_stats_of_a_hand_built_diff(self):
+        nested = Diff(list, [DiffItem(insert, 1), DiffItem(unchanged, 2)])
+        d = Diff(dict, [
+            MappingDiffItem(unchanged, 'a', changed, nested),
+            MappingDiffItem(remove, 'b', remove, 3)])
+        self.assertEqual(d.stats, DiffStats(1, 1, 1, 1))
+
+    def test_similarity(self):
+        self.assertEqual(diff('abcd', 'abxd').similarity, 0.75)
+        self.assertEqual(diff('ab', 'cd').similarity, 0.0)
+        self.assertEqual(diff('', '').similarity, 1.0)
+
+    def test_view_stats(self):
+        d = diff('abcdef', 'abxdeyf')
+        self.assertEqual(d[:2].stats, DiffStats(2, 0, 0, 0))
+        self.assertFalse(d[:2])
+        self.assertTrue(d[2:4])
+
+
+class DiffPathIndexTests(unittest.TestCase):
+    def setUp(self):
+        a = {'services': [{'env': {'PORT': 1}}, 'b', {'env': {'PORT': 80}}],
+             'version': 1, 'tags': {'a', 'b'}}
+        b = {'services': [{'env': {'PORT': 1}}, 'b', {'env': {'PORT': 81}}],
+             'version': 1, 'tags': {'a', 'c'}}
+        self.diff_obj = diff(a, b)
+
+    def test_get(self):
+        items = self.diff_obj.get(['services', 2, 'env', 'PORT'])
+        self.assertEqual(items, (
+            MappingDiffItem(unchanged, 'PORT', remove, 80),
+            MappingDiffItem(unchanged, 'PORT', insert, 81)))
+        self.assertEqual(
+            self.diff_obj.get(['version']),
+            (MappingDiffItem(unchanged, 'version', unchanged, 1),))
+        self.assertEqual(
+            self.diff_obj.get(['tags', 'c']), (DiffItem(insert, 'c'),))
+
+    def test_get_missing_path(self):
+        self.assertEqual(self.diff_obj.get(['missing']), ())
+        self.assertEqual(self.diff_obj.get(['version', 'missing']), ())
+
+    def test_sequence_removals_are_found_at_their_original_position(self):
+        d = diff('abc', 'bc')
+        self.assertEqual(d.get([0]), (
+            DiffItem(remove, 'a', (0, 1, 0, 0)),
+            DiffItem(unchanged, 'b', (1, 2, 0, 1))))
+        self.assertEqual(
+            d.get([1]), (DiffItem(unchanged, 'c', (2, 3, 1, 2)),))
+
+    def test_sequence_positions_on_either_side(self):
+        d = diff('xabc', 'xbcd')
+        removal = DiffItem(remove, 'a', (1, 2, 1, 1))
+        b = DiffItem(unchanged, 'b', (2, 3, 1, 2))
+        insertion = DiffItem(insert, 'd', (4, 4, 3, 4))
+        self.assertEqual(d.get([1]), (removal, b))
+        self.assertEqual(d.get([3]), (insertion,))
+        self.assertEqual(d.get([1], side='from'), (removal,))
+        self.assertEqual(d.get([2], side='from'), (b,))
+        self.assertEqual(d.get([4], side='from'), (insertion,))
+        self.assertEqual(
+            [path for path, _ in d.iter_changes(side='from')], [(1,), (4,)])
+        self.assertRaises(ValueError, d.get, [1], side='both')
+
+    def test_iter_changes(self):
+        self.assertEqual(
+            sorted(path for path, _ in self.diff_obj.iter_changes()),
+            [('services', 2, 'env', 'PORT'), ('services', 2, 'env', 'PORT'),
+             ('tags', 'b'), ('tags', 'c')])
+
+    def test_iter_changes_with_prefix(self):
+        self.assertEqual(
+            list(self.diff_obj.iter_changes(['tags', 'c'])),
+            [(('tags', 'c'), DiffItem(insert, 'c'))])
+        self.assertEqual(
+            [path for path, _ in self.diff_obj.iter_changes(['services'])],
+            [('services', 2, 'env', 'PORT')] * 2)
+        self.assertEqual(list(self.diff_obj.iter_changes(['version'])), [])
+
+
 class DiffDisplayTests(unittest.TestCase):
     def test_context_slice_empty_diff(self):
         d = diff(set(), set())
@@ -236,10 +457,7 @@ class DiffDisplayTests(unittest.TestCase):
             unchanged('{}('.format(type(set()).__name__)), actual_items[0])
         self.assertEqual(unchanged(')'), actual_items[-1])
         # strip off the type information at the top and bottom
-        if sys.version_info.major >= 3:
-            self.assertCountEqual(expected_diff_items, actual_items[1:-1])
-        else:
-            self.assertItemsEqual(expected_diff_items, actual_items[1:-1])
+        self.assertCountEqual(expected_diff_items, actual_items[1:-1])
 
     def test_empty_diff(self):
         set1 = set()
@@ -259,27 +477,38 @@ class DiffDisplayTests(unittest.TestCase):
             '@@ {}{},{} {}{},{} @@'.format(
                 remove('-'), remove('0'), remove('4'),
                 insert('+'), insert('0'), insert('4')),
-            ' {}{}{}{}{}{}'.format(
-                unchanged(' '), unchanged(' '), remove('-'), remove('-'),
-                insert('+'), insert('+')),
-            ' {}{}{}{}{}{}'.format(
-                unchanged('t'), unchanged('h'), remove('i'), remove('s'),
-                insert('a'), insert('t')),
+            ' {}{}{}'.format(unchanged('  '), remove('--'), insert('++')),
+            ' {}{}{}'.format(unchanged('th'), remove('is'), insert('at')),
             unchanged(')')
         ]
         self.assertEqual(str(d), '\n'.join(expected_str))
 
+    def test_string_diff_styles_runs(self):
+        d = diff('aaab', 'aaac')
+        terminal = RenderOptions(color=True).terminal
+
+        def styled(*strings):
+            return ' ' + ''.join(
+                style(state, string, terminal)
+                for state, string in zip((unchanged, remove, insert), strings))
+        lines = list(d.iter_lines(color=True))
+        self.assertEqual(
+            lines[2:4], [styled('   ', '-', '+'), styled('aaa', 'b', 'c')])
+        self.assertEqual(lines[3].count(style(remove, 'b', terminal)), 1)
+
     def test_string_diff_wraps_after_term_width(self):
+        # the width is None when the output isn't a terminal.
+        width = term.width or 80
         a = ''
-        b = 'a' * term.width
+        b = 'a' * width
         d = diff(a, b)
         expected_str = [
             unchanged('{!s}('.format(type(a).__name__)),
             '@@ {}{},{} {}{},{} @@'.format(
                 remove('-'), remove('0'), remove('0'),
-                insert('+'), insert('0'), insert('{}'.format(term.width))),
-            ' ' + ('{}'.format(insert('+')) * (term.width - 1)),
-            ' ' + ('{}'.format(insert('a')) * (term.width - 1)),
+                insert('+'), insert('0'), insert('{}'.format(width))),
+            ' ' + insert('+' * (width - 1)),
+            ' ' + insert('a' * (width - 1)),
             ' {}'.format(insert('+')),
             ' {}'.format(insert('a')),
             unchanged(')')
@@ -287,16 +516,18 @@ class DiffDisplayTests(unittest.TestCase):
         self.assertEqual(str(d), '\n'.join(expected_str))
 
     def test_string_is_term_width(self):
+        # the width is None when the output isn't a terminal.
+        width = term.width or 80
         a = ''
-        b = 'a' * (term.width - 1)
+        b = 'a' * (width - 1)
         d = diff(a, b)
         expected_str = [
             unchanged('{!s}('.format(type(a).__name__)),
             '@@ {}{},{} {}{},{} @@'.format(
                 remove('-'), remove('0'), remove('0'),
-                insert('+'), insert('0'), insert('{}'.format(term.width - 1))),
-            ' ' + ('{}'.format(insert('+')) * (term.width - 1)),
-            ' ' + ('{}'.format(insert('a')) * (term.width - 1)),
+                insert('+'), insert('0'), insert('{}'.format(width - 1))),
+            ' ' + insert('+' * (width - 1)),
+            ' ' + insert('a' * (width - 1)),
             unchanged(')')
         ]
         self.assertEqual(str(d), '\n'.join(expected_str))
@@ -393,29 +624,82 @@ class DiffFormattingTests(unittest.TestCase):
         self.assertEqual(format(self.diff_obj[3], '1c'), expected_display)
 
 
-class AdjustContextLimitTests(unittest.TestCase):
-    def test_recursively_setting_context(self):
-        a = [0, 0, {1: 'aa', 2: 2}]
-        b = [0, 0, {1: 'ab', 2: 2}]
-        d = diff(a, b)
-        self.assertEqual(d._context_limit, None)
-        self.assertEqual(d[2].item._context_limit, None)
-        self.assertEqual(d[2].item[0].value._context_limit, None)
-        recursively_set_context_limit(d, 0)
-        self.assertEqual(d._context_limit, 0)
-        self.assertEqual(d[2].item._context_limit, 0)
-        self.assertEqual(d[2].item[0].value._context_limit, 0)
-
-    def test_adjusted_context_limit(self):
-        # Yeah possibly unnecessary. check that a context manager behaves like
-        # a context manager, but no harm in more tests
-        a = '---a---'
-        b = '---b---'
-        d = diff(a, b)
-        self.assertEqual(d._context_limit, None)
-        with adjusted_context_limit(d, 2):
-            self.assertEqual(d._context_limit, 2)
-        self.assertEqual(d._context_limit, None)
+class DiffWriteTests(unittest.TestCase):
+    def setUp(self):
+        self.diff_obj = diff(
+            [0, 0, 0, {'a': [1, 2], 'b': 'xyz'}, 0, 0, 0, 1, 0],
+            [0, 0, 0, {'a': [1, 3], 'b': 'xaz'}, 0, 0, 0, 2, 0])
+
+    def test_iter_lines(self):
+        lines = list(self.diff_obj.iter_lines())
+        self.assertEqual('\n'.join(lines), str(self.diff_obj))
+        self.assertEqual(len(lines), str(self.diff_obj).count('\n') + 1)
+
+    def test_iter_lines_empty_diff(self):
+        self.assertEqual(
+            list(diff([], []).iter_lines()), [str(diff([], []))])
+
+    def test_iter_lines_context(self):
+        self.assertEqual(
+            '\n'.join(self.diff_obj.iter_lines(context=1)),
+            format(self.diff_obj, '1c'))
+
+    def test_write(self):
+        stream = StringIO()
+        self.diff_obj.write(stream, context=1)
+        self.assertEqual(
+            stream.getvalue(), format(self.diff_obj, '1c') + '\n')
+
+    def test_write_color(self):
+        previous = term._terminal
+        colored, plain = StringIO(), StringIO()
+        self.diff_obj.write(colored, color=True)
+        self.diff_obj.write(plain, color=False)
+        self.assertIn('\x1b[', colored.getvalue())
+        self.assertNotIn('\x1b[', plain.getvalue())
+        self.assertIs(term._terminal, previous)
+        self.assertEqual(
+            plain.getvalue(),
+            '\n'.join(self.diff_obj.iter_lines(color=False)) + '\n')
+
+    def test_iter_lines_color_is_per_render(self):
+        previous = term._terminal
+        colored = self.diff_obj.iter_lines(color=True)
+        plain = self.diff_obj.iter_lines(color=False)
+        for colored_line, plain_line in zip(colored, plain):
+            self.assertIs(term._terminal, previous)
+            self.assertNotIn('\x1b[', plain_line)
+        self.assertIn('\x1b[', colored_line)
+
+    def test_render_options(self):
+        self.assertEqual(RenderOptions(), (None, None, None))
+        self.assertIs(RenderOptions().terminal, term)
+        self.assertEqual(
+            RenderOptions(1, width=10)._replace(width=20), (1, None, 20))
+
+
+class ThreadedFormattingTests(unittest.TestCase):
+    def test_format_in_threads(self):
+        d = diff(
+            [0, 0, 0, {'a': '---a---', 'b': [1, 2]}, 0, 0, 0, 1, 0],
+            [0, 0, 0, {'a': '---x---', 'b': [1, 3]}, 0, 0, 0, 2, 0])
+        specs = ['', '0c', '1c', '3c']
+        expected = dict((spec, format(d, spec)) for spec in specs)
+        results = []
+
+        def render(spec):
+            for _ in range(50):
+                results.append((spec, format(d, spec)))
+
+        threads = [
+            threading.Thread(target=render, args=(spec,)) for spec in specs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 200)
+        for spec, result in results:
+            self.assertEqual(result, expected[spec])
 
 
 class DiffComparisonTests(unittest.TestCase):
@@ -445,6 +729,157 @@ class DiffComparisonTests(unittest.TestCase):
         self.expected_diff._diffs = []
         self.assertNotEqual(self.base_diff, self.expected_diff)
 
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_diffs_holding_ndarrays(self):
+        self.assertEqual(
+            diff({}, {'x': numpy.zeros(3)}), diff({}, {'x': numpy.zeros(3)}))
+        self.assertNotEqual(
+            diff({}, {'x': numpy.zeros(3)}), diff({}, {'x': numpy.ones(3)}))
+        self.assertEqual(
+            diff([numpy.zeros(3)], []), diff([numpy.zeros(3)], []))
+        self.assertNotEqual(
+            diff([numpy.zeros(3)], []), diff([numpy.zeros(2)], []))
+
+
+class DiffHashTests(unittest.TestCase):
+    def test_equal_diffs_have_equal_hashes(self):
+        a = {1: [1, 2], 2: {'a', 'b'}, 3: 'x', 4: 'y'}
+        b = {1: [1, 3], 2: {'a'}, 3: 'z', 5: 'y'}
+        d1 = diff(a, b)
+        d2 = diff(dict(reversed(list(a.items()))), b)
+        self.assertEqual(d1, d2)
+        self.assertEqual(hash(d1), hash(d2))
+        self.assertEqual(len(set([d1, d2])), 1)
+
+    def test_diff_items_are_hashable(self):
+        self.assertEqual(
+            hash(DiffItem(insert, [1], (0, 0, 0, 1))),
+            hash(DiffItem(insert, [1], (0, 0, 0, 1))))
+        self.assertEqual(
+            hash(MappingDiffItem(unchanged, 'a', insert, {1: 2})),
+            hash(MappingDiffItem(unchanged, 'a', insert, {1: 2})))
+
+
+class DiffPickleTests(unittest.TestCase):
+    def assertPickles(self, diff_obj):
+        loaded = pickle.loads(pickle.dumps(diff_obj, -1))
+        self.assertEqual(loaded, diff_obj)
+        self.assertIs(loaded.type, diff_obj.type)
+        self.assertEqual(loaded.stats, diff_obj.stats)
+        self.assertEqual(list(loaded), list(diff_obj))
+        return loaded
+
+    def test_nested_diff(self):
+        a = {1: [1, 2], 2: {'a', 'b'}, 3: 'x', 4: OrderedDict([(1, 2)])}
+        b = {1: [1, 3], 2: {'a'}, 3: 'z', 4: OrderedDict([(1, 3)])}
+        loaded = self.assertPickles(diff(a, b))
+        self.assertEqual(
+            [di.context for di in loaded[1].value],
+            [di.context for di in diff(a, b)[1].value])
+
+    def test_bytes_diff(self):
+        a = bytes(bytearray(range(256))) * 40
+        self.assertPickles(diff(a, a[:100] + b'xyz' + a[300:]))
+
+    def test_caches_are_not_pickled(self):
+        d = diff('abc' * 10, 'abd' * 10)
+        fresh = pickle.dumps(d, -1)
+        format(d, '1c')
+        d.digest()
+        d.get([2])
+        self.assertEqual(pickle.dumps(d, -1), fresh)
+
+    def test_view_pickles_as_diff(self):
+        d = diff([1, 2, 3, 4], [1, 5, 3, 4])
+        loaded = self.assertPickles(d[1:3])
+        self.assertIs(type(loaded), Diff)
+
+
+class DiffDigestTests(unittest.TestCase):
+    def setUp(self):
+        self.a = {1: [1, 2], 2: {'a', 'b'}, 3: 'x', 4: (1.5, None)}
+        self.b = {1: [1, 3], 2: {'a'}, 3: 'z', 5: (1.5, None)}
+
+    def test_equal_diffs_have_equal_digests(self):
+        d1 = diff(self.a, self.b)
+        d2 = diff(dict(reversed(list(self.a.items()))), self.b)
+        self.assertEqual(d1.digest(), d2.digest())
+
+    def test_different_diffs_have_different_digests(self):
+        d1 = diff(self.a, self.b)
+        d2 = diff(self.b, self.a)
+        self.assertNotEqual(d1.digest(), d2.digest())
+        self.assertNotEqual(
+            diff([1, 2], [2, 1]).digest(), diff((1, 2), (2, 1)).digest())
+
+    def test_digest_covers_contexts(self):
+        d1 = Diff(str, [DiffItem(insert, 'a', (0, 0, 0, 1))])
+        d2 = Diff(str, [DiffItem(insert, 'a', (1, 1, 0, 1))])
+        self.assertNotEqual(d1.digest(), d2.digest())
+        self.assertNotEqual(d1, d2)
+
+    def test_equal_values_have_equal_digests(self):
+        self.assertEqual(value_digest(1), value_digest(1.0))
+        self.assertEqual(value_digest({1, 2}), value_digest(frozenset([2, 1])))
+        self.assertEqual(value_digest(bytearray(b'a')), value_digest(b'a'))
+        self.assertNotEqual(value_digest([1]), value_digest((1,)))
+        self.assertNotEqual(value_digest('ab'), value_digest(['a', 'b']))
+
+    def test_numbers_dont_collide(self):
+        # hash(-1) == hash(-2) and ints hash modulo 2 ** 61 - 1.
+        self.assertNotEqual(value_digest(-1), value_digest(-2))
+        self.assertNotEqual(value_digest(2 ** 61), value_digest(1))
+        self.assertNotEqual(value_digest(2 ** 61 + 4), value_digest(5))
+        self.assertNotEqual(value_digest(2.0 ** 62), value_digest(2))
+        self.assertNotEqual(value_digest(0.5), value_digest(0.5 + 1e-16))
+        self.assertNotEqual(
+            diff([-1], [-2]).digest(), diff([-2], [-1]).digest())
+
+    def test_equal_numbers_of_different_types(self):
+        for a, b in [
+                (2 ** 64, float(2 ** 64)), (True, 1), (0.5, Fraction(1, 2)),
+                (Fraction(1, 10), Decimal('0.1')), (complex(2, 0), 2)]:
+            self.assertEqual(a, b)
+            self.assertEqual(value_digest(a), value_digest(b))
+
+    def test_int_like_values(self):
+        class Index(object):
+            def __init__(self, value):
+                self.value = value
+
+            def __index__(self):
+                return self.value
+
+            def __eq__(self, other):
+                return self.value == other
+
+            def __hash__(self):
+                return hash(self.value)
+
+        self.assertEqual(value_digest(Index(5)), value_digest(5))
+        self.assertNotEqual(value_digest(Index(5)), value_digest(6))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_numpy_scalars(self):
+        for a, b in [
+                (numpy.True_, True), (numpy.False_, 0), (numpy.int8(3), 3),
+                (numpy.float32(0.5), 0.5)]:
+            self.assertEqual(value_digest(a), value_digest(b))
+        self.assertEqual(
+            diff([True, 2], [True, 3]),
+            diff([numpy.True_, 2], [numpy.True_, 3]))
+
+    def test_digest_is_stable_between_processes(self):
+        script = (
+            'from diffr import diff;'
+            'print(diff({}, {}).digest())'.format(self.a, self.b))
+        digests = set()
+        for seed in ('1', '2'):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            digests.add(subprocess.check_output(
+                [sys.executable, '-c', script], env=env))
+        self.assertEqual(len(digests), 1)
+
 
 class DiffItemTests(unittest.TestCase):
     def setUp(self):
@@ -477,6 +912,9 @@ class DiffItemTests(unittest.TestCase):
         self.assertRaises(
             ValueError, format, diff_item, '1c')
 
+    def test_diff_items_have_no_instance_dict(self):
+        self.assertFalse(hasattr(self.base_diff_item, '__dict__'))
+
 
 class MappingDiffItemTests(unittest.TestCase):
     def setUp(self):
@@ -520,6 +958,15 @@ class MappingDiffItemTests(unittest.TestCase):
         self.assertRaises(
             ValueError, format, diff_item, '1c')
 
+    def test_item_is_key_value_pair(self):
+        self.assertEqual(self.base_diff_item.item, ('a', 1))
+        self.assertFalse(hasattr(self.base_diff_item, '__dict__'))
+
+    def test_is_a_diff_item(self):
+        self.assertIsInstance(self.base_diff_item, DiffItem)
+        self.assertEqual(
+            MappingDiffItem.__slots__, ('key_state', 'key', 'value'))
+
     def test_dont_use_context_format_specifier(self):
         d = diff('--a--', '--b--')
         diff_item = MappingDiffItem(unchanged, 1, changed, d)
@@ -1,12 +1,20 @@
+import random
+import threading
 import unittest
 from collections import OrderedDict, namedtuple, deque
-from diffr.data_model import Diff, DiffItem, MappingDiffItem
+from diffr.data_model import Diff, DiffItem, MappingDiffItem, ArrayDiffItem
 from diffr.patch import patch
 from diffr.diff import (
-    _backtrack, _build_lcs_matrix,
+    _backtrack, _build_lcs_matrix, _as_byte_buffer, _vectorised_blocks,
+    _looped_blocks, _differ_for,
     Chunk, chunker, diff_item_data_factory,
     insert, remove, changed, unchanged,
-    diff, diff_sequence, diff_mapping, diff_set, diff_ordered_mapping)
+    diff, diff_sequence, diff_mapping, diff_set, diff_ordered_mapping,
+    diff_ndarray, diff_bytes, values_are_equal, DiffCancelled)
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class ChunkTests(unittest.TestCase):
@@ -632,6 +640,278 @@ class DiffOrderedMapping(unittest.TestCase):
         self.assertEqual(patch(d1, diff_obj), d2)
 
 
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class DiffNdarrayTests(unittest.TestCase):
+    def test_no_differences(self):
+        a = numpy.arange(6)
+        diff_obj = diff_ndarray(a, a.copy())
+        self.assertEqual(diff_obj, Diff(numpy.ndarray, []))
+        self.assertFalse(diff_obj)
+
+    def test_single_array_diff_item(self):
+        a = numpy.array([1.0, 2.0, 3.0, 4.0])
+        b = numpy.array([1.0, 5.0, 3.0, 6.0])
+        diff_obj = diff_ndarray(a, b)
+        expected_diff = Diff(
+            numpy.ndarray,
+            [ArrayDiffItem(
+                (4,), numpy.array([1, 3]),
+                numpy.array([2.0, 4.0]), numpy.array([5.0, 6.0]))])
+        self.assertEqual(diff_obj, expected_diff)
+        self.assertEqual(diff_obj[0].positions(), [1, 3])
+
+    def test_multidimensional_positions(self):
+        a = numpy.zeros((2, 3))
+        b = a.copy()
+        b[1, 2] = 1
+        diff_obj = diff_ndarray(a, b)
+        self.assertEqual(diff_obj[0].positions(), [(1, 2)])
+        self.assertTrue(numpy.array_equal(patch(a, diff_obj), b))
+
+    def test_tolerance(self):
+        a = numpy.array([1.0, 2.0, 3.0])
+        b = numpy.array([1.0001, 2.5, 3.0])
+        diff_obj = diff_ndarray(a, b, tolerance=0.01)
+        self.assertEqual(diff_obj[0].indices.tolist(), [1])
+
+    def test_nans_in_same_position_are_unchanged(self):
+        a = numpy.array([numpy.nan, 1.0])
+        b = numpy.array([numpy.nan, 2.0])
+        self.assertEqual(diff_ndarray(a, b)[0].indices.tolist(), [1])
+
+    def test_tolerance_doesnt_hide_nans(self):
+        a = numpy.array([numpy.nan, numpy.nan, 1.0])
+        b = numpy.array([1.0, numpy.nan, numpy.nan])
+        diff_obj = diff_ndarray(a, b, tolerance=0.5)
+        self.assertEqual(diff_obj[0].indices.tolist(), [0, 2])
+
+    def test_tolerance_at_any_depth(self):
+        a = {'x': [numpy.arange(3.0), 'a'], 'y': numpy.zeros(2)}
+        b = {'x': [numpy.arange(3.0) + 0.001, 'a'], 'y': numpy.ones(2)}
+        diff_obj = diff(a, b, tolerance=0.01)
+        self.assertEqual(tuple(diff_obj.stats), (1, 2, 2, 2))
+        states = dict((di.key, di.state) for di in diff_obj)
+        self.assertEqual(states, {'x': unchanged, 'y': changed})
+
+    def test_change_of_dtype(self):
+        a = numpy.arange(3)
+        b = numpy.array([0, 1.5, 2])
+        patched = patch(a, diff(a, b))
+        self.assertEqual(patched.dtype, b.dtype)
+        self.assertTrue(numpy.array_equal(patched, b))
+        diff_obj = diff(a, a.astype(float))
+        self.assertTrue(diff_obj)
+        self.assertEqual(diff_obj[0].indices.tolist(), [])
+        self.assertEqual(patch(a, diff_obj).dtype, float)
+
+    def test_arrays_nested_in_sequences(self):
+        a = [numpy.arange(3), [numpy.arange(2)], 'a']
+        b = [numpy.arange(3), [numpy.arange(2)], 'b', 'c']
+        diff_obj = diff(a, b)
+        self.assertEqual(
+            [di.state for di in diff_obj],
+            [unchanged, unchanged, remove, insert, insert])
+        patched = patch(a, diff_obj)
+        self.assertEqual(patched[2:], ['b', 'c'])
+        self.assertTrue(values_are_equal(patched, b))
+        self.assertFalse(values_are_equal(a, b))
+
+    def test_different_shapes_not_diffable(self):
+        self.assertRaises(
+            TypeError, diff_ndarray, numpy.zeros(2), numpy.zeros(3))
+
+    def test_arrays_nested_in_mapping(self):
+        a = {'x': numpy.arange(3), 'y': numpy.arange(3)}
+        b = {'x': numpy.arange(3), 'y': numpy.array([0, 1, 5])}
+        diff_obj = diff(a, b)
+        states = dict((di.key, di.state) for di in diff_obj)
+        self.assertEqual(states, {'x': unchanged, 'y': changed})
+        patched = patch(a, diff_obj)
+        self.assertTrue(numpy.array_equal(patched['y'], b['y']))
+
+
+class DiffBytesTests(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.data = bytes(bytearray(rng.randrange(256) for _ in range(65536)))
+
+    def test_no_differences(self):
+        diff_obj = diff_bytes(self.data, bytes(self.data))
+        self.assertEqual(
+            diff_obj,
+            Diff(bytes, [
+                DiffItem(unchanged, self.data, (0, 65536, 0, 65536))]))
+        self.assertFalse(diff_obj)
+
+    def test_small_objects_are_a_single_block(self):
+        diff_obj = diff_bytes(b'abc', b'abd')
+        expected_diff = Diff(bytes, [
+            DiffItem(remove, b'abc', (0, 3, 0, 0)),
+            DiffItem(insert, b'abd', (3, 3, 0, 3))])
+        self.assertEqual(diff_obj, expected_diff)
+
+    def test_insertion_only_disturbs_nearby_blocks(self):
+        b = self.data[:30000] + b'inserted' + self.data[30000:]
+        diff_obj = diff_bytes(self.data, b)
+        inserted = sum(len(di.item) for di in diff_obj if di.state is insert)
+        removed = sum(len(di.item) for di in diff_obj if di.state is remove)
+        self.assertLess(inserted, 4096 * 8)
+        self.assertEqual(inserted - removed, len(b'inserted'))
+        self.assertEqual(patch(self.data, diff_obj), b)
+
+    def test_removal_and_replacement(self):
+        b = self.data[:10000] + self.data[20000:50000] + b'x' * 5000
+        diff_obj = diff(self.data, b)
+        self.assertEqual(patch(self.data, diff_obj), b)
+
+    def test_contexts_are_contiguous(self):
+        b = self.data[5000:] + self.data[:5000]
+        diff_obj = diff_bytes(self.data, b)
+        f = t = 0
+        for diff_item in diff_obj:
+            f_s, f_e, t_s, t_e = diff_item.context
+            self.assertEqual((f_s, t_s), (f, t))
+            f, t = f_e, t_e
+        self.assertEqual((f, t), (len(self.data), len(b)))
+
+    def test_copied_blocks_render_as_bytes(self):
+        diff_obj = diff_bytes(self.data, self.data[:-1])
+        self.assertIsInstance(diff_obj[0].item, bytes)
+        self.assertNotIn('<memory', str(diff_obj))
+        self.assertIn(repr(self.data[:10])[:-1], str(diff_obj))
+
+    def test_diff_does_not_hold_on_to_the_objects(self):
+        a = bytearray(self.data)
+        b = bytearray(self.data[:-100])
+        diff_obj = diff(a, b)
+        digest = diff_obj.digest()
+        a.extend(b'1')
+        a[:10] = b'x' * 10
+        self.assertEqual(diff_obj.digest(), digest)
+        self.assertEqual(
+            diff_obj,
+            diff(bytearray(self.data), bytearray(self.data[:-100])))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_vectorised_blocks_are_the_same(self):
+        data = _as_byte_buffer(self.data + b'\0' * 3000 + b'ab' * 5000)
+        for block_size, window in [(4096, 1 << 18), (256, 1000), (4, 7)]:
+            min_size = max(1, block_size // 4)
+            mask = (block_size - 1) << (32 - block_size.bit_length() + 1)
+            args = (data, min_size, block_size * 8, mask)
+            self.assertEqual(
+                list(_vectorised_blocks(*(args + (numpy, window)))),
+                list(_looped_blocks(*args)))
+
+    def test_bytearray_and_memoryview(self):
+        a = bytearray(self.data)
+        b = bytearray(self.data[100:])
+        self.assertEqual(patch(a, diff(a, b)), b)
+        a = memoryview(self.data)
+        b = memoryview(self.data[:-100])
+        self.assertEqual(patch(a, diff(a, b)), b)
+
+
+class DiffStatsTests(unittest.TestCase):
+    def assertStatsMatchItems(self, diff_obj):
+        recorded = diff_obj.stats
+        diff_obj._stats = None
+        self.assertEqual(recorded, diff_obj.stats)
+        return recorded
+
+    def test_sequence(self):
+        stats = self.assertStatsMatchItems(
+            diff([1, 'ab', 3, 4], [1, 'ac', 3, 5]))
+        self.assertEqual(tuple(stats), (3, 2, 2, 1))
+
+    def test_set(self):
+        stats = self.assertStatsMatchItems(diff({1, 2, 3}, {2, 3, 4, 5}))
+        self.assertEqual(tuple(stats), (2, 2, 1, 0))
+
+    def test_mappings(self):
+        a = {'a': [1, 2], 'b': 1, 'c': 2}
+        b = {'a': [1, 3], 'b': 'x', 'd': 2}
+        stats = self.assertStatsMatchItems(diff(a, b))
+        self.assertEqual(tuple(stats), (1, 3, 3, 1))
+        a = OrderedDict(sorted(a.items()))
+        b = OrderedDict(sorted(b.items()))
+        self.assertEqual(self.assertStatsMatchItems(diff(a, b)), stats)
+
+    def test_bytes_are_counted_in_bytes(self):
+        stats = self.assertStatsMatchItems(diff(b'abc', b'abcd'))
+        self.assertEqual(tuple(stats), (0, 4, 3, 0))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_ndarray(self):
+        a = numpy.zeros((3, 4))
+        stats = self.assertStatsMatchItems(diff(a, numpy.eye(3, 4)))
+        self.assertEqual(tuple(stats), (9, 3, 3, 1))
+        self.assertEqual(tuple(diff(a, a).stats), (12, 0, 0, 0))
+
+
+class DiffHooksTests(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def progress(self, *args):
+        self.calls.append(args)
+
+    def test_same_diff_with_hooks(self):
+        a = [[1, 2], {'a': 1, 'b': [1]}, OrderedDict([('x', 1)]), {1}, 0]
+        b = [[1, 3], {'a': 2, 'b': [2]}, OrderedDict([('x', 2)]), {2}, 0]
+        self.assertEqual(
+            diff(a, b, progress=self.progress, cancel=threading.Event()),
+            diff(a, b))
+
+    def test_sequence_progress(self):
+        diff([1, 2, 3], [1, 4, 3], progress=self.progress)
+        self.assertEqual(self.calls, [
+            ('lcs', 3, 9, 0), ('lcs', 6, 9, 0), ('lcs', 9, 9, 0),
+            ('backtrack', 6, 6, 0),
+            ('items', 0, 6, 0), ('items', 2, 6, 0), ('items', 6, 6, 0)])
+
+    def test_nested_progress(self):
+        diff([{'a': 1, 'b': 2}], [{'a': 1, 'b': 3}], progress=self.progress)
+        nested = [call for call in self.calls if call[3] == 1]
+        self.assertEqual(nested, [
+            ('items', 0, 2, 1), ('items', 1, 2, 1), ('items', 2, 2, 1)])
+
+    def test_ordered_mapping_progress(self):
+        diff(
+            OrderedDict([('a', 1), ('b', 2)]), OrderedDict([('b', 2)]),
+            progress=self.progress)
+        self.assertEqual(
+            [call for call in self.calls if call[0] == 'items'],
+            [('items', 0, 3, 0), ('items', 1, 3, 0), ('items', 3, 3, 0)])
+
+    def test_bytes_progress(self):
+        a = bytes(range(256)) * 64
+        diff(a, a[:100] + a[200:], progress=self.progress)
+        total = len(a) * 2 - 100
+        self.assertEqual({call[0] for call in self.calls}, {'blocks'})
+        self.assertEqual(self.calls[-1], ('blocks', total, total, 0))
+
+    def test_cancel_before_start(self):
+        cancel = threading.Event()
+        cancel.set()
+        for a, b in [([1], [2]), ({1}, {2}), ({'a': 1}, {'a': 2})]:
+            self.assertRaises(DiffCancelled, diff, a, b, cancel=cancel)
+
+    def test_cancel_during_diff(self):
+        cancel = threading.Event()
+
+        def progress(phase, done, total, depth):
+            self.calls.append(phase)
+            if done >= 100:
+                cancel.set()
+
+        self.assertRaises(
+            DiffCancelled, diff, list(range(200)), list(range(100, 300)),
+            progress=progress, cancel=cancel)
+        self.assertEqual(set(self.calls), {'lcs'})
+        self.assertLess(len(self.calls), 200)
+
+
 class DiffFunctionTests(unittest.TestCase):
     '''
     Many of the built in types have been tested extensively at the lower
@@ -755,3 +1035,10 @@ class DiffFunctionTests(unittest.TestCase):
         expected_diff = Diff(str, diffs)
         self.assertEqual(diff_obj, expected_diff)
         self.assertEqual(patch(d1, diff_obj), d2)
+
+    def test_differ_cache_is_bounded(self):
+        for i in range(_differ_for.cache_info().maxsize + 10):
+            Point = namedtuple('Point{}'.format(i), ['x'])
+            diff(Point(i), Point(i + 1))
+        info = _differ_for.cache_info()
+        self.assertEqual(info.currsize, info.maxsize)
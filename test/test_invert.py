@@ -0,0 +1,94 @@
+import random
+import unittest
+from collections import namedtuple, OrderedDict
+from diffr import diff, patch, invert
+from diffr.data_model import (
+    insert, remove, changed, unchanged, Diff, DiffItem, MappingDiffItem)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class InvertTests(unittest.TestCase):
+    def assertInverts(self, a, b):
+        forward = diff(a, b)
+        backward = invert(forward)
+        self.assertEqual(patch(b, backward), a)
+        self.assertEqual(invert(backward), forward)
+        return backward
+
+    def test_sequence(self):
+        backward = self.assertInverts('abcd', 'axcdy')
+        self.assertEqual(backward, diff('axcdy', 'abcd'))
+        self.assertEqual(list(backward), [
+            DiffItem(unchanged, 'a', (0, 1, 0, 1)),
+            DiffItem(remove, 'x', (1, 2, 1, 1)),
+            DiffItem(insert, 'b', (2, 2, 1, 2)),
+            DiffItem(unchanged, 'c', (2, 3, 2, 3)),
+            DiffItem(unchanged, 'd', (3, 4, 3, 4)),
+            DiffItem(remove, 'y', (4, 5, 4, 4))])
+
+    def test_nested(self):
+        backward = self.assertInverts(
+            [1, {'a': [1, 2]}, 3], [1, {'a': [1, 3], 'b': 2}, 3])
+        self.assertIs(backward[1].state, changed)
+        self.assertEqual(
+            backward[1].item, diff({'a': [1, 3], 'b': 2}, {'a': [1, 2]}))
+
+    def test_named_tuple(self):
+        Point = namedtuple('Point', ('x', 'y'))
+        self.assertInverts(Point(1, 2), Point(2, 3))
+
+    def test_mapping(self):
+        backward = self.assertInverts(
+            {'a': 1, 'b': 2, 'c': 'x'}, {'a': 1, 'c': ['x'], 'd': 4})
+        self.assertEqual(
+            backward, diff({'a': 1, 'c': ['x'], 'd': 4},
+                           {'a': 1, 'b': 2, 'c': 'x'}))
+
+    def test_ordered_mapping(self):
+        a = OrderedDict([('a', 1), ('b', 'x'), ('c', 3)])
+        b = OrderedDict([('b', ['x']), ('c', 3), ('a', 1), ('d', 4)])
+        backward = self.assertInverts(a, b)
+        self.assertEqual(list(backward)[1:3], [
+            MappingDiffItem(unchanged, 'b', remove, ['x']),
+            MappingDiffItem(unchanged, 'b', insert, 'x')])
+
+    def test_set(self):
+        backward = self.assertInverts({1, 2, 3}, {2, 3, 4})
+        self.assertEqual(backward, diff({2, 3, 4}, {1, 2, 3}))
+
+    def test_stats_are_swapped(self):
+        forward = diff('abc', 'abxyz')
+        self.assertEqual(
+            tuple(invert(forward).stats), (2, 1, 3, 0))
+
+    def test_bytes(self):
+        rng = random.Random(0)
+        a = bytes(bytearray(rng.randrange(256) for _ in range(20000)))
+        b = a[:100] + b'inserted' + a[5000:]
+        backward = self.assertInverts(a, b)
+        self.assertInverts(bytearray(a), bytearray(b))
+        self.assertEqual(
+            sum(len(di.item) for di in backward if di.state is insert),
+            sum(len(di.item) for di in diff(a, b) if di.state is remove))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_ndarray(self):
+        a = numpy.arange(6).reshape(2, 3)
+        b = a.copy()
+        b[1, 1] = 10
+        backward = invert(diff(a, b))
+        self.assertEqual(backward[0].from_values.tolist(), [10])
+        self.assertEqual(backward[0].to_values.tolist(), [4])
+        self.assertTrue((patch(b, backward) == a).all())
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_ndarray_shape_change_in_mapping(self):
+        a = {'x': numpy.zeros(3)}
+        b = {'x': numpy.zeros((2, 2))}
+        self.assertEqual(patch(b, invert(diff(a, b)))['x'].shape, (3,))
+
+    def test_empty_diff(self):
+        self.assertEqual(invert(Diff(list, [])), Diff(list, []))
@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from diffr import diff, patch, diff_json_files, diff_jsonl_files
+from diffr.data_model import unchanged
+from diffr.json_files import JsonValue
+
+
+class FilesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with io.open(path, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+        return path
+
+
+class DiffJsonFilesTests(FilesTestCase):
+    def diff_documents(self, a, b, **kwargs):
+        return diff_json_files(
+            self.write('a.json', json.dumps(a, **kwargs)),
+            self.write('b.json', json.dumps(b, **kwargs)))
+
+    def assertDiffsLike(self, a, b, **kwargs):
+        lazy = self.diff_documents(a, b, **kwargs)
+        loaded = diff_json_files(
+            os.path.join(self.directory, 'a.json'),
+            os.path.join(self.directory, 'b.json'), lazy=False)
+        self.assertEqual(loaded, diff(a, b))
+        self.assertEqual(lazy, diff(a, b))
+        self.assertEqual(lazy.stats, diff(a, b).stats)
+        self.assertEqual(patch(a, lazy), b)
+        return lazy
+
+    def test_objects(self):
+        self.assertDiffsLike(
+            {'a': 1, 'b': {'c': [1, 2, 3], 'd': 'text'}, 'e': None},
+            {'a': 1, 'b': {'c': [1, 3], 'd': 'test'}, 'f': True})
+
+    def test_arrays(self):
+        self.assertDiffsLike(
+            [1, {'a': [1, 2]}, 'x', [True, None]],
+            [1, {'a': [1, 3]}, 'y', [True, None]], indent=2)
+        self.assertDiffsLike([[1], 2, 3], [2, 3, 4, [5]])
+        self.assertDiffsLike([], [{}])
+
+    def test_strings_and_escapes(self):
+        self.assertDiffsLike(
+            {'k"\\ey': 'a]b}c{', u'\xe9': ['"[', 'x']},
+            {'k"\\ey': 'a]b}c', u'\xe9': ['"[', 'y']})
+
+    def test_replaced_values(self):
+        self.assertDiffsLike(
+            {'a': [1], 'b': 1, 'c': 'x'}, {'a': {'1': 1}, 'b': 2.5, 'c': 1})
+
+    def test_top_level_values(self):
+        self.assertEqual(self.diff_documents('abc', 'abd'), diff('abc', 'abd'))
+        self.assertRaises(TypeError, self.diff_documents, 1, 2)
+        self.assertRaises(TypeError, self.diff_documents, [1], {})
+
+    def test_unchanged_values_are_lazy(self):
+        d = self.diff_documents(
+            {'a': {'big': list(range(100))}, 'b': 1},
+            {'a': {'big': list(range(100))}, 'b': 2})
+        item = [di for di in d if di.state == unchanged][0]
+        self.assertIsInstance(item.value, JsonValue)
+        self.assertEqual(item.value, {'big': list(range(100))})
+        self.assertEqual(item.value.load(), {'big': list(range(100))})
+        self.assertEqual(
+            pickle.loads(pickle.dumps(d)),
+            diff({'a': {'big': list(range(100))}, 'b': 1},
+                 {'a': {'big': list(range(100))}, 'b': 2}))
+
+    def test_formatting_differences(self):
+        a = {'a': {'x': [1, 2]}, 'b': [1, {'y': 2}]}
+        d = diff_json_files(
+            self.write('a.json', json.dumps(a)),
+            self.write('b.json', json.dumps(a, indent=4)), lazy=False)
+        self.assertFalse(d)
+        self.assertEqual(d, diff(a, a))
+
+    def test_duplicate_keys(self):
+        d = diff_json_files(
+            self.write('a.json', '{"a": 1, "a": 2}'),
+            self.write('b.json', '{"a": 2}'))
+        self.assertFalse(d)
+
+    def test_invalid_documents(self):
+        good = self.write('good.json', '{"a": [1]}')
+        for text in ('', '{"a" 1}', '{"a": [1}', '[1 2]', '{"a": 1} x'):
+            self.assertRaises(
+                ValueError, diff_json_files, good, self.write('bad', text))
+
+
+class DiffJsonlFilesTests(FilesTestCase):
+    def write_lines(self, name, values, blank_lines=False):
+        separator = '\n\n' if blank_lines else '\n'
+        return self.write(
+            name, separator.join(json.dumps(v) for v in values) + '\n')
+
+    def test_lines(self):
+        a = [{'id': 1, 'v': [1, 2]}, {'id': 2}, 'x', 3]
+        b = [{'id': 1, 'v': [1, 3]}, {'id': 2}, 3, {'id': 4}]
+        d = diff_jsonl_files(
+            self.write_lines('a.jsonl', a),
+            self.write_lines('b.jsonl', b, blank_lines=True), lazy=False)
+        self.assertEqual(d, diff(a, b))
+        self.assertEqual(
+            patch(a, diff_jsonl_files(
+                self.write_lines('a.jsonl', a),
+                self.write_lines('b.jsonl', b))), b)
+
+    def test_empty_files(self):
+        empty = self.write('empty.jsonl', '')
+        self.assertEqual(
+            diff_jsonl_files(empty, self.write_lines('b.jsonl', [1])),
+            diff([], [1]))
+
+    def test_invalid_lines(self):
+        good = self.write_lines('good.jsonl', [1])
+        for text in ('1 2\n', '[1,\n2]\n', '{"a": 1\n'):
+            self.assertRaises(
+                ValueError, diff_jsonl_files, good, self.write('bad', text))
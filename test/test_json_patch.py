@@ -0,0 +1,145 @@
+import types
+import unittest
+from collections import OrderedDict
+from diffr import (
+    diff, patch, to_json_patch, from_json_patch, apply_json_patch)
+from diffr.json_patch import parse_pointer
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ToJsonPatchTests(unittest.TestCase):
+    def test_operations_are_generated_lazily(self):
+        self.assertIsInstance(
+            to_json_patch(diff([1], [2])), types.GeneratorType)
+
+    def test_mapping(self):
+        ops = list(to_json_patch(diff(
+            {'a': 1, 'b': 2, 'c': 'x'}, {'a': 1, 'c': 'y', 'd': 4})))
+        self.assertEqual(ops, [
+            {'op': 'test', 'path': '/b', 'value': 2},
+            {'op': 'remove', 'path': '/b'},
+            {'op': 'test', 'path': '/c', 'value': 'x'},
+            {'op': 'replace', 'path': '/c', 'value': 'y'},
+            {'op': 'add', 'path': '/d', 'value': 4}])
+
+    def test_sequence_indices_follow_earlier_operations(self):
+        ops = list(to_json_patch(diff([1, 2, 3], [2, 3, 4]), tests=False))
+        self.assertEqual(ops, [
+            {'op': 'remove', 'path': '/0'},
+            {'op': 'add', 'path': '/2', 'value': 4}])
+
+    def test_nested(self):
+        a = {'a/b': [1, {'x': 'abc'}], '~': 0}
+        b = {'a/b': [1, {'x': 'abd'}], '~': 0}
+        self.assertEqual(list(to_json_patch(diff(a, b))), [
+            {'op': 'test', 'path': '/a~1b/1/x', 'value': 'abc'},
+            {'op': 'replace', 'path': '/a~1b/1/x', 'value': 'abd'}])
+
+    def test_ordered_mapping(self):
+        a = OrderedDict([('a', 1), ('b', 2)])
+        b = OrderedDict([('b', 3), ('a', 1)])
+        ops = list(to_json_patch(diff(a, b)))
+        self.assertEqual(apply_json_patch(dict(a), ops), dict(b))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_ndarray(self):
+        a = numpy.zeros((2, 2))
+        b = a.copy()
+        b[1, 0] = 5
+        self.assertEqual(list(to_json_patch(diff(a, b), tests=False)), [
+            {'op': 'replace', 'path': '/1/0', 'value': 5.0}])
+
+    def test_unsupported_types(self):
+        self.assertRaises(TypeError, list, to_json_patch(diff({1}, {2})))
+        self.assertRaises(TypeError, list, to_json_patch(diff(b'a', b'b')))
+
+
+class FromJsonPatchTests(unittest.TestCase):
+    def assertConverts(self, a, b):
+        converted = from_json_patch(to_json_patch(diff(a, b)), type(a))
+        self.assertEqual(patch(a, converted), b)
+        return converted
+
+    def test_mapping(self):
+        self.assertConverts(
+            {'a': 1, 'b': 2, 'c': 'x'}, {'a': 1, 'c': 'y', 'd': 4})
+
+    def test_sequence(self):
+        self.assertConverts([1, 2, 3, 4], [0, 2, 5, 4, 6])
+        self.assertConverts((1, 2), (2, 3))
+
+    def test_nested(self):
+        converted = self.assertConverts(
+            {'a': [1, {'x': 1}], 'b': {'c': [1, 2]}},
+            {'a': [1, {'x': 2}], 'b': {'c': [1, 3, 4]}})
+        self.assertEqual(converted.get(['a'])[0].value.type, list)
+        self.assertEqual(converted.get(['b'])[0].value.type, dict)
+
+    def test_removal_needs_a_test(self):
+        ops = [{'op': 'remove', 'path': '/a'}]
+        self.assertRaises(ValueError, from_json_patch, ops, dict)
+
+    def test_unsupported_operations(self):
+        ops = [{'op': 'move', 'from': '/a', 'path': '/b'}]
+        self.assertRaises(ValueError, from_json_patch, ops, dict)
+        self.assertRaises(
+            ValueError, from_json_patch,
+            [{'op': 'add', 'path': '/-', 'value': 1}], list)
+        self.assertRaises(TypeError, from_json_patch, [], set)
+        self.assertRaises(TypeError, from_json_patch, [], OrderedDict)
+
+
+class ApplyJsonPatchTests(unittest.TestCase):
+    def test_rfc_6902_example(self):
+        document = {'foo': ['bar', 'baz']}
+        ops = [
+            {'op': 'add', 'path': '/foo/1', 'value': 'qux'},
+            {'op': 'add', 'path': '/foo/-', 'value': 'end'},
+            {'op': 'test', 'path': '/foo/0', 'value': 'bar'},
+            {'op': 'copy', 'from': '/foo/0', 'path': '/copied'},
+            {'op': 'move', 'from': '/foo/3', 'path': '/moved'},
+            {'op': 'replace', 'path': '/copied', 'value': 'new'}]
+        self.assertEqual(apply_json_patch(document, ops), {
+            'foo': ['bar', 'qux', 'baz'], 'copied': 'new', 'moved': 'end'})
+        self.assertEqual(document, {'foo': ['bar', 'baz']})
+
+    def test_in_place(self):
+        document = {'a': [1]}
+        apply_json_patch(
+            document, [{'op': 'add', 'path': '/a/0', 'value': 0}],
+            in_place=True)
+        self.assertEqual(document, {'a': [0, 1]})
+
+    def test_whole_document(self):
+        self.assertEqual(
+            apply_json_patch(
+                {'a': 1}, [{'op': 'replace', 'path': '', 'value': [1]}]),
+            [1])
+
+    def test_failed_test(self):
+        ops = [{'op': 'test', 'path': '/a', 'value': 2}]
+        self.assertRaises(ValueError, apply_json_patch, {'a': 1}, ops)
+
+    def test_missing_key(self):
+        ops = [{'op': 'remove', 'path': '/b'}]
+        self.assertRaises(KeyError, apply_json_patch, {'a': 1}, ops)
+
+    def test_index_out_of_range(self):
+        self.assertRaises(
+            IndexError, apply_json_patch, [1],
+            [{'op': 'add', 'path': '/2', 'value': 1}])
+        self.assertRaises(
+            IndexError, apply_json_patch, [1],
+            [{'op': 'remove', 'path': '/1'}])
+
+    def test_unknown_operation(self):
+        self.assertRaises(
+            ValueError, apply_json_patch, {}, [{'op': 'frob', 'path': '/a'}])
+
+    def test_parse_pointer(self):
+        self.assertEqual(parse_pointer(''), [])
+        self.assertEqual(parse_pointer('/a~1b/~01/'), ['a/b', '~1', ''])
+        self.assertRaises(ValueError, parse_pointer, 'a')
@@ -5,16 +5,23 @@
 # of the obscure positive cases. For example you should be able to apply a patch
 # to an object that isn't one of the ones involved in the diff under certain
 # conditions.
+import threading
 import unittest
 from collections import namedtuple, OrderedDict
 from copy import deepcopy
-from diffr import diff, patch
+from diffr import diff, patch, DiffCancelled
 from diffr.patch import (
     patch_sequence,
     patch_named_tuple,
     patch_mapping,
     patch_ordered_mapping,
-    patch_set)
+    patch_set,
+    patch_ndarray,
+    patch_bytes)
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class PatchSequenceTests(unittest.TestCase):
@@ -221,6 +228,61 @@ class PatchSetTests(unittest.TestCase):
         self.assertRaises(ValueError, patch_set, c, d)
 
 
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class PatchNdarrayTests(unittest.TestCase):
+    def test_patch_has_no_side_effects(self):
+        a = numpy.arange(5)
+        copy_of_a = a.copy()
+        b = numpy.array([0, 1, 7, 3, 8])
+        d = diff(a, b)
+        self.assertTrue(numpy.array_equal(patch_ndarray(a, d), b))
+        self.assertTrue(numpy.array_equal(a, copy_of_a))
+
+    def test_can_apply_patch_to_different_object(self):
+        a = numpy.zeros(3)
+        b = numpy.array([0.0, 1.0, 0.0])
+        c = numpy.array([2.0, 0.0, 2.0])
+        d = diff(a, b)
+        self.assertEqual(patch_ndarray(c, d).tolist(), [2.0, 1.0, 2.0])
+
+    def test_changed_values_do_not_match(self):
+        d = diff(numpy.zeros(3), numpy.ones(3))
+        self.assertRaises(ValueError, patch_ndarray, numpy.full(3, 5.0), d)
+        nan = numpy.array([numpy.nan, 0.0])
+        d = diff(nan, numpy.array([1.0, 0.0]))
+        self.assertEqual(patch_ndarray(nan, d).tolist(), [1.0, 0.0])
+
+    def test_ndarrays_removed_from_sequence(self):
+        a = [numpy.zeros(3), 1]
+        d = diff(a, [2])
+        self.assertEqual(patch(a, d), [2])
+        self.assertRaises(ValueError, patch, [numpy.ones(3), 1], d)
+
+    def test_shape_does_not_match(self):
+        a = numpy.zeros(4)
+        b = numpy.ones(4)
+        d = diff(a, b)
+        self.assertRaises(ValueError, patch_ndarray, numpy.zeros((2, 2)), d)
+
+
+class PatchBytesTests(unittest.TestCase):
+    def test_patch_has_no_side_effects(self):
+        a = bytearray(b'abc')
+        copy_of_a = deepcopy(a)
+        b = bytearray(b'xyz')
+        d = diff(a, b)
+        self.assertEqual(patch_bytes(a, d), b)
+        self.assertEqual(a, copy_of_a)
+
+    def test_removal_does_not_match(self):
+        d = diff(b'abc', b'xyz')
+        self.assertRaises(ValueError, patch_bytes, b'abd', d)
+
+    def test_removal_does_not_exist(self):
+        d = diff(b'abc', b'xyz')
+        self.assertRaises(IndexError, patch_bytes, b'ab', d)
+
+
 class PatchTests(unittest.TestCase):
     def test_patch_failure_different_types(self):
         Point = namedtuple('Point', ['x', 'y', 'z'])
@@ -243,3 +305,23 @@ class PatchTests(unittest.TestCase):
         d = diff(a, b)
         d._type = int
         self.assertRaises(TypeError, patch, c, d)
+
+
+class PatchHooksTests(unittest.TestCase):
+    def test_progress(self):
+        calls = []
+        a = [1, {'a': 1}]
+        b = [1, {'a': 2}]
+        d = diff(a, b)
+        self.assertEqual(
+            patch(a, d, progress=lambda *args: calls.append(args)), b)
+        self.assertEqual(calls[0], ('patch', 0, len(d), 0))
+        self.assertEqual(calls[-1], ('patch', len(d), len(d), 0))
+        self.assertIn(('patch', 2, 2, 1), calls)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        for a, b in [([1], [2]), ({1}, {2}), (OrderedDict(a=1), {})]:
+            d = diff(a, type(a)(b))
+            self.assertRaises(DiffCancelled, patch, a, d, cancel=cancel)
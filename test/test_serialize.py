@@ -0,0 +1,128 @@
+import io
+import pickle
+import random
+import unittest
+from collections import namedtuple, OrderedDict
+from diffr import diff, dumps, loads, dump, iter_load
+from diffr.data_model import Diff, DiffItem, insert, remove
+from diffr.serialize import ValueCodec, MAGIC, VERSION
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+Point = namedtuple('Point', ('x', 'y'))
+
+
+class RoundTripTests(unittest.TestCase):
+    def assertRoundTrips(self, a, b, codec=None, types=()):
+        diff_obj = diff(a, b)
+        loaded = loads(dumps(diff_obj, codec), codec, types)
+        self.assertEqual(loaded, diff_obj)
+        self.assertIs(loaded.type, diff_obj.type)
+        self.assertEqual(loaded.stats, diff_obj.stats)
+        self.assertEqual(list(loaded), list(diff_obj))
+        return loaded
+
+    def test_sequence(self):
+        loaded = self.assertRoundTrips('abcdef', 'axcdyfz')
+        self.assertEqual(
+            [di.context for di in loaded],
+            [di.context for di in diff('abcdef', 'axcdyfz')])
+
+    def test_nested(self):
+        a = {'a': [1, (2, 3), {'x': 1.5}], 'b': None, 'c': u'\xe9'}
+        b = {'a': [1, (2, 4), {'x': 2.5}], 'b': True, 'd': b'bytes'}
+        loaded = self.assertRoundTrips(a, b)
+        self.assertEqual(
+            sorted(path for path, _ in loaded.iter_changes()),
+            sorted(path for path, _ in diff(a, b).iter_changes()))
+
+    def test_ordered_mapping_and_set(self):
+        self.assertRoundTrips(
+            OrderedDict([('a', 1), ('b', 2)]), OrderedDict([('b', 3)]))
+        self.assertRoundTrips(
+            {1, frozenset([2]), -300}, {1, frozenset([3]), 2 ** 70})
+
+    def test_named_tuple(self):
+        self.assertRoundTrips(Point(1, 2), Point(1, 3), types=[Point])
+
+    def test_bytes(self):
+        rng = random.Random(0)
+        a = bytes(bytearray(rng.randrange(256) for _ in range(20000)))
+        self.assertRoundTrips(a, a[:100] + b'xyz' + a[200:])
+        self.assertRoundTrips(bytearray(a), bytearray(a[5:]))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_ndarray(self):
+        a = numpy.arange(12.0).reshape(3, 4)
+        b = a.copy()
+        b[1, 2] = -1
+        self.assertRoundTrips({'a': a}, {'a': b})
+
+    def test_hand_built_diff(self):
+        diff_obj = Diff(list, [
+            DiffItem(insert, Point(1, 2)), DiffItem(remove, 1, (5, 6, 1, 1))])
+        codec = ValueCodec(allow_pickle=True)
+        self.assertEqual(loads(dumps(diff_obj, codec), codec), diff_obj)
+
+    def test_pluggable_codec(self):
+        self.assertRoundTrips({'a': [1, 2]}, {'a': [1, 3]}, codec=pickle)
+
+
+class FormatTests(unittest.TestCase):
+    def test_header(self):
+        data = dumps(diff([1], [2]))
+        self.assertTrue(data.startswith(MAGIC + bytearray([VERSION])))
+
+    def test_bad_records(self):
+        data = dumps(diff([1], [2]))
+        self.assertRaises(ValueError, loads, b'XXXX' + data[4:])
+        self.assertRaises(
+            ValueError, loads, MAGIC + bytearray([VERSION + 1]) + data[5:])
+        self.assertRaises(ValueError, loads, data[:-1])
+
+    def test_unknown_type(self):
+        Local = namedtuple('Local', ('x',))
+        data = dumps(Diff(Local, []))
+        self.assertRaises(ValueError, loads, data)
+        self.assertIs(loads(data, types=[Local]).type, Local)
+
+    def test_types_are_not_imported(self):
+        for module, name in [
+                ('builtins', 'eval'), ('os', 'system'), ('diffr', 'diff')]:
+            forged = type(name, (), {'__module__': module})
+            with self.assertRaisesRegex(ValueError, 'not a known type'):
+                loads(dumps(Diff(forged, [])))
+
+    def test_pickle_is_opt_in(self):
+        codec = ValueCodec(allow_pickle=True)
+        diff_obj = diff([1], [1, Point(1, 2)])
+        self.assertRaises(TypeError, dumps, diff_obj)
+        data = dumps(diff_obj, codec)
+        self.assertRaises(ValueError, ValueCodec().loads, codec.dumps(Point))
+        self.assertEqual(loads(data, codec), diff_obj)
+
+    def test_value_codec(self):
+        codec = ValueCodec(allow_pickle=True)
+        value = [None, True, -1, 1.5, u'text', b'data', bytearray(b'x'),
+                 (1,), {1: 2}, {3}, frozenset([4]), Point(1, 2)]
+        self.assertEqual(codec.loads(codec.dumps(value)), value)
+        self.assertEqual(codec.loads(codec.dumps(memoryview(b'ab'))), b'ab')
+
+
+class StreamTests(unittest.TestCase):
+    def test_dump_and_iter_load(self):
+        diffs = [diff('abc', 'abd'), diff({1: 2}, {1: 3}), diff([1], [])]
+        stream = io.BytesIO()
+        for diff_obj in diffs:
+            dump(diff_obj, stream)
+        stream.seek(0)
+        self.assertEqual(list(iter_load(stream)), diffs)
+
+    def test_truncated_stream(self):
+        stream = io.BytesIO(dumps(diff('abc', 'abd'))[:-2])
+        self.assertRaises(ValueError, list, iter_load(stream))
+
+    def test_empty_stream(self):
+        self.assertEqual(list(iter_load(io.BytesIO())), [])
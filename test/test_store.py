@@ -0,0 +1,88 @@
+import random
+import unittest
+from copy import deepcopy
+from diffr import diff, Store
+
+
+def versions(count, seed=0):
+    rng = random.Random(seed)
+    config = {'name': 'service', 'hosts': ['a', 'b'], 'limits': {'cpu': 1}}
+    result = []
+    for i in range(count):
+        config = deepcopy(config)
+        change = rng.randrange(3)
+        if change == 0:
+            config['hosts'].insert(
+                rng.randrange(len(config['hosts']) + 1), 'h{}'.format(i))
+        elif change == 1 and len(config['hosts']) > 1:
+            del config['hosts'][rng.randrange(len(config['hosts']))]
+        else:
+            config['limits'][rng.choice(['cpu', 'mem', 'io'])] = i
+        result.append(config)
+    return result
+
+
+class StoreTests(unittest.TestCase):
+    def setUp(self):
+        self.versions = versions(40)
+
+    def make_store(self, **kwargs):
+        store = Store(**kwargs)
+        for i, obj in enumerate(self.versions):
+            self.assertEqual(store.commit(obj), i)
+        return store
+
+    def test_every_version_is_rebuilt(self):
+        for interval in (1, 3, 7, 100):
+            store = self.make_store(snapshot_interval=interval)
+            self.assertEqual(len(store), len(self.versions))
+            order = list(range(len(self.versions)))
+            random.Random(interval).shuffle(order)
+            for version in order:
+                self.assertEqual(store[version], self.versions[version])
+
+    def test_snapshots(self):
+        store = self.make_store(snapshot_interval=10)
+        self.assertEqual(store._snapshot_versions, [0, 10, 20, 30])
+        store.snapshot_interval = 2
+        for obj in ({}, {'a': 1}, {'a': 2}):
+            store.commit(obj)
+        self.assertEqual(store._snapshot_versions[-3:], [30, 40, 42])
+
+    def test_nearest_start(self):
+        store = self.make_store(snapshot_interval=10, cache_size=0)
+        self.assertEqual(store._nearest(12)[0], 10)
+        self.assertEqual(store._nearest(18)[0], 20)
+        self.assertEqual(store._nearest(38)[0], 39)
+        self.assertEqual(store._nearest(15)[0], 10)
+
+    def test_cache(self):
+        store = self.make_store(snapshot_interval=10, cache_size=2)
+        store[14]
+        store[16]
+        self.assertEqual(store._nearest(15)[0], 14)
+        store[17]
+        self.assertEqual(list(store._cache), [16, 17])
+        store[16]
+        self.assertEqual(list(store._cache), [17, 16])
+
+    def test_commits_are_copied(self):
+        store = Store()
+        obj = {'a': [1]}
+        store.commit(obj)
+        obj['a'].append(2)
+        store.commit(obj)
+        self.assertEqual(store[0], {'a': [1]})
+
+    def test_get_diff(self):
+        store = self.make_store()
+        self.assertEqual(
+            store.get_diff(5), diff(self.versions[4], self.versions[5]))
+        self.assertRaises(ValueError, store.get_diff, 0)
+
+    def test_bad_versions(self):
+        store = self.make_store()
+        self.assertEqual(store[-1], self.versions[-1])
+        self.assertRaises(IndexError, lambda: store[40])
+        self.assertRaises(IndexError, lambda: Store()[0])
+        self.assertRaises(ValueError, Store, 0)